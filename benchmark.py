@@ -0,0 +1,311 @@
+"""
+检测流水线基准测试 - 无需摄像头和界面
+
+用法示例:
+    python benchmark.py                                  # 运行全部合成场景
+    python benchmark.py --clip lab_night.mp4             # 追加录制的视频片段
+    python benchmark.py -o bench_new.json --compare bench_base.json --max-regression 0.10
+    python benchmark.py --startup 5 --scenes             # 只测启动到首帧的时间（需要摄像头和桌面）
+
+结果保存为JSON，可与其它提交的结果比较；任一用例FPS下降超过阈值时返回非0退出码。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from detection import DEFAULT_CONFIG, DetectionParams, MotionDetector, StageProfiler
+
+RESOLUTIONS = ((320, 240), (640, 480), (1280, 720))
+ROI_FRACTIONS = (1.0, 0.5, 0.25)  # ROI边长占画面的比例（居中）
+DETECTION_STAGES = ("blur", "diff", "contours")
+
+
+# ==================== 合成场景 ====================
+
+def _background(w, h, rng):
+    """带纹理的静态背景（避免纯色画面让模糊和差分变得不真实）"""
+    base = rng.integers(60, 180, size=(h // 8 + 1, w // 8 + 1, 3), dtype=np.uint8)
+    return cv2.resize(base, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def scene_static_noise(w, h, n, rng):
+    """静止画面 + 传感器噪声（空房间）"""
+    bg = _background(w, h, rng).astype(np.int16)
+    for _ in range(n):
+        noise = rng.normal(0, 3, size=bg.shape).astype(np.int16)
+        yield np.clip(bg + noise, 0, 255).astype(np.uint8)
+
+
+def scene_moving_rects(w, h, n, rng):
+    """多个矩形在画面中移动（有人走动）"""
+    bg = _background(w, h, rng)
+    rects = []
+    for _ in range(3):
+        size = (int(rng.integers(w // 12, w // 6)), int(rng.integers(h // 8, h // 4)))
+        pos = [float(rng.integers(0, w - size[0])), float(rng.integers(0, h - size[1]))]
+        vel = [float(rng.uniform(-w / 80, w / 80)), float(rng.uniform(-h / 80, h / 80))]
+        color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+        rects.append((size, pos, vel, color))
+    for _ in range(n):
+        frame = bg.copy()
+        for size, pos, vel, color in rects:
+            for i in range(2):
+                pos[i] += vel[i]
+                limit = (w, h)[i] - size[i]
+                if pos[i] < 0 or pos[i] > limit:
+                    vel[i] = -vel[i]
+                    pos[i] = min(max(pos[i], 0), limit)
+            x, y = int(pos[0]), int(pos[1])
+            cv2.rectangle(frame, (x, y), (x + size[0], y + size[1]), color, -1)
+        yield frame
+
+
+def scene_lighting_ramp(w, h, n, rng):
+    """整体亮度缓慢变化（日落/云层）"""
+    bg = _background(w, h, rng).astype(np.float32)
+    for i in range(n):
+        gain = 0.6 + 0.8 * i / max(n - 1, 1)
+        yield np.clip(bg * gain, 0, 255).astype(np.uint8)
+
+
+def scene_flicker(w, h, n, rng):
+    """灯光闪烁（每隔几帧整体亮度跳变）"""
+    bg = _background(w, h, rng).astype(np.int16)
+    for i in range(n):
+        offset = 40 if (i // 3) % 2 else 0
+        yield np.clip(bg + offset, 0, 255).astype(np.uint8)
+
+
+SCENES = {
+    "static_noise": scene_static_noise,
+    "moving_rects": scene_moving_rects,
+    "lighting_ramp": scene_lighting_ramp,
+    "flicker": scene_flicker,
+}
+
+
+def load_clip(path, max_frames):
+    """预先解码录制的视频片段（解码时间不计入检测耗时）"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"无法读取视频片段: {path}")
+    return frames
+
+
+# ==================== 测量 ====================
+
+def centered_roi(w, h, fraction):
+    rw, rh = max(int(w * fraction), 16), max(int(h * fraction), 16)
+    return (w - rw) // 2, (h - rh) // 2, rw, rh
+
+
+def run_case(frames, roi, config):
+    """对一组帧运行检测流水线，返回FPS、各阶段耗时和每帧内存分配"""
+    x, y, w, h = roi
+    params = DetectionParams.from_config(config)
+    detector = MotionDetector()
+    prof = StageProfiler()
+
+    # 预热（首帧只建立参考帧）
+    for frame in frames[:5]:
+        detector.process(frame[y:y+h, x:x+w], params)
+    detector.reset()
+
+    motion_frames = 0
+    start = time.perf_counter_ns()
+    for frame in frames:
+        prof.begin()
+        if detector.process(frame[y:y+h, x:x+w], params, prof):
+            motion_frames += 1
+    elapsed_ns = time.perf_counter_ns() - start
+
+    # 单独一轮测量内存分配（tracemalloc会拖慢速度，不与计时混在一起）
+    detector.reset()
+    sample = frames[:min(len(frames), 50)]
+    peaks = []
+    tracemalloc.start()
+    try:
+        for frame in sample:
+            before = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            detector.process(frame[y:y+h, x:x+w], params)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    stages = {}
+    for name in DETECTION_STAGES:
+        hist = prof.histograms[name]
+        if hist.count:
+            stages[name] = {
+                "mean_ms": round(hist.total_ns / hist.count / 1e6, 4),
+                "p50_ms": round(hist.percentile(0.50) / 1e6, 4),
+                "p95_ms": round(hist.percentile(0.95) / 1e6, 4),
+            }
+    return {
+        "frames": len(frames),
+        "fps": round(len(frames) / (elapsed_ns / 1e9), 2),
+        "ms_per_frame": round(elapsed_ns / len(frames) / 1e6, 4),
+        "stages": stages,
+        "alloc_bytes_per_frame": int(np.median(peaks)) if peaks else 0,
+        "motion_frames": motion_frames,
+    }
+
+
+def run_startup(runs, timeout=60):
+    """多次冷启动 monitor.py --startup-benchmark，统计各阶段和首帧耗时（中位数）"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor.py")
+    samples = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, script, "--startup-benchmark"],
+                              capture_output=True, text=True, encoding="utf-8", timeout=timeout)
+        wall_ms = (time.perf_counter() - t0) * 1000
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("STARTUP_BENCHMARK ")), None)
+        if line is None:
+            raise RuntimeError(f"第{i + 1}次启动未输出首帧计时（摄像头是否可用？）\n{proc.stderr[-2000:]}")
+        sample = json.loads(line[len("STARTUP_BENCHMARK "):])
+        sample["process_wall_ms"] = round(wall_ms, 2)
+        samples.append(sample)
+        print(f"启动 #{i + 1}: 首帧 {sample['time_to_first_frame_ms']:.0f}ms "
+              f"(启动监控后 {sample['first_frame_after_start_ms']:.0f}ms)")
+    phases = {}
+    for sample in samples:
+        for phase in sample["phases"]:
+            phases.setdefault(phase["name"], []).append(phase["ms"])
+    return {
+        "runs": runs,
+        "time_to_first_frame_ms": float(np.median([s["time_to_first_frame_ms"] for s in samples])),
+        "first_frame_after_start_ms": float(np.median([s["first_frame_after_start_ms"] for s in samples])),
+        "phases_ms": {name: float(np.median(v)) for name, v in phases.items()},
+        "samples": samples,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path, max_regression, startup=None):
+    """与基准结果比较，返回回退的用例列表"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline_report = json.load(f)
+    baseline = {r["case"]: r for r in baseline_report["results"]}
+    regressions = []
+    base_startup = baseline_report.get("startup")
+    if startup and base_startup:
+        # 启动时间越短越好，增幅超过阈值视为回退（单位ms，与FPS用例分开记录）
+        change = startup["time_to_first_frame_ms"] / base_startup["time_to_first_frame_ms"] - 1.0
+        if change > max_regression:
+            regressions.append({"case": "startup", "baseline_ms": base_startup["time_to_first_frame_ms"],
+                                "ms": startup["time_to_first_frame_ms"], "ms_change": round(change, 4)})
+    for r in results:
+        base = baseline.get(r["case"])
+        if not base:
+            continue
+        change = r["fps"] / base["fps"] - 1.0
+        r["baseline_fps"] = base["fps"]
+        r["fps_change"] = round(change, 4)
+        if change < -max_regression:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运动检测流水线基准测试")
+    parser.add_argument("--frames", type=int, default=200, help="每个用例的帧数")
+    parser.add_argument("--seed", type=int, default=1234, help="合成场景随机种子")
+    parser.add_argument("--scenes", nargs="*", default=list(SCENES), choices=list(SCENES), help="要运行的合成场景")
+    parser.add_argument("--clip", action="append", default=[], help="录制的视频片段路径（可多次指定）")
+    parser.add_argument("--resolutions", nargs="*", default=[f"{w}x{h}" for w, h in RESOLUTIONS],
+                        help="合成场景分辨率，如 640x480")
+    parser.add_argument("--roi", nargs="*", type=float, default=list(ROI_FRACTIONS), help="ROI边长比例")
+    parser.add_argument("-o", "--output", default="bench_output.json", help="结果JSON路径")
+    parser.add_argument("--compare", help="作为基准的历史结果JSON")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="允许的最大回退: FPS降幅/启动耗时增幅（0.10=10%%）")
+    parser.add_argument("--startup", type=int, default=0, metavar="N",
+                        help="额外冷启动N次 monitor.py，测量启动到首帧的时间")
+    args = parser.parse_args(argv)
+
+    config = dict(DEFAULT_CONFIG)
+    cases = []
+    for res in args.resolutions:
+        w, h = (int(v) for v in res.lower().split("x"))
+        for scene in args.scenes:
+            rng = np.random.default_rng(args.seed)
+            frames = list(SCENES[scene](w, h, args.frames, rng))
+            cases.append((scene, frames))
+    for path in args.clip:
+        cases.append((f"clip:{os.path.basename(path)}", load_clip(path, args.frames)))
+
+    results = []
+    for name, frames in cases:
+        fh, fw = frames[0].shape[:2]
+        for fraction in args.roi:
+            roi = centered_roi(fw, fh, fraction)
+            case = f"{name}@{fw}x{fh}/roi{fraction:g}"
+            r = run_case(frames, roi, config)
+            r.update(case=case, scene=name, resolution=f"{fw}x{fh}", roi=list(roi))
+            results.append(r)
+            print(f"{case:<40} {r['fps']:>9.1f} fps  {r['ms_per_frame']:>8.3f} ms/帧  "
+                  f"{r['alloc_bytes_per_frame'] / 1024:>8.1f} KB/帧")
+
+    startup = run_startup(args.startup) if args.startup > 0 else None
+
+    regressions = []
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression, startup)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "config": {k: config[k] for k in ("gaussian_blur", "threshold", "dilate_iterations", "min_area")},
+        "results": results,
+    }
+    if startup:
+        report["startup"] = startup
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"结果已保存: {args.output}")
+
+    if regressions:
+        for r in regressions:
+            if "ms" in r:
+                print(f"性能回退: {r['case']} 首帧耗时 {r['baseline_ms']} -> {r['ms']} ms ({r['ms_change']:+.1%})")
+            else:
+                print(f"性能回退: {r['case']} {r['baseline_fps']} -> {r['fps']} fps ({r['fps_change']:+.1%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+黑匣子导出工具 - 把 blackbox.bin 中一段时间的画面导出为视频文件
+
+用法示例:
+    python blackbox_export.py --info                                  # 查看黑匣子覆盖的时间范围
+    python blackbox_export.py --last 120 -o last2min.mp4              # 导出最近2分钟
+    python blackbox_export.py --start 14:03:00 --end 14:05:30         # 导出今天某段时间
+    python blackbox_export.py --start "2024-05-01 02:10:00" --duration 60 -o night.avi
+
+监控运行中也可以导出（只读打开，正在被覆盖的帧会被跳过）。
+"""
+import argparse
+import datetime
+import os
+import sys
+
+import cv2
+
+from detection import BLACKBOX_FILE, BlackBoxReader
+
+CODECS = {".mp4": "mp4v", ".avi": "MJPG", ".mkv": "XVID"}
+
+
+def parse_time(text: str) -> float:
+    """解析 "HH:MM[:SS]"（今天）或 "YYYY-MM-DD HH:MM[:SS]"，返回时间戳"""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            t = datetime.datetime.strptime(text, fmt).time()
+            return datetime.datetime.combine(datetime.date.today(), t).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"无法识别的时间: {text}")
+
+
+def fmt_time(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def export(reader: BlackBoxReader, start, end, output: str, fps: float, timestamp: bool) -> int:
+    """写出时间窗口内的帧，返回帧数（窗口内没有帧时不创建输出文件）"""
+    fourcc = cv2.VideoWriter_fourcc(*CODECS.get(os.path.splitext(output)[1].lower(), "mp4v"))
+    bb = reader.file
+    writer = None
+    count = 0
+    try:
+        for ts, image in reader.frames(start, end):
+            if writer is None:  # 收到第一帧时才创建文件
+                writer = cv2.VideoWriter(output, fourcc, fps, (bb.width, bb.height))
+                if not writer.isOpened():
+                    raise RuntimeError(f"无法创建视频文件: {output}")
+            if timestamp:
+                cv2.putText(image, fmt_time(ts)[:-4], (6, bb.height - 8), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.4, (255, 255, 255), 1, cv2.LINE_AA)
+            writer.write(image)
+            count += 1
+    finally:
+        if writer is not None:
+            writer.release()
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="黑匣子录像导出")
+    parser.add_argument("--file", default=BLACKBOX_FILE, help="黑匣子文件路径")
+    parser.add_argument("--info", action="store_true", help="只显示文件信息和覆盖的时间范围")
+    parser.add_argument("--start", type=parse_time, help='开始时间 "HH:MM[:SS]" 或 "YYYY-MM-DD HH:MM[:SS]"')
+    parser.add_argument("--end", type=parse_time, help="结束时间（默认到最后一帧）")
+    parser.add_argument("--duration", type=float, help="从开始时间起导出的秒数")
+    parser.add_argument("--last", type=float, help="导出最近N秒（以最后一帧为准）")
+    parser.add_argument("-o", "--output", help="输出视频文件（.mp4/.avi/.mkv），默认按时间命名")
+    parser.add_argument("--fps", type=float, help="输出帧率（默认使用记录帧率）")
+    parser.add_argument("--no-timestamp", action="store_true", help="不在画面上叠加时间")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.file):
+        print(f"找不到黑匣子文件: {args.file}", file=sys.stderr)
+        return 1
+    reader = BlackBoxReader(args.file)
+    try:
+        bb = reader.file
+        first, last = reader.time_range()
+        if args.info or first is None:
+            fmt = "JPEG" if bb.fmt == bb.FORMAT_JPEG else "灰度"
+            print(f"文件: {args.file} ({os.path.getsize(args.file) / 1024 / 1024:.1f}MB)")
+            print(f"画面: {bb.width}x{bb.height} {fmt}, {bb.fps:g} FPS, {bb.slot_count}个槽位")
+            if first is None:
+                print("黑匣子中还没有画面")
+                return 0 if args.info else 1
+            print(f"范围: {fmt_time(first)} ~ {fmt_time(last)} ({last - first:.0f}秒)")
+            return 0
+
+        if args.last is not None:
+            start, end = last - args.last, last
+        else:
+            start = args.start if args.start is not None else first
+            end = args.end
+            if args.duration is not None:
+                end = start + args.duration
+        output = args.output or datetime.datetime.fromtimestamp(start).strftime("blackbox_%Y%m%d_%H%M%S.mp4")
+        count = export(reader, start, end, output, args.fps or bb.fps, not args.no_timestamp)
+    finally:
+        reader.close()
+
+    if count == 0:
+        print("指定时间范围内没有画面", file=sys.stderr)
+        return 1
+    print(f"已导出 {count} 帧 → {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,649 @@
+"""
+检测核心 - 不依赖GUI的检测流水线、默认配置和黑匣子文件格式
+
+monitor.py（界面）、benchmark.py（基准测试）和 blackbox_export.py（录像导出）共用本模块，
+后两者无需安装 tkinter/customtkinter、也不会创建日志和截图目录。
+"""
+import time
+import importlib
+import os
+import sys
+import mmap
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple, Dict, Any
+
+
+class _LazyModule:
+    """延迟导入的模块代理 - 首次访问属性时才真正import，随后用真实模块替换所属模块的全局名称
+
+    cv2 / PIL / pystray / winsound 导入较慢，推迟到真正用到（或窗口显示后的后台预加载）时再导入，
+    窗口可以更早出现。namespace 为要替换名称的模块全局字典（默认本模块）。
+    """
+    def __init__(self, module_name: str, global_name: str, namespace: Optional[Dict[str, Any]] = None):
+        self._module_name = module_name
+        self._global_name = global_name
+        self._namespace = globals() if namespace is None else namespace
+
+    def _load(self):
+        t0 = time.perf_counter()
+        module = importlib.import_module(self._module_name)
+        self._namespace[self._global_name] = module  # 之后的访问直接命中真实模块，没有代理开销
+        # 同一模块在多个文件中各有代理，只记录真正导入的那一次
+        IMPORT_TIMES.setdefault(self._module_name, (time.perf_counter() - t0) * 1000)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+IMPORT_TIMES = {}  # 模块名 -> 导入耗时(ms)
+cv2 = _LazyModule("cv2", "cv2")
+np = _LazyModule("numpy", "np")
+
+
+def get_base_path():
+    """获取脚本或打包后exe的根目录"""
+    # PyInstaller creates a temp folder and stores path in _MEIPASS
+    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
+        return os.path.dirname(sys.executable)
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+SCRIPT_DIR = get_base_path()
+BLACKBOX_FILE = os.path.join(SCRIPT_DIR, 'blackbox.bin')  # 黑匣子环形录像文件
+
+# 默认配置 (严格对应你脚本中的参数)
+DEFAULT_CONFIG = {
+    "camera_id": 0,
+    "min_area": 500,
+    "alert_cooldown": 3,
+    "loop_delay": 0.2,
+    "roi": None,
+    "threshold": 25,
+    "gaussian_blur": 21,
+    "dilate_iterations": 2,
+    "max_failures": 10,
+    "show_preview": True,
+    "auto_screenshot": True,
+    "manual_screenshot": True,
+    "continuous_frames": 3,      # 核心防抖参数
+    "event_update_interval": 0,  # 事件持续期间每隔多少秒补拍并记录一次（0为不更新）
+    "screenshot_count": 3,       # 报警连拍张数
+    "screenshot_interval": 0.5,  # 连拍间隔
+    "auto_cleanup_enabled": True,  # 自动清理旧截图
+    "cleanup_days": 3,           # 保留截图天数
+    "memory_cleanup_interval": 3600,  # 内存清理间隔（秒）
+    "stage_timing_enabled": False,  # 视频循环分阶段耗时统计
+    "metrics_enabled": False,    # 本地 Prometheus 指标服务
+    "metrics_host": "127.0.0.1", # 指标服务监听地址（仅本机）
+    "metrics_port": 9108,        # 指标服务端口
+    "writer_queue_size": 32,     # 截图写入队列长度
+    "alert_trace_history": 200,  # 保留的报警延迟追踪条数
+    "profile_duration": 10,      # 在线性能分析时长（秒）
+    "profile_interval_ms": 5,    # 调用栈采样间隔（毫秒）
+    "contour_gate_enabled": True,  # 变化像素总数不足min_area时跳过膨胀/轮廓提取（近似，空心轮廓可能漏检）
+    "illumination_suppress_enabled": True,  # 全局光照变化（开关灯、云层）不报警，直接更新参考帧
+    "illumination_change_ratio": 0.6,  # 变化像素占检测区域的比例超过此值视为全局变化
+    "illumination_min_shift": 10,      # 同时要求平均亮度变化超过此值（灰度级）
+    "illumination_settle_frames": 3,   # 光照变化后等待曝光稳定的帧数
+    "max_frame_skip": 5,         # 调度落后时每次最多用grab()跳过的帧数
+    "adaptive_fps_enabled": True,  # 自适应帧率：长时间无运动时降到空闲帧率
+    "idle_fps": 2,               # 空闲帧率
+    "idle_after": 60,            # 连续无运动多少秒后进入空闲帧率
+    "lazy_startup": True,        # 先显示窗口，托盘/清理/预设/报警历史面板延后加载
+    "zone_grid_enabled": False,  # 网格分区检测：按格子分别判定、报警时给出分区名
+    "person_verify_enabled": False,  # 二级人形确认：报警前在后台确认画面中有人
+    "person_verify_backend": "hog",  # "hog"（OpenCV自带行人检测）或 "dnn"（本地YOLO格式ONNX模型）
+    "person_verify_model": "",       # dnn后端使用的ONNX模型路径
+    "person_verify_confidence": 0.5, # 人形置信度阈值（HOG为SVM得分）
+    "person_verify_timeout": 2.0,    # 每个事件的确认时间预算（秒）
+    "person_verify_fallback": "alert",  # 预算内一帧都未检查完时: "alert"照常报警 / "drop"忽略
+    "blackbox_enabled": False,   # 黑匣子：把最近几分钟的缩小画面循环写入固定大小的文件
+    "blackbox_minutes": 5,       # 黑匣子保留的时长（分钟）
+    "blackbox_fps": 5,           # 黑匣子记录帧率
+    "blackbox_width": 320,       # 黑匣子画面宽度（高度按比例）
+    "blackbox_format": "jpeg",   # "jpeg"（彩色JPEG压缩）或 "gray"（未压缩灰度）
+    "blackbox_jpeg_quality": 70,
+    "motion_series_enabled": True,  # 记录每帧运动强度，按分钟/小时汇总保存
+    "heatmap_enabled": True,     # 累计每个像素的运动次数（运动热力图）
+    "heatmap_interval": 3600,    # 热力图快照间隔（秒），每次保存 .npz 计数和彩色 .png 后重新累计
+    "heatmap_overlay": False,    # 在预览画面上叠加热力图
+    "tracking_enabled": False,   # 目标跟踪：ROI各边进出计数，已报警的目标不重复报警
+    "track_max_missed": 25,      # 目标连续多少帧未出现视为离开
+    "track_max_distance": 0.25,  # 相邻帧目标最大移动距离（ROI对角线的比例）
+    "track_edge_margin": 0.15,   # 边缘带宽度（ROI短边的比例），目标在此范围内出现/消失计为进出
+    "zone_grid": [3, 3],         # 网格行数、列数
+    "zones": {},                 # 分区单独设置，键为"行-列"(从1开始)，如 {"1-2": {"name": "门口", "min_area": 300}}
+    "regions": [],               # 多边形检测区域 [{"name": "门口", "points": [[x, y], ...]}]，为空时使用roi矩形
+    "exclusions": [],            # 多边形屏蔽区（闪烁的指示灯、窗户、显示器等），格式同regions
+    "calibration_duration": 20,  # 噪声校准观察时长（秒）
+    "config_watch_interval": 2,  # 检查config.json外部修改的间隔（秒），修改后自动热加载
+    "luma_capture_enabled": False,  # 亮度直通：检测直接使用摄像头原始数据的Y平面，只对显示/保存的帧做彩色转换
+    "watchdog_enabled": True,    # 采集看门狗：画面冻结/镜头遮挡/视角突变检测
+    "frozen_seconds": 5,         # 画面完全不变超过此秒数视为冻结，自动重置摄像头连接
+    "cover_std": 4,              # 画面标准差低于此值视为镜头被遮挡（几乎全黑或均一）
+    "view_shift_threshold": 30,  # 画面结构与参考差异超过此值（灰度级）且保持稳定，视为摄像头被移动
+    "tamper_frames": 10,         # 遮挡/视角突变需要持续的帧数
+    "reconnect_base_delay": 1.0,  # 摄像头重连初始等待（秒），之后每次失败翻倍
+    "reconnect_max_delay": 30.0,  # 重连等待上限（秒），重连不限次数
+    "capture_profile": "default",  # 使用的采集配置（capture_profiles中的名称）
+    "capture_profiles": {        # 摄像头采集配置：格式(MJPG/YUYV)、分辨率、帧率、驱动缓冲帧数
+        "default": {"fourcc": "MJPG", "width": 640, "height": 480, "fps": 30, "buffer_size": 1},
+        "low_bandwidth": {"fourcc": "MJPG", "width": 640, "height": 480, "fps": 15, "buffer_size": 1},
+        "hd": {"fourcc": "MJPG", "width": 1280, "height": 720, "fps": 30, "buffer_size": 1},
+        "raw": {"fourcc": "YUYV", "width": 640, "height": 480, "fps": 30, "buffer_size": 1}
+    },
+    "custom_presets": {}  # 用户自定义预设
+}
+
+
+# ==================== 性能计时 ====================
+
+class LatencyHistogram:
+    """固定内存的延迟直方图 - 对数分桶（每个2的幂分4档），用于估算p50/p95/p99"""
+    SUB_BITS = 2                      # 每个2的幂再细分 2^2=4 档
+    MIN_EXP = 10                      # 最小分辨率 2^10 ns ≈ 1µs
+    NUM_BUCKETS = (37 - MIN_EXP) * (1 << SUB_BITS) + 1  # 覆盖到约 137 秒
+
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        """记录一次耗时（纳秒）"""
+        if ns < (1 << self.MIN_EXP):
+            idx = 0
+        else:
+            exp = ns.bit_length() - 1
+            sub = (ns >> (exp - self.SUB_BITS)) & ((1 << self.SUB_BITS) - 1)
+            idx = min((exp - self.MIN_EXP) * (1 << self.SUB_BITS) + sub + 1, self.NUM_BUCKETS - 1)
+        self.counts[idx] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    @classmethod
+    def bucket_upper_ns(cls, idx: int) -> int:
+        """返回分桶的上界（纳秒）"""
+        if idx == 0:
+            return 1 << cls.MIN_EXP
+        idx -= 1
+        exp = cls.MIN_EXP + (idx >> cls.SUB_BITS)
+        sub = idx & ((1 << cls.SUB_BITS) - 1)
+        return (1 << exp) + ((sub + 1) << (exp - cls.SUB_BITS))
+
+    def percentile(self, q: float) -> int:
+        """估算分位数（纳秒），结果不超过实际最大值"""
+        if self.count == 0:
+            return 0
+        target = q * self.count
+        cumulative = 0
+        for idx, c in enumerate(self.counts):
+            cumulative += c
+            if c and cumulative >= target:
+                return min(self.bucket_upper_ns(idx), self.max_ns)
+        return self.max_ns
+
+    def reset(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class StageProfiler:
+    """视频循环分阶段计时器（perf_counter_ns），每个阶段聚合到一个直方图"""
+    STAGES = (
+        ("read", "采集"),
+        ("blur", "灰度/模糊"),
+        ("diff", "差分/膨胀"),
+        ("contours", "轮廓"),
+        ("overlay", "叠加"),
+        ("convert", "转换/缩放"),
+        ("photo", "PhotoImage"),
+        ("sleep", "休眠"),
+    )
+    enabled = True
+
+    def __init__(self):
+        self.histograms = {name: LatencyHistogram() for name, _ in self.STAGES}
+        self._t = 0
+
+    def begin(self):
+        """开始计时（阶段之间有间隙时调用）"""
+        self._t = time.perf_counter_ns()
+
+    def lap(self, stage: str):
+        """结束当前阶段并开始下一个阶段"""
+        now = time.perf_counter_ns()
+        self.histograms[stage].record(now - self._t)
+        self._t = now
+
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
+
+    def format_summary(self) -> str:
+        """生成统计面板用的多行文本（毫秒）"""
+        lines = [f"{'阶段':<10}{'p50':>7}{'p95':>7}{'p99':>7}{'max':>7}"]
+        for name, label in self.STAGES:
+            hist = self.histograms[name]
+            if hist.count == 0:
+                continue
+            lines.append(f"{label:<10}"
+                         f"{hist.percentile(0.50) / 1e6:>7.1f}"
+                         f"{hist.percentile(0.95) / 1e6:>7.1f}"
+                         f"{hist.percentile(0.99) / 1e6:>7.1f}"
+                         f"{hist.max_ns / 1e6:>7.1f}")
+        return "\n".join(lines)
+
+
+class NullStageProfiler:
+    """关闭计时时使用的空实现，开销仅为一次空方法调用"""
+    enabled = False
+
+    def begin(self):
+        pass
+
+    def lap(self, stage: str):
+        pass
+
+    def reset(self):
+        pass
+
+
+NULL_STAGE_PROFILER = NullStageProfiler()
+
+
+# ==================== 检测流水线 ====================
+
+@dataclass(frozen=True)
+class DetectionParams:
+    """视频循环使用的检测参数快照（不可变）
+
+    滑块、预设、开关在Tk线程修改 self.config 后，重新构建一个完整的快照并整体替换 app.params；
+    视频循环每帧开头取一次引用，一帧之内看到的始终是同一组一致的参数，属性访问也比字典查找快。
+    """
+    __slots__ = ("gaussian_blur", "threshold", "dilate_iterations", "min_area", "continuous_frames",
+                 "alert_cooldown", "loop_delay", "max_frame_skip", "contour_gate_enabled",
+                 "illumination_suppress_enabled", "illumination_change_ratio", "illumination_min_shift",
+                 "illumination_settle_frames", "adaptive_fps_enabled", "idle_fps", "idle_after",
+                 "watchdog_enabled", "frozen_seconds", "cover_std", "view_shift_threshold", "tamper_frames",
+                 "event_update_interval", "zone_grid_enabled", "tracking_enabled", "track_max_missed",
+                 "track_max_distance", "track_edge_margin", "person_verify_enabled", "person_verify_timeout",
+                 "person_verify_fallback", "heatmap_enabled", "heatmap_interval", "heatmap_overlay",
+                 "motion_series_enabled", "max_failures", "auto_screenshot",
+                 "memory_cleanup_interval")
+    gaussian_blur: int
+    threshold: int
+    dilate_iterations: int
+    min_area: int
+    continuous_frames: int
+    alert_cooldown: float
+    loop_delay: float
+    max_frame_skip: int
+    contour_gate_enabled: bool
+    illumination_suppress_enabled: bool
+    illumination_change_ratio: float
+    illumination_min_shift: float
+    illumination_settle_frames: int
+    adaptive_fps_enabled: bool
+    idle_fps: float
+    idle_after: float
+    watchdog_enabled: bool
+    frozen_seconds: float
+    cover_std: float
+    view_shift_threshold: float
+    tamper_frames: int
+    event_update_interval: float
+    zone_grid_enabled: bool
+    tracking_enabled: bool
+    track_max_missed: int
+    track_max_distance: float
+    track_edge_margin: float
+    person_verify_enabled: bool
+    person_verify_timeout: float
+    person_verify_fallback: str
+    heatmap_enabled: bool
+    heatmap_interval: float
+    heatmap_overlay: bool
+    motion_series_enabled: bool
+    max_failures: int
+    auto_screenshot: bool
+    memory_cleanup_interval: float
+
+    def __post_init__(self):
+        if self.gaussian_blur < 1 or self.gaussian_blur % 2 == 0:
+            raise ValueError(f"gaussian_blur必须是正奇数: {self.gaussian_blur}")
+        if not 0 <= self.threshold <= 255:
+            raise ValueError(f"threshold超出范围[0, 255]: {self.threshold}")
+        if self.dilate_iterations < 0 or self.min_area < 0 or self.max_frame_skip < 0:
+            raise ValueError("dilate_iterations/min_area/max_frame_skip不能为负数")
+        if self.continuous_frames < 1:
+            raise ValueError(f"continuous_frames至少为1: {self.continuous_frames}")
+        if self.loop_delay <= 0 or self.idle_fps <= 0:
+            raise ValueError("loop_delay和idle_fps必须大于0")
+        if not 0 < self.illumination_change_ratio <= 1:
+            raise ValueError(f"illumination_change_ratio超出范围(0, 1]: {self.illumination_change_ratio}")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "DetectionParams":
+        """从配置字典构建快照；偶数模糊核自动加一，其余数值限制在合理范围内"""
+        def get(key):
+            return config.get(key, DEFAULT_CONFIG[key])
+
+        blur = max(1, int(get('gaussian_blur')))
+        return cls(
+            gaussian_blur=blur if blur % 2 else blur + 1,
+            threshold=max(0, min(255, int(get('threshold')))),
+            dilate_iterations=max(0, int(get('dilate_iterations'))),
+            min_area=max(0, int(get('min_area'))),
+            continuous_frames=max(1, int(get('continuous_frames'))),
+            alert_cooldown=max(0.0, float(get('alert_cooldown'))),
+            loop_delay=max(0.001, float(get('loop_delay'))),
+            max_frame_skip=max(0, int(get('max_frame_skip'))),
+            contour_gate_enabled=bool(get('contour_gate_enabled')),
+            illumination_suppress_enabled=bool(get('illumination_suppress_enabled')),
+            illumination_change_ratio=max(0.01, min(1.0, float(get('illumination_change_ratio')))),
+            illumination_min_shift=max(0.0, float(get('illumination_min_shift'))),
+            illumination_settle_frames=max(0, int(get('illumination_settle_frames'))),
+            adaptive_fps_enabled=bool(get('adaptive_fps_enabled')),
+            idle_fps=max(0.1, float(get('idle_fps'))),
+            idle_after=max(0.0, float(get('idle_after'))),
+            watchdog_enabled=bool(get('watchdog_enabled')),
+            frozen_seconds=max(0.5, float(get('frozen_seconds'))),
+            cover_std=max(0.0, float(get('cover_std'))),
+            view_shift_threshold=max(1.0, float(get('view_shift_threshold'))),
+            tamper_frames=max(1, int(get('tamper_frames'))),
+            event_update_interval=max(0.0, float(get('event_update_interval'))),
+            zone_grid_enabled=bool(get('zone_grid_enabled')),
+            tracking_enabled=bool(get('tracking_enabled')),
+            track_max_missed=max(0, int(get('track_max_missed'))),
+            track_max_distance=max(0.0, float(get('track_max_distance'))),
+            track_edge_margin=max(0.0, min(0.5, float(get('track_edge_margin')))),
+            person_verify_enabled=bool(get('person_verify_enabled')),
+            person_verify_timeout=max(0.0, float(get('person_verify_timeout'))),
+            person_verify_fallback=str(get('person_verify_fallback')),
+            heatmap_enabled=bool(get('heatmap_enabled')),
+            heatmap_interval=max(1.0, float(get('heatmap_interval'))),
+            heatmap_overlay=bool(get('heatmap_overlay')),
+            motion_series_enabled=bool(get('motion_series_enabled')),
+            max_failures=max(0, int(get('max_failures'))),
+            auto_screenshot=bool(get('auto_screenshot')),
+            memory_cleanup_interval=max(1.0, float(get('memory_cleanup_interval'))),
+        )
+
+
+class MotionDetector:
+    """帧差法运动检测（灰度→高斯模糊→差分→二值化→膨胀→轮廓），不依赖GUI，可单独用于基准测试
+
+    早退门限（近似）: 按"变化像素数≈物体面积"估算，膨胀后的像素数不超过 原像素数×(2k+1)²，
+    变化像素总数足够小时直接判定无运动，跳过膨胀、findContours和Python轮廓循环。
+    contourArea 按外轮廓计算、包含内部空洞，像素很少的空心细线框（如只有边缘变化的大物体）
+    面积可能超过min_area，这类情况会被门限当作无运动，需要严格结果时关闭 contour_gate_enabled。
+
+    全局光照抑制: 开关灯、云层遮挡会让几乎整个ROI超过阈值。变化像素占比超过
+    illumination_change_ratio 且平均亮度变化超过 illumination_min_shift 时，
+    直接以当前帧为新的参考帧并判定无运动，之后再观察几帧等待自动曝光稳定。
+    """
+    def __init__(self):
+        self.prev_frame = None
+        self.prev_mean = 0.0       # 参考帧的平均亮度
+        self.thresh = None  # 最近一帧的检测掩码（通常已膨胀；被门限1跳过时为未膨胀的二值化掩码）
+        self.changed_mask = None  # 最近一帧二值化后、膨胀前的掩码（与门限无关，供热力图等统计使用）
+        self.changed_pixels = 0  # 最近一帧二值化后的变化像素数
+        self.frames_evaluated = 0  # 进行了差分判定的帧数
+        self.gate_hits = 0         # 被早退门限直接判定为无运动的帧数
+        self.illumination_events = 0    # 被抑制的全局光照变化次数
+        self.illumination_frames = 0    # 因光照变化（含稳定期）跳过判定的帧数
+        self.last_brightness_shift = 0.0
+        self._settle_left = 0
+        self._mask_ref = None
+        self._mask_area = 0
+        self.active_pixels = 0  # 最近一帧参与检测的像素数
+
+    @property
+    def changed_ratio(self) -> float:
+        """最近一帧变化像素占参与检测像素的比例（本帧未做二值化时为0）"""
+        if self.thresh is None or not self.active_pixels:
+            return 0.0
+        return self.changed_pixels / self.active_pixels
+
+    @property
+    def gate_hit_rate(self) -> float:
+        return self.gate_hits / self.frames_evaluated if self.frames_evaluated else 0.0
+
+    def reset(self):
+        """丢弃参考帧（ROI变更或重连后调用）"""
+        self.prev_frame = None
+        self.thresh = None
+        self.changed_mask = None
+        self._settle_left = 0
+
+    def _active_area(self, gray, mask) -> int:
+        """参与检测的像素数（掩码只在变化时重新计数）"""
+        if mask is None:
+            return gray.size
+        if mask is not self._mask_ref:
+            self._mask_ref = mask
+            self._mask_area = cv2.countNonZero(mask)
+        return self._mask_area
+
+    def process(self, roi_frame, params: DetectionParams, prof=None, gate_area: Optional[int] = None,
+                mask=None) -> bool:
+        """处理一帧ROI图像（BGR或已是灰度），返回是否检测到面积超过min_area的运动
+
+        gate_area: 早退门限使用的面积（默认min_area），分区检测时传入各分区中最小的min_area
+        mask: 与roi_frame同尺寸的uint8掩码（多边形区域/屏蔽区），None表示整块ROI都参与检测
+        """
+        prof = prof or NULL_STAGE_PROFILER
+        gray = roi_frame if roi_frame.ndim == 2 else cv2.cvtColor(roi_frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (params.gaussian_blur, params.gaussian_blur), 0)
+        prof.lap('blur')
+
+        illumination = params.illumination_suppress_enabled
+        mean = cv2.mean(gray, mask)[0] if illumination else 0.0
+
+        if self.prev_frame is None or self.prev_frame.shape != gray.shape:
+            self.prev_frame = gray
+            self.prev_mean = mean
+            return False
+
+        self.frames_evaluated += 1
+        self.prev_frame, prev = gray, self.prev_frame
+        self.last_brightness_shift = shift = mean - self.prev_mean
+        self.prev_mean = mean
+
+        # 光照变化后的稳定期：只更新参考帧
+        if self._settle_left > 0:
+            self._settle_left -= 1
+            self.illumination_frames += 1
+            self.thresh = self.changed_mask = None
+            prof.lap('diff')
+            return False
+        min_area = params.min_area
+        gate_area = min_area if gate_area is None else gate_area
+        iterations = params.dilate_iterations
+        gate = params.contour_gate_enabled
+
+        frame_delta = cv2.absdiff(prev, gray)
+        thresh = cv2.threshold(frame_delta, params.threshold, 255, cv2.THRESH_BINARY)[1]
+        if mask is not None:
+            thresh = cv2.bitwise_and(thresh, mask)
+        self.changed_mask = thresh
+        self.changed_pixels = changed = cv2.countNonZero(thresh)
+        self.active_pixels = self._active_area(gray, mask)
+
+        # 全局光照变化：参考帧已换成当前帧，本帧不报警
+        if (illumination and abs(shift) >= params.illumination_min_shift
+                and changed >= params.illumination_change_ratio * self.active_pixels):
+            self.illumination_events += 1
+            self.illumination_frames += 1
+            self._settle_left = params.illumination_settle_frames
+            self.thresh = self.changed_mask = None
+            prof.lap('diff')
+            return False
+
+        # 门限1：膨胀前按最大膨胀倍数估算像素数，连膨胀一起跳过
+        if gate and changed * (2 * iterations + 1) ** 2 <= gate_area:
+            self.thresh = thresh
+            self.gate_hits += 1
+            prof.lap('diff')
+            return False
+
+        thresh = cv2.dilate(thresh, None, iterations=iterations)
+        self.thresh = thresh
+        prof.lap('diff')
+
+        # 门限2：膨胀后的实际像素数
+        if gate and cv2.countNonZero(thresh) <= gate_area:
+            self.gate_hits += 1
+            return False
+
+        motion_detected = False
+        # OpenCV 3.2+ 的findContours不再修改输入图像，无需copy
+        cnts, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for c in cnts:
+            if cv2.contourArea(c) > min_area:
+                motion_detected = True
+                break
+        prof.lap('contours')
+        return motion_detected
+
+
+# ==================== 黑匣子文件 ====================
+
+class BlackBoxFile:
+    """黑匣子环形文件格式（小端）
+
+    [文件头 64字节][索引 slot_count×24字节][数据 slot_count×slot_size字节]
+    文件头: 魔数、版本、slot_size、slot_count、宽、高、格式、下一个序号、创建时间、记录帧率
+    索引项: 序号(0表示空)、时间戳、数据长度；第seq帧写在 seq % slot_count 号槽位
+    写入顺序为 数据 → 索引 → 文件头序号，读取时校验序号，跳过正在被覆盖的槽位。
+    """
+    MAGIC = b"MMBBOX01"
+    VERSION = 1
+    HEADER_FORMAT = "<8sIIIHHB3xQdd"
+    HEADER_SIZE = 64
+    SEQ_OFFSET = struct.calcsize("<8sIIIHHB3x")  # 文件头中"下一个序号"的偏移
+    INDEX_FORMAT = "<QdII"  # 索引项: seq, t, length, reserved
+    INDEX_ITEMSIZE = struct.calcsize(INDEX_FORMAT)
+    _index_dtype = None     # 首次使用时构建，导入本模块时不加载numpy
+    FORMAT_GRAY = 0
+    FORMAT_JPEG = 1
+
+    @classmethod
+    def index_dtype(cls):
+        """索引项的numpy结构化类型（与 INDEX_FORMAT 布局一致）"""
+        if cls._index_dtype is None:
+            cls._index_dtype = np.dtype([('seq', '<u8'), ('t', '<f8'), ('length', '<u4'), ('reserved', '<u4')])
+        return cls._index_dtype
+
+    def __init__(self, mm, slot_size: int, slot_count: int, width: int, height: int, fmt: int,
+                 next_seq: int, created: float, fps: float):
+        self.mm = mm
+        self.slot_size = slot_size
+        self.slot_count = slot_count
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.next_seq = next_seq
+        self.created = created
+        self.fps = fps
+        self.index = np.ndarray(slot_count, dtype=self.index_dtype(), buffer=mm, offset=self.HEADER_SIZE)
+        self.data_start = self.HEADER_SIZE + slot_count * self.INDEX_ITEMSIZE
+        self.data = np.ndarray(slot_count * slot_size, dtype=np.uint8, buffer=mm, offset=self.data_start)
+
+    @classmethod
+    def file_size(cls, slot_size: int, slot_count: int) -> int:
+        return cls.HEADER_SIZE + slot_count * (cls.INDEX_ITEMSIZE + slot_size)
+
+    @classmethod
+    def from_mmap(cls, mm):
+        magic, version, slot_size, slot_count, width, height, fmt, next_seq, created, fps = \
+            struct.unpack_from(cls.HEADER_FORMAT, mm, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("不是黑匣子文件或版本不兼容")
+        if len(mm) < cls.file_size(slot_size, slot_count):
+            raise ValueError("黑匣子文件不完整")
+        return cls(mm, slot_size, slot_count, width, height, fmt, next_seq, created, fps)
+
+    def write_header(self):
+        struct.pack_into(self.HEADER_FORMAT, self.mm, 0, self.MAGIC, self.VERSION, self.slot_size,
+                         self.slot_count, self.width, self.height, self.fmt, self.next_seq, self.created, self.fps)
+
+    def append(self, payload, timestamp: float) -> bool:
+        """写入一帧（uint8数组），超过槽位大小时返回False"""
+        payload = payload.reshape(-1)
+        n = payload.size
+        if n > self.slot_size:
+            return False
+        seq = self.next_seq
+        slot = seq % self.slot_count
+        offset = slot * self.slot_size
+        self.index['seq'][slot] = 0  # 先作废旧索引，再覆盖数据
+        self.data[offset:offset + n] = payload
+        self.index[slot] = (seq, timestamp, n, 0)
+        self.next_seq = seq + 1
+        struct.pack_into("<Q", self.mm, self.SEQ_OFFSET, self.next_seq)
+        return True
+
+    def entries(self, start: Optional[float] = None, end: Optional[float] = None):
+        """按序号排列的有效索引项（可按时间窗口过滤），返回 (槽位, 索引项) 数组"""
+        index = self.index.copy()
+        slots = np.flatnonzero(index['seq'] > 0)
+        if start is not None:
+            slots = slots[index['t'][slots] >= start]
+        if end is not None:
+            slots = slots[index['t'][slots] <= end]
+        slots = slots[np.argsort(index['seq'][slots])]
+        return slots, index[slots]
+
+    def read(self, slot: int, entry):
+        """读取一帧并解码为BGR图像；槽位已被覆盖时返回None"""
+        offset = slot * self.slot_size
+        payload = self.data[offset:offset + int(entry['length'])].copy()
+        if self.index['seq'][slot] != entry['seq']:
+            return None
+        if self.fmt == self.FORMAT_JPEG:
+            image = cv2.imdecode(payload, cv2.IMREAD_COLOR)
+        else:
+            image = cv2.cvtColor(payload.reshape(self.height, self.width), cv2.COLOR_GRAY2BGR)
+        return image
+
+    def release(self):
+        """释放指向mmap的numpy视图（关闭mmap前必须调用）"""
+        self.index = self.data = None
+
+
+class BlackBoxReader:
+    """只读打开黑匣子文件（监控运行中也可读取），供导出工具使用"""
+    def __init__(self, path: str):
+        self._fh = open(path, "rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file = BlackBoxFile.from_mmap(self._mm)
+
+    def time_range(self) -> Tuple[Optional[float], Optional[float]]:
+        _, entries = self.file.entries()
+        if not len(entries):
+            return None, None
+        return float(entries['t'][0]), float(entries['t'][-1])
+
+    def frames(self, start: Optional[float] = None, end: Optional[float] = None):
+        """按时间顺序生成 (时间戳, BGR图像)"""
+        slots, entries = self.file.entries(start, end)
+        for slot, entry in zip(slots, entries):
+            image = self.file.read(slot, entry)
+            if image is not None:
+                yield float(entry['t']), image
+
+    def close(self):
+        self.file.release()
+        self._mm.close()
+        self._fh.close()
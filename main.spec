@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('cctv.ico', '.')],
-    hiddenimports=[],
+    # monitor.py 通过 importlib 延迟导入这些模块，PyInstaller 静态分析无法发现，需要显式声明
+    hiddenimports=['cv2', 'numpy', 'PIL.Image', 'PIL.ImageTk', 'PIL.ImageDraw', 'pystray', 'winsound'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,37 +1,59 @@
-import cv2
+import time
+_STARTUP_T0 = time.perf_counter()  # 启动计时起点（尽量早）
+
 import tkinter as tk
 from tkinter import messagebox, ttk
 import customtkinter as ctk
-from PIL import Image, ImageTk, ImageDraw
+import threading
 from threading import Thread, Lock
-import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import collections
+import queue
+import shutil
 import datetime
 import os
 import sys
-import winsound
 import json
+import math
+import mmap
+import random
 import logging
-from typing import Optional, Tuple, Dict, Any
-import pystray
-from pystray import MenuItem as item
+from typing import Optional, Tuple, Dict, Any, List
+
+from detection import (
+    _LazyModule, IMPORT_TIMES, SCRIPT_DIR, BLACKBOX_FILE, DEFAULT_CONFIG,
+    LatencyHistogram, StageProfiler, NullStageProfiler, DetectionParams, MotionDetector,
+    BlackBoxFile,
+)
+
+cv2 = _LazyModule("cv2", "cv2", globals())
+np = _LazyModule("numpy", "np", globals())
+Image = _LazyModule("PIL.Image", "Image", globals())
+ImageTk = _LazyModule("PIL.ImageTk", "ImageTk", globals())
+ImageDraw = _LazyModule("PIL.ImageDraw", "ImageDraw", globals())
+pystray = _LazyModule("pystray", "pystray", globals())
+winsound = _LazyModule("winsound", "winsound", globals())
+
+
+def preload_heavy_modules():
+    """在后台线程中预加载重量级模块，避免首次启动监控时卡顿"""
+    for name in ("cv2", "Image", "ImageTk"):
+        module = globals()[name]
+        if isinstance(module, _LazyModule):
+            module._load()
 
 # 设置CustomTkinter外观
 ctk.set_appearance_mode("dark")  # 深色主题
 ctk.set_default_color_theme("blue")  # 蓝色主题
 
 # --- 1. 环境与配置 (完全保留你的严谨逻辑) ---
-def get_base_path():
-    """获取脚本或打包后exe的根目录"""
-    # PyInstaller creates a temp folder and stores path in _MEIPASS
-    if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
-        return os.path.dirname(sys.executable)
-    else:
-        return os.path.dirname(os.path.abspath(__file__))
-
-SCRIPT_DIR = get_base_path()
+# SCRIPT_DIR、BLACKBOX_FILE 和 DEFAULT_CONFIG 定义在 detection.py（导出/基准工具也要用）
 LOG_FILE = os.path.join(SCRIPT_DIR, 'security_monitor.log')
 CONFIG_FILE = os.path.join(SCRIPT_DIR, 'config.json')
 SCREENSHOT_DIR = os.path.join(SCRIPT_DIR, 'screenshots')
+PROFILE_DIR = os.path.join(SCRIPT_DIR, 'profiles')  # 性能分析输出（与日志同级）
+HEATMAP_DIR = os.path.join(SCRIPT_DIR, 'heatmaps')  # 运动热力图快照
+MOTION_SERIES_FILE = os.path.join(SCRIPT_DIR, 'motion_series.npz')  # 运动强度历史（分钟/小时汇总）
 
 # 确保截图目录存在
 if not os.path.exists(SCREENSHOT_DIR):
@@ -44,29 +66,6 @@ logging.basicConfig(
     handlers=[logging.FileHandler(LOG_FILE, encoding='utf-8'), logging.StreamHandler()]
 )
 
-# 默认配置 (严格对应你脚本中的参数)
-DEFAULT_CONFIG = {
-    "camera_id": 0,
-    "min_area": 500,
-    "alert_cooldown": 3,
-    "loop_delay": 0.2,
-    "roi": None,
-    "threshold": 25,
-    "gaussian_blur": 21,
-    "dilate_iterations": 2,
-    "max_failures": 10,
-    "show_preview": True,
-    "auto_screenshot": True,
-    "manual_screenshot": True,
-    "continuous_frames": 3,      # 核心防抖参数
-    "screenshot_count": 3,       # 报警连拍张数
-    "screenshot_interval": 0.5,  # 连拍间隔
-    "auto_cleanup_enabled": True,  # 自动清理旧截图
-    "cleanup_days": 3,           # 保留截图天数
-    "memory_cleanup_interval": 3600,  # 内存清理间隔（秒）
-    "custom_presets": {}  # 用户自定义预设
-}
-
 # === 统一的UI配色方案 ===
 COLOR_BUTTON_BG = "#00B0F0"     # 按钮背景-亮蓝色 rgb(0,176,240)
 COLOR_TEXT_BLUE = "#00B0F0"     # 蓝色文字 rgb(0,176,240)
@@ -98,8 +97,1833 @@ def validate_roi(roi: Tuple[int, int, int, int], frame_shape: Tuple[int, int, in
     if x + w > frame_w or y + h > frame_h: return False
     return True
 
+def fourcc_to_str(code: float) -> str:
+    """CAP_PROP_FOURCC 返回的数值转成 'MJPG' 这样的四字符码"""
+    code = int(code)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ") or "?"
+
+
+def open_capture(camera_id, profile: Dict[str, Any]):
+    """打开摄像头并按采集配置协商格式，返回 (cap, 协商结果)；打不开时cap为None
+
+    设置顺序为 FOURCC → 分辨率 → 帧率 → 缓冲区（部分后端要求先设格式再设分辨率）。
+    摄像头不一定接受请求的参数，打开后逐项读回实际值，不一致的项记入 mismatch。
+    buffer_size=1 让驱动只保留最新一帧，避免读到排队中的旧画面。
+    """
+    cap = cv2.VideoCapture(camera_id)
+    if not cap.isOpened():
+        cap.release()
+        return None, {}
+
+    requested = {}
+    fourcc = profile.get('fourcc')
+    if fourcc:
+        requested['fourcc'] = fourcc = str(fourcc).upper()[:4].ljust(4)
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    for key, prop in (('width', cv2.CAP_PROP_FRAME_WIDTH), ('height', cv2.CAP_PROP_FRAME_HEIGHT),
+                      ('fps', cv2.CAP_PROP_FPS), ('buffer_size', cv2.CAP_PROP_BUFFERSIZE)):
+        if profile.get(key):
+            requested[key] = profile[key]
+            cap.set(prop, profile[key])
+
+    actual = {
+        'fourcc': fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': round(cap.get(cv2.CAP_PROP_FPS), 1),
+        'buffer_size': int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+    mismatch = []
+    for key, value in requested.items():
+        if key == 'fourcc':
+            same = actual['fourcc'] == value.strip()
+        elif key == 'fps':
+            same = abs(actual['fps'] - value) < 0.5
+        else:
+            same = actual[key] == int(value)
+        if not same:
+            mismatch.append(key)
+    return cap, {'requested': requested, 'actual': actual, 'mismatch': mismatch}
+
+
+class FrameDecoder:
+    """原始采集帧解码 - 亮度直通模式下检测只取亮度，彩色转换只对需要显示/保存的帧进行
+
+    mode:
+      'bgr'  : 普通模式，cap.read() 得到的已是BGR
+      'yuyv' : 关闭CONVERT_RGB的YUYV，每像素2字节，第0通道就是Y平面
+      'mjpeg': 关闭CONVERT_RGB的MJPG，帧为JPEG码流，IMREAD_GRAYSCALE只解码亮度、不做色度上采样和颜色转换
+    """
+    def __init__(self, mode: str = 'bgr', width: int = 0, height: int = 0):
+        self.mode = mode
+        self.width = width
+        self.height = height
+
+    @property
+    def luma_native(self) -> bool:
+        return self.mode != 'bgr'
+
+    @classmethod
+    def probe(cls, cap, width: int, height: int) -> "FrameDecoder":
+        """关闭CONVERT_RGB后读一帧判断原始格式；后端不支持时恢复BGR输出"""
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        ok, raw = cap.read()
+        if ok and raw is not None:
+            if (raw.ndim == 3 and raw.shape[2] == 2) or raw.size == width * height * 2:
+                return cls('yuyv', width, height)
+            if raw.size > 2 and raw.reshape(-1)[:2].tolist() == [0xFF, 0xD8]:  # JPEG SOI
+                return cls('mjpeg', width, height)
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        return cls('bgr', width, height)
+
+    def _yuyv(self, raw):
+        # 部分后端把YUYV返回为一行字节，按分辨率还原为 (h, w, 2)
+        return raw if raw.ndim == 3 else raw.reshape(self.height, self.width, 2)
+
+    def luma(self, raw):
+        """取整帧灰度图；MJPEG码流损坏时返回None"""
+        if self.mode == 'yuyv':
+            return cv2.extractChannel(self._yuyv(raw), 0)
+        if self.mode == 'mjpeg':
+            return cv2.imdecode(raw, cv2.IMREAD_GRAYSCALE)
+        return cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY)
+
+    def color(self, raw, copy: bool = False):
+        """取BGR彩色图（用于显示和保存）；copy=True时保证返回可写的独立副本"""
+        if self.mode == 'yuyv':
+            return cv2.cvtColor(self._yuyv(raw), cv2.COLOR_YUV2BGR_YUYV)
+        if self.mode == 'mjpeg':
+            return cv2.imdecode(raw, cv2.IMREAD_COLOR)
+        return raw.copy() if copy else raw
+
+
 # ==================== 辅助工具类 ====================
 
+class StartupTimer:
+    """启动阶段计时 - 记录导入、初始化各阶段耗时，以及首帧时间"""
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self._last = t0
+        self.phases = []  # [(阶段名, 阶段耗时ms, 距启动ms)]
+
+    def mark(self, name: str) -> float:
+        now = time.perf_counter()
+        self.phases.append((name, (now - self._last) * 1000, (now - self.t0) * 1000))
+        self._last = now
+        return (now - self.t0) * 1000
+
+    def since_start_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def summary(self) -> str:
+        return " | ".join(f"{name} {dur:.0f}ms" for name, dur, _ in self.phases)
+
+
+STARTUP = StartupTimer(_STARTUP_T0)
+
+
+class ScreenshotWriter:
+    """后台截图写入线程 - JPEG编码和磁盘写入不占用采集/报警线程"""
+    def __init__(self, on_written, maxsize=32):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.on_written = on_written  # 回调: (filepath, success, error, context)
+        self.thread = Thread(target=self._run, daemon=True, name="ScreenshotWriter")
+        self.thread.start()
+
+    @property
+    def depth(self) -> int:
+        """当前排队等待写入的截图数量"""
+        return self.queue.qsize()
+
+    def submit(self, filepath: str, frame, context=None) -> bool:
+        """提交写入任务，队列已满时立即返回False（不阻塞调用线程）"""
+        try:
+            self.queue.put_nowait((filepath, frame, context))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            filepath, frame, context = self.queue.get()
+            try:
+                # 使用imencode+文件写入，支持中文路径
+                success, encoded_img = cv2.imencode('.jpg', frame)
+                if success:
+                    with open(filepath, 'wb') as f:
+                        f.write(encoded_img.tobytes())
+                    self.on_written(filepath, True, None, context)
+                else:
+                    self.on_written(filepath, False, "JPEG编码失败", context)
+            except Exception as e:
+                self.on_written(filepath, False, e, context)
+            finally:
+                self.queue.task_done()
+
+
+class BlackBoxRecorder:
+    """黑匣子录像 - 把缩小后的画面循环写入固定大小的内存映射文件，不报警时也能回看最近几分钟
+
+    视频循环只按 fps 限速把帧引用放入队列（满则丢弃），缩放、JPEG编码和写入都在后台线程完成。
+    文件大小在创建时固定，之后只做顺序覆盖写，不产生任何新文件；参数变化时重建文件。
+    """
+    FLUSH_INTERVAL = 5.0  # 秒，定期把脏页刷到磁盘
+
+    def __init__(self, path: str, minutes: float = 5, fps: float = 5, width: int = 320,
+                 fmt: str = "jpeg", quality: int = 70):
+        self.path = path
+        self.fps = max(0.5, float(fps))
+        self.slot_count = max(1, int(minutes * 60 * self.fps))
+        self.width = max(16, int(width)) // 2 * 2
+        self.fmt = BlackBoxFile.FORMAT_GRAY if fmt == "gray" else BlackBoxFile.FORMAT_JPEG
+        self.quality = int(quality)
+        self.queue = queue.Queue(maxsize=4)
+        self.written = 0
+        self.dropped = 0   # 队列满或超出槽位大小而未写入的帧
+        self.error = None
+        self.file = None
+        self._fh = None
+        self._mm = None
+        self._last = 0.0
+        self._last_flush = 0.0
+        self.thread = Thread(target=self._run, daemon=True, name="BlackBox")
+        self.thread.start()
+
+    def offer(self, frame, now: float):
+        """视频循环每帧调用；按记录帧率取样，不阻塞"""
+        if now - self._last < 0.9 / self.fps:  # 留10%余量，避免帧间隔抖动导致漏帧
+            return
+        self._last = now
+        try:
+            self.queue.put_nowait((frame, now))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+
+    def _open(self, frame_shape):
+        """按第一帧的宽高比打开或重建环形文件"""
+        h, w = frame_shape[:2]
+        height = max(2, int(round(self.width * h / w)) // 2 * 2)
+        # JPEG每帧大小不定，槽位按未压缩灰度的一半预留，超出的帧丢弃
+        slot_size = self.width * height if self.fmt == BlackBoxFile.FORMAT_GRAY else self.width * height // 2
+        size = BlackBoxFile.file_size(slot_size, self.slot_count)
+        reuse = os.path.exists(self.path) and os.path.getsize(self.path) == size
+        self._fh = open(self.path, "r+b" if reuse else "w+b")
+        if not reuse:
+            self._fh.truncate(size)
+        self._mm = mmap.mmap(self._fh.fileno(), size)
+        if reuse:
+            try:
+                bb = BlackBoxFile.from_mmap(self._mm)
+                if (bb.width, bb.height, bb.fmt, bb.slot_size) == (self.width, height, self.fmt, slot_size):
+                    bb.fps = self.fps
+                    bb.write_header()
+                    return bb
+                bb.release()
+            except ValueError:
+                pass
+            self._mm[:BlackBoxFile.HEADER_SIZE + self.slot_count * BlackBoxFile.INDEX_ITEMSIZE] = \
+                bytes(BlackBoxFile.HEADER_SIZE + self.slot_count * BlackBoxFile.INDEX_ITEMSIZE)
+        bb = BlackBoxFile(self._mm, slot_size, self.slot_count, self.width, height, self.fmt, 1, time.time(), self.fps)
+        bb.write_header()
+        return bb
+
+    def _encode(self, frame):
+        bb = self.file
+        small = cv2.resize(frame, (bb.width, bb.height), interpolation=cv2.INTER_AREA)
+        if bb.fmt == BlackBoxFile.FORMAT_GRAY:
+            return small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        success, encoded = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return encoded if success else None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, timestamp = item
+            try:
+                if self.file is None:
+                    self.file = self._open(frame.shape)
+                payload = self._encode(frame)
+                if payload is not None and self.file.append(payload, timestamp):
+                    self.written += 1
+                else:
+                    self.dropped += 1
+                if timestamp - self._last_flush >= self.FLUSH_INTERVAL:
+                    self._last_flush = timestamp
+                    self._mm.flush()
+            except Exception as e:
+                self.error = str(e)
+                self.dropped += 1
+        self._shutdown()
+
+    def _shutdown(self):
+        if self.file is not None:
+            self.file.release()
+            self.file = None
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._fh.close()
+            self._mm = self._fh = None
+
+
+class PersonVerifier:
+    """二级人形确认 - 只对已通过防抖确认的运动帧做行人检测，过滤阴影、窗帘、屏幕闪烁等误报
+
+    backend 'hog': OpenCV自带的HOG行人检测器；'dnn': 本地YOLO格式ONNX模型（COCO类别0为人），cv2.dnn在CPU上推理。
+    检测在后台线程进行，队列长度为1，线程忙时不提交新帧，视频循环从不等待。
+    每个事件有一个时间预算: 预算内任一帧检测到人即确认；检查过的帧都没有人则否决；
+    一帧都没来得及检查完（模型太慢或加载失败）则由调用方按超时处理。
+    """
+    CONFIRMED = "confirmed"
+    REJECTED = "rejected"
+    TIMEOUT = "timeout"
+    MAX_HEIGHT = 480  # 送检图像的最大高度，更大的ROI先缩小
+
+    def __init__(self, backend: str = "hog", model_path: str = "", min_confidence: float = 0.5,
+                 input_size: int = 640):
+        self.backend = backend
+        self.model_path = model_path
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self.queue = queue.Queue(maxsize=1)
+        self.results = queue.SimpleQueue()  # (event_id, found, inference_ns, error)
+        self.inference = LatencyHistogram()  # 单帧检测耗时
+        self.decision = LatencyHistogram()   # 从运动确认到得出结论的耗时
+        self.outcomes = {self.CONFIRMED: 0, self.REJECTED: 0, self.TIMEOUT: 0}
+        self.busy = False
+        self.event_id = None  # 正在确认的事件
+        self.error = None
+        self._model = None
+        self._load_error = None  # 模型加载失败后不再重试，之后的事件都按超时处理
+        self._deadline = 0.0
+        self._started_ns = 0
+        self._checked = 0
+        self.thread = Thread(target=self._run, daemon=True, name="PersonVerifier")
+        self.thread.start()
+
+    @property
+    def pending(self) -> bool:
+        return self.event_id is not None
+
+    def begin(self, event_id: int, timeout: float):
+        """开始确认一个事件（之前未完成的事件直接丢弃）"""
+        self.event_id = event_id
+        self._deadline = time.monotonic() + timeout
+        self._started_ns = time.perf_counter_ns()
+        self._checked = 0
+
+    def wants_frame(self) -> bool:
+        """当前事件仍在预算内且检测线程空闲"""
+        return (self.pending and not self.busy and self._load_error is None
+                and time.monotonic() < self._deadline)
+
+    def submit(self, image) -> bool:
+        """提交一帧（ROI彩色图），不阻塞"""
+        try:
+            self.queue.put_nowait((self.event_id, image))
+            self.busy = True
+            return True
+        except queue.Full:
+            return False
+
+    def poll(self, force: bool = False) -> Optional[str]:
+        """取回检测结果，得出结论时返回 confirmed / rejected / timeout（force: 事件已结束，立即下结论）"""
+        outcome = None
+        while True:
+            try:
+                event_id, found, inference_ns, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.busy = False
+            self.error = error
+            if error is None:
+                self.inference.record(inference_ns)
+            if event_id != self.event_id or error is not None:
+                continue
+            self._checked += 1
+            if found:
+                outcome = self.CONFIRMED
+        if outcome is None and self.pending and (force or self._load_error is not None
+                                                 or time.monotonic() >= self._deadline):
+            outcome = self.REJECTED if self._checked else self.TIMEOUT
+        if outcome is not None:
+            self.outcomes[outcome] += 1
+            self.decision.record(time.perf_counter_ns() - self._started_ns)
+            self.event_id = None
+        return outcome
+
+    def stop(self):
+        """让后台线程在当前检测完成后退出并释放模型（只由提交帧的视频线程调用）"""
+        self.event_id = None
+        try:
+            self.queue.get_nowait()  # 丢弃还没开始检测的帧，给结束标记腾出位置
+        except queue.Empty:
+            pass
+        self.queue.put_nowait(None)
+
+    def _load(self):
+        if self.backend == "dnn":
+            net = cv2.dnn.readNetFromONNX(self.model_path)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            return net
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        return hog
+
+    def _detect(self, image) -> bool:
+        if image.shape[0] > self.MAX_HEIGHT:
+            scale = self.MAX_HEIGHT / image.shape[0]
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if self.backend != "dnn":
+            _, weights = self._model.detectMultiScale(image, winStride=(8, 8), padding=(8, 8), scale=1.05)
+            return len(weights) > 0 and float(np.max(weights)) >= self.min_confidence
+        size = self.input_size
+        blob = cv2.dnn.blobFromImage(image, 1 / 255.0, (size, size), swapRB=True, crop=False)
+        self._model.setInput(blob)
+        out = self._model.forward()[0]
+        if out.shape[0] < out.shape[1]:
+            out = out.T  # YOLOv8: (84, N) -> (N, 84)
+        # YOLOv5 每行为 [x, y, w, h, obj, 类别分数...]，YOLOv8 没有obj列
+        person = out[:, 4] * out[:, 5] if out.shape[1] == 85 else out[:, 4]
+        return out.shape[0] > 0 and float(person.max()) >= self.min_confidence
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self._model = None
+                return
+            event_id, image = item
+            if self._model is None and self._load_error is None:
+                try:
+                    self._model = self._load()
+                except Exception as e:
+                    self._load_error = f"模型加载失败: {e}"
+            if self._load_error is not None:
+                self.results.put((event_id, False, 0, self._load_error))
+                continue
+            start = time.perf_counter_ns()
+            try:
+                found = self._detect(image)
+                self.results.put((event_id, found, time.perf_counter_ns() - start, None))
+            except Exception as e:
+                self.results.put((event_id, False, 0, str(e)))
+
+    def summary(self) -> str:
+        o = self.outcomes
+        text = f"通过{o[self.CONFIRMED]} 否决{o[self.REJECTED]} 超时{o[self.TIMEOUT]}"
+        if self.decision.count:
+            text += f" p50 {self.decision.percentile(0.5) / 1e6:.0f}ms"
+        return text
+
+
+class AlertTrace:
+    """单次报警的延迟追踪记录 - 从触发帧的采集时刻到各输出端（弹窗/声音/文件）"""
+    __slots__ = ("alert_id", "frame_id", "capture_ns", "wall_time", "sinks")
+
+    def __init__(self, alert_id: int, frame_id: int, capture_ns: int):
+        self.alert_id = alert_id
+        self.frame_id = frame_id
+        self.capture_ns = capture_ns      # 触发帧采集时刻（perf_counter_ns，单调时钟）
+        self.wall_time = time.time()
+        self.sinks = {}                   # sink -> 到达时刻（perf_counter_ns）
+
+    def latency_ms(self, sink: str) -> Optional[float]:
+        t = self.sinks.get(sink)
+        return None if t is None else (t - self.capture_ns) / 1e6
+
+
+class AlertTracer:
+    """报警端到端延迟追踪 - 记录日志、聚合直方图，并可导出 Chrome trace-event JSON"""
+    SINKS = (
+        ("detect", "检测判定"),
+        ("verify", "人形确认"),
+        ("popup", "弹窗"),
+        ("sound", "声音"),
+        ("file", "首张截图落盘"),
+    )
+
+    def __init__(self, max_traces=200):
+        self.traces = collections.deque(maxlen=max_traces)
+        self.histograms = {name: LatencyHistogram() for name, _ in self.SINKS}
+        self.lock = Lock()
+
+    def start(self, alert_id: int, frame_id: int, capture_ns: int) -> AlertTrace:
+        trace = AlertTrace(alert_id, frame_id, capture_ns)
+        with self.lock:
+            self.traces.append(trace)
+        return trace
+
+    def mark(self, trace: Optional[AlertTrace], sink: str):
+        """记录某个输出端的到达时刻（每个输出端只记录第一次）"""
+        if trace is None:
+            return
+        now = time.perf_counter_ns()
+        with self.lock:
+            if sink in trace.sinks:
+                return
+            trace.sinks[sink] = now
+        latency_ns = now - trace.capture_ns
+        self.histograms[sink].record(latency_ns)
+        logging.info(f"报警追踪 #{trace.alert_id} (帧{trace.frame_id}): {sink} +{latency_ns / 1e6:.1f}ms")
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """生成 Chrome trace-event 格式（可在 chrome://tracing 或 Perfetto 中打开）"""
+        sink_tids = {name: i + 1 for i, (name, _) in enumerate(self.SINKS)}
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                  for name, tid in sink_tids.items()]
+        with self.lock:
+            traces = list(self.traces)
+        for trace in traces:
+            start_us = trace.capture_ns / 1000.0
+            for sink, t in trace.sinks.items():
+                events.append({
+                    "name": f"alert#{trace.alert_id} {sink}",
+                    "cat": "alert",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": sink_tids[sink],
+                    "ts": start_us,
+                    "dur": (t - trace.capture_ns) / 1000.0,
+                    "args": {"alert_id": trace.alert_id, "frame_id": trace.frame_id,
+                             "wall_time": datetime.datetime.fromtimestamp(trace.wall_time).isoformat()},
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+
+
+class MotionEvent:
+    """一次运动事件 - 从确认运动到冷却结束，事件ID同时作为报警追踪ID"""
+    __slots__ = ("event_id", "start_time", "end_time", "peak_area", "frames", "zones", "updates", "suppressed")
+
+    def __init__(self, event_id: int, start_time: float):
+        self.event_id = event_id
+        self.start_time = start_time
+        self.end_time = None      # None表示事件仍在进行
+        self.peak_area = 0        # 峰值变化像素数
+        self.frames = 0           # 检测到运动的帧数
+        self.zones = []           # 触发过的分区（按首次出现顺序）
+        self.updates = 0          # 已发送的进行中更新次数
+        self.suppressed = False   # 是否因目标已报过警而未报警
+
+    @property
+    def duration(self) -> float:
+        end = self.end_time if self.end_time is not None else time.time()
+        return end - self.start_time
+
+
+class EventTracker:
+    """运动事件状态机: idle → candidate → active → cooling → closed(回到idle)
+
+    滞回: 需要连续 continuous_frames 帧确认才进入 active；进入后运动短暂消失只进入 cooling，
+    cooling_time 秒内再次出现运动仍属于同一事件。因此持续停留的人只产生一次报警，
+    报警输出（弹窗/声音/连拍）按事件触发，进行中可选择每隔 update_interval 秒发一次更新。
+    """
+    IDLE = "idle"
+    CANDIDATE = "candidate"
+    ACTIVE = "active"
+    COOLING = "cooling"
+    STATE_LABELS = {IDLE: "空闲", CANDIDATE: "待确认", ACTIVE: "进行中", COOLING: "冷却"}
+
+    def __init__(self):
+        self.state = self.IDLE
+        self.event = None          # 进行中的事件
+        self.count = 0             # 已开始的事件数（即最近的事件ID）
+        self.last_event = None     # 最近结束的事件
+        self.total_duration = 0.0  # 已结束事件的累计时长（秒）
+        self._last_motion = 0.0
+        self._last_update = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.event is not None
+
+    def update(self, motion: bool, confirmed: bool, area: int, zones, now: float,
+               cooling_time: float, update_interval: float = 0) -> Optional[str]:
+        """每帧调用，返回 'start' / 'update' / 'end' 或 None
+
+        motion: 本帧原始检测结果；confirmed: 防抖确认后的结果；area: 本帧变化像素数
+        """
+        event = self.event
+        if event is None:
+            if not confirmed:
+                self.state = self.CANDIDATE if motion else self.IDLE
+                return None
+            self.count += 1
+            self.event = event = MotionEvent(self.count, now)
+            self.state = self.ACTIVE
+            self._last_update = now
+            self._record(event, area, zones, now)
+            return 'start'
+
+        if motion or confirmed:
+            self.state = self.ACTIVE
+            self._record(event, area, zones, now)
+            if update_interval > 0 and now - self._last_update >= update_interval:
+                self._last_update = now
+                event.updates += 1
+                return 'update'
+            return None
+
+        self.state = self.COOLING
+        if now - self._last_motion >= cooling_time:
+            self.close()
+            return 'end'
+        return None
+
+    def _record(self, event: MotionEvent, area: int, zones, now: float):
+        event.frames += 1
+        if area > event.peak_area:
+            event.peak_area = area
+        for zone in zones:
+            if zone not in event.zones:
+                event.zones.append(zone)
+        self._last_motion = now
+
+    def close(self) -> Optional[MotionEvent]:
+        """结束进行中的事件（停止监控时也会调用），结束时间取最后一次检测到运动的时刻"""
+        event, self.event = self.event, None
+        self.state = self.IDLE
+        if event is not None:
+            event.end_time = max(self._last_motion, event.start_time)
+            self.total_duration += event.duration
+            self.last_event = event
+        return event
+
+
+class SamplingProfiler:
+    """采样式性能分析 - 定期抓取各线程调用栈，输出火焰图格式(collapsed stacks)和文本摘要
+
+    不需要重启程序，也不需要目标线程配合，可在生产环境中随时开启。
+    """
+    def __init__(self, duration: float, interval: float = 0.005):
+        self.duration = duration
+        self.interval = interval
+        self.stacks = collections.Counter()  # "线程;栈底;...;栈顶" -> 采样次数
+        self.samples = 0
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _frame_label(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def run(self):
+        """在调用线程中执行采样，直到达到设定时长"""
+        own_id = threading.get_ident()
+        start = time.perf_counter()
+        end = start + self.duration
+        while time.perf_counter() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        self.elapsed = time.perf_counter() - start
+
+    def write_folded(self, path: str):
+        """写出 collapsed stacks（flamegraph.pl / speedscope 可直接打开）"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def summary(self, top: int = 25) -> str:
+        """按线程统计自身耗时和累计耗时最高的函数"""
+        per_thread = collections.defaultdict(lambda: (collections.Counter(), collections.Counter(), [0]))
+        for stack, count in self.stacks.items():
+            parts = stack.split(";")
+            own, total, thread_total = per_thread[parts[0]]
+            thread_total[0] += count
+            own[parts[-1]] += count
+            for func in set(parts[1:]):
+                total[func] += count
+
+        lines = [f"采样时长: {self.elapsed:.1f}s, 采样次数: {self.samples}, 间隔: {self.interval * 1000:.1f}ms", ""]
+        for thread_name, (own, total, thread_total) in sorted(per_thread.items(), key=lambda kv: -kv[1][2][0]):
+            n = thread_total[0]
+            lines.append(f"=== 线程 {thread_name} ({n} 个样本) ===")
+            lines.append(f"{'自身%':>7} {'累计%':>7}  函数")
+            for func, c in own.most_common(top):
+                lines.append(f"{100.0 * c / n:>6.1f}% {100.0 * total[func] / n:>6.1f}%  {func}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+class MetricsWriter:
+    """Prometheus 文本格式（0.0.4）生成器"""
+    # 直方图导出时使用的固定边界（秒）
+    LATENCY_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def _declare(self, name, metric_type, help_text):
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {metric_type}")
+
+    @staticmethod
+    def _labels(labels) -> str:
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels.items():
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    @staticmethod
+    def _value(value) -> str:
+        # 整数原样输出，避免大计数器（如磁盘字节数）被科学计数法截断精度
+        if isinstance(value, (bool, int)):
+            return str(int(value))
+        return repr(float(value))
+
+    def gauge(self, name, help_text, value, labels=None):
+        self._declare(name, "gauge", help_text)
+        self.lines.append(f"{name}{self._labels(labels)} {self._value(value)}")
+
+    def counter(self, name, help_text, value, labels=None):
+        self._declare(name, "counter", help_text)
+        self.lines.append(f"{name}{self._labels(labels)} {self._value(value)}")
+
+    def histogram(self, name, help_text, hist: "LatencyHistogram", labels=None):
+        """将对数分桶直方图折算到固定边界后导出（单位：秒）"""
+        self._declare(name, "histogram", help_text)
+        labels = dict(labels or {})
+        counts = list(hist.counts)  # 拷贝，避免采集线程同时写入
+        total = sum(counts)
+        idx = 0
+        cumulative = 0
+        for bound in self.LATENCY_BOUNDS:
+            bound_ns = bound * 1e9
+            while idx < len(counts) and LatencyHistogram.bucket_upper_ns(idx) <= bound_ns:
+                cumulative += counts[idx]
+                idx += 1
+            self.lines.append(f"{name}_bucket{self._labels({**labels, 'le': f'{bound:g}'})} {cumulative}")
+        self.lines.append(f"{name}_bucket{self._labels({**labels, 'le': '+Inf'})} {total}")
+        self.lines.append(f"{name}_sum{self._labels(labels)} {hist.total_ns / 1e9:.6f}")
+        self.lines.append(f"{name}_count{self._labels(labels)} {total}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+class MetricsServer:
+    """本地HTTP指标服务 - 在独立线程中提供 /metrics，绝不阻塞视频循环"""
+    def __init__(self, collect, host="127.0.0.1", port=9108):
+        self.collect = collect  # 回调: collect(MetricsWriter)
+        self.host = host
+        self.port = port
+        self.httpd = None
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    writer = MetricsWriter()
+                    server.collect(writer)
+                    body = writer.render().encode("utf-8")
+                except Exception as e:
+                    logging.error(f"生成指标失败: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 避免每次抓取都写日志
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        Thread(target=self.httpd.serve_forever, daemon=True, name="MetricsServer").start()
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+class ConfigStore:
+    """config.json 持久化 - 原子写入、合并短时间内的多次保存、检测外部修改
+
+    写入先落到同目录的临时文件，fsync后用 os.replace 原子替换，中途崩溃不会留下半个文件。
+    save() 在调用线程上序列化当前配置（避免与Tk线程修改字典竞争），由定时器延迟写盘，
+    拖动滑块等连续修改只写一次。文件损坏时备份为 config.json.corrupt-时间戳 后使用默认配置。
+    """
+    def __init__(self, path: str, defaults: Dict[str, Any], delay: float = 1.0):
+        self.path = path
+        self.defaults = defaults
+        self.delay = delay
+        self.load_error = None   # 最近一次加载失败的说明（供界面写日志）
+        self.writes = 0
+        self._lock = Lock()
+        self._timer = None
+        self._pending = None     # 待写入的JSON文本
+        self._mtime_ns = None    # 最近一次由本程序读/写后的文件修改时间
+
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self) -> Dict[str, Any]:
+        """读取配置并补齐缺省项；文件损坏时备份并返回默认配置"""
+        config = dict(self.defaults)
+        self.load_error = None
+        if not os.path.exists(self.path):
+            return config
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                user_config = json.load(f)
+            if not isinstance(user_config, dict):
+                raise ValueError("顶层不是JSON对象")
+            config.update(user_config)
+        except (OSError, ValueError) as e:
+            backup = f"{self.path}.corrupt-{datetime.datetime.now():%Y%m%d_%H%M%S}"
+            try:
+                shutil.copy2(self.path, backup)
+                self.load_error = f"配置文件损坏({e})，已备份为 {os.path.basename(backup)}，使用默认配置"
+            except OSError as copy_error:
+                self.load_error = f"配置文件损坏({e})，备份失败({copy_error})，使用默认配置"
+            logging.error(self.load_error)
+        self._mtime_ns = self._stat_mtime()  # 损坏的文件在再次被修改前不重复报告
+        return config
+
+    def save(self, config: Dict[str, Any], immediate: bool = False):
+        """保存配置；默认延迟delay秒写盘，期间的多次保存合并为一次"""
+        text = json.dumps(config, indent=4, ensure_ascii=False)
+        with self._lock:
+            self._pending = text
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not immediate:
+                self._timer = threading.Timer(self.delay, self._flush_timer)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """立即写入待保存的配置（没有待写内容时什么也不做）"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            text, self._pending = self._pending, None
+            if text is None:
+                return
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._mtime_ns = self._stat_mtime()
+                self.writes += 1
+            except OSError as e:
+                if self._pending is None:
+                    self._pending = text  # 保留待写内容，下次保存/退出时重试
+                logging.error(f"配置保存失败: {e}")
+                raise
+
+    def _flush_timer(self):
+        """定时器线程上的延迟写盘，失败已记录日志，不向线程抛出"""
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def changed_externally(self) -> bool:
+        """文件是否被其它程序修改过（有待写入内容时不算，以本程序的修改为准）"""
+        with self._lock:
+            if self._pending is not None:
+                return False
+            mtime = self._stat_mtime()
+            return mtime is not None and mtime != self._mtime_ns
+
+
+def scan_dir_usage(path: str) -> Tuple[int, int]:
+    """统计目录下文件总大小和数量（不递归）"""
+    total_bytes = 0
+    file_count = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file():
+                    total_bytes += entry.stat().st_size
+                    file_count += 1
+    except OSError:
+        pass
+    return total_bytes, file_count
+
+
+class AdaptiveFrameRate:
+    """自适应帧率 - 安静一段时间后降到空闲帧率，任何运动迹象立即恢复全速
+
+    全速判定: motion_frame_count > 0（哪怕尚未达到报警帧数）或仍处于报警冷却期内。
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        now = time.monotonic()
+        self.idle = False
+        self.last_activity = now
+        self._last_update = now
+        self.active_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.saved_cpu_seconds = 0.0  # 估算：空闲期间少处理的帧数 × 平均每帧工作耗时
+        self.work_ema = 0.0           # 每帧工作耗时（不含休眠）的指数滑动平均
+
+    def update(self, activity: bool, work_seconds: float, params: "DetectionParams") -> float:
+        """每帧调用一次，返回本帧之后应使用的帧间隔（秒）"""
+        now = time.monotonic()
+        dt = now - self._last_update
+        self._last_update = now
+
+        full_period = params.loop_delay
+        idle_period = 1.0 / params.idle_fps
+        self.work_ema = work_seconds if self.work_ema == 0 else 0.9 * self.work_ema + 0.1 * work_seconds
+
+        # 累计上一段时间所处模式（调度器按截止时间保持帧率，工作耗时超过帧间隔时帧率受限于工作耗时）
+        if self.idle:
+            self.idle_seconds += dt
+            full_rate = 1.0 / max(full_period, self.work_ema, 1e-3)
+            idle_rate = 1.0 / max(idle_period, self.work_ema, 1e-3)
+            self.saved_cpu_seconds += max(full_rate - idle_rate, 0.0) * dt * self.work_ema
+        else:
+            self.active_seconds += dt
+
+        if not params.adaptive_fps_enabled:
+            self.idle = False
+            return full_period
+
+        if activity:
+            self.last_activity = now
+            self.idle = False
+        elif not self.idle and now - self.last_activity >= params.idle_after:
+            self.idle = True
+        return idle_period if self.idle else full_period
+
+    def summary(self) -> str:
+        total = self.active_seconds + self.idle_seconds
+        idle_pct = 100.0 * self.idle_seconds / total if total > 0 else 0.0
+        mode = "空闲" if self.idle else "全速"
+        return f"{mode} | 空闲{idle_pct:.0f}% | 省CPU {self.saved_cpu_seconds:.0f}s"
+
+
+class FrameScheduler:
+    """基于 time.monotonic() 截止时间的帧调度器
+
+    固定sleep会让实际帧率变成 1/(工作耗时+延迟)，并随负载漂移；这里按截止时间补足剩余时间，
+    保持目标帧率。落后超过一个帧间隔时返回错过的帧数（调用方按驱动缓冲的积压用 cap.grab() 丢弃，
+    不解码，并把实际丢弃的帧数记入 dropped_frames），并重新对齐截止时间，不去追赶已经错过的时隙。
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.next_deadline = None
+        self.late_frames = 0     # 工作耗时超过帧间隔的次数
+        self.dropped_frames = 0  # 因落后而实际丢弃的积压帧数（由调用方累加）
+
+    def wait(self, period: float, max_skip: int = 5) -> int:
+        """等待到下一个截止时间，返回错过的帧数（最多max_skip）"""
+        now = time.monotonic()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        self.next_deadline += period
+
+        remaining = self.next_deadline - now
+        if remaining > 0:
+            time.sleep(remaining)
+            return 0
+
+        # 已经迟到
+        self.late_frames += 1
+        skip = min(int(-remaining // period), max_skip) if period > 0 else 0
+        self.next_deadline = now  # 重新对齐
+        return skip
+
+
+class CaptureSupervisor:
+    """摄像头连接监督 - 读帧持续失败时在后台线程重连（指数退避+随机抖动，不限次数）
+
+    状态: streaming(正常出帧) / degraded(连续读帧失败，尚未超过max_failures) / reconnecting(后台重连中)
+    视频线程只调用 frame_ok / frame_failed / take_capture，不会被重连的等待阻塞在sleep里，
+    也不再因为重试次数用完而停止监控。每次故障从第一帧失败计到恢复出帧，记为一次停机时间。
+    opener 在重连线程中执行，只负责打开连接；返回的 (cap, 附加信息) 由视频线程取走后再应用。
+    """
+    STREAMING = "streaming"
+    DEGRADED = "degraded"
+    RECONNECTING = "reconnecting"
+    STATE_LABELS = {STREAMING: "正常", DEGRADED: "不稳定", RECONNECTING: "重连中"}
+
+    def __init__(self, opener, log=None, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.opener = opener        # 无参函数，返回 (cap, 附加信息)，失败返回None
+        self.log = log or logging.info
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = self.STREAMING
+        self.consecutive_failures = 0
+        self.incidents = 0          # 进入重连的故障次数
+        self.attempts = 0           # 累计重连尝试次数
+        self.total_downtime = 0.0   # 累计停机秒数（含未进入重连的短暂失败）
+        self.last_downtime = 0.0
+        self._down_since = None
+        self._incident_attempts = 0
+        self._new_cap = None
+        self._lock = Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+
+    def frame_ok(self):
+        """成功读到一帧"""
+        if self._down_since is not None:
+            self.last_downtime = time.monotonic() - self._down_since
+            self.total_downtime += self.last_downtime
+            self._down_since = None
+        self.consecutive_failures = 0
+        self.state = self.STREAMING
+
+    def frame_failed(self, max_failures: int) -> bool:
+        """读帧失败；连续失败超过max_failures时启动后台重连并返回True（调用方应释放旧cap）"""
+        self.consecutive_failures += 1
+        if self.state == self.STREAMING:
+            self.state = self.DEGRADED
+            self._down_since = time.monotonic()
+        if self.state == self.DEGRADED and self.consecutive_failures > max_failures:
+            self.state = self.RECONNECTING
+            self.incidents += 1
+            self._incident_attempts = 0
+            self._ready.clear()
+            Thread(target=self._reconnect_loop, daemon=True, name="CaptureReconnect").start()
+            return True
+        return False
+
+    def restart(self, down_since: Optional[float] = None) -> bool:
+        """主动重置连接（如画面冻结），立即开始后台重连；已在重连中时返回False"""
+        if self.state == self.RECONNECTING:
+            return False
+        if self._down_since is None:
+            self._down_since = down_since if down_since is not None else time.monotonic()
+        self.consecutive_failures = 0
+        self.state = self.DEGRADED
+        return self.frame_failed(-1)
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次失败后的等待时间：指数增长封顶，再取[50%, 100%]的随机抖动，避免多台设备同时重试"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _reconnect_loop(self):
+        while not self._stop.is_set():
+            self.attempts += 1
+            self._incident_attempts += 1
+            try:
+                opened = self.opener()
+            except Exception as e:
+                self.log(f"重连出错: {e}")
+                opened = None
+            if opened is not None:
+                with self._lock:
+                    if self._stop.is_set():
+                        opened[0].release()
+                    else:
+                        self._new_cap = opened
+                self._ready.set()
+                return
+            delay = self.backoff(self._incident_attempts)
+            self.log(f"摄像头重连失败 (第{self._incident_attempts}次)，{delay:.1f}秒后重试")
+            self._stop.wait(delay)
+
+    def wait(self, timeout: float):
+        """重连期间视频线程在此等待，新连接就绪或超时即返回"""
+        self._ready.wait(timeout)
+
+    def take_capture(self):
+        """取走后台重连成功的 (cap, 附加信息)（没有时返回None）；取走后回到degraded，等第一帧读到再恢复streaming"""
+        with self._lock:
+            opened, self._new_cap = self._new_cap, None
+            if opened is not None:
+                self.state = self.DEGRADED
+                self.consecutive_failures = 0
+                self._ready.clear()
+        if opened is not None:
+            downtime = time.monotonic() - self._down_since if self._down_since is not None else 0.0
+            self.log(f"摄像头已恢复: 本次中断 {downtime:.1f}秒，重试{self._incident_attempts}次 "
+                     f"(累计故障{self.incidents}次)")
+        return opened
+
+    def stop(self):
+        """停止监控时调用，终止后台重连"""
+        self._stop.set()
+        self._ready.set()
+        with self._lock:
+            opened, self._new_cap = self._new_cap, None
+        if opened is not None:
+            opened[0].release()
+
+    @property
+    def downtime(self) -> float:
+        """累计停机时间（含进行中的故障）"""
+        ongoing = time.monotonic() - self._down_since if self._down_since is not None else 0.0
+        return self.total_downtime + ongoing
+
+    def summary(self) -> str:
+        label = self.STATE_LABELS[self.state]
+        return f"{label} | 故障{self.incidents}次 | 中断{self.downtime:.0f}s"
+
+
+class NoiseCalibrator:
+    """噪声基底校准 - 在无人的场景下观察一段时间，根据噪声统计建议检测参数
+
+    前半段: 对几个候选模糊核分别用 np.bincount 累计帧差直方图，选出噪声分位数可接受的
+            最小模糊核（保留细节），并把threshold设在该噪声水平之上。
+    后半段: 用选定参数跑二值化+膨胀，connectedComponentsWithStats 统计每帧最大的噪声斑块面积，
+            min_area 取其高分位数再留余量；噪声斑块连续出现的最长帧数决定 continuous_frames。
+    """
+    BLUR_CANDIDATES = (5, 11, 21, 31)
+    NOISE_QUANTILE = 0.999  # 帧差噪声分位数
+    TARGET_NOISE = 12       # 可接受的噪声分位数（灰度级），超过则换更大的模糊核
+    MIN_FRAMES = 5          # 每个阶段至少需要的有效帧数
+
+    def __init__(self, duration: float):
+        self.duration = max(2.0, float(duration))
+        self.started = time.time()
+        self.hist = {k: np.zeros(256, dtype=np.int64) for k in self.BLUR_CANDIDATES}
+        self.noise_levels = {}
+        self.blur = None
+        self.threshold = None
+        self.max_blobs = []   # 后半段每帧最大噪声斑块面积
+        self._prev = {}
+        self._diff_frames = 0
+
+    @property
+    def progress(self) -> float:
+        return min(1.0, (time.time() - self.started) / self.duration)
+
+    def _delta(self, key, blurred):
+        prev = self._prev.get(key)
+        self._prev[key] = blurred
+        if prev is None or prev.shape != blurred.shape:
+            return None
+        return cv2.absdiff(prev, blurred)
+
+    @staticmethod
+    def _quantile(hist, q: float) -> int:
+        total = int(hist.sum())
+        if total == 0:
+            return 0
+        return int(np.searchsorted(np.cumsum(hist), q * total))
+
+    def _choose_threshold(self):
+        self.noise_levels = {k: self._quantile(self.hist[k], self.NOISE_QUANTILE) for k in self.BLUR_CANDIDATES}
+        acceptable = [k for k in self.BLUR_CANDIDATES if self.noise_levels[k] <= self.TARGET_NOISE]
+        self.blur = acceptable[0] if acceptable else self.BLUR_CANDIDATES[-1]
+        self.threshold = int(min(50, max(10, math.ceil(self.noise_levels[self.blur] * 1.5) + 3)))
+        self._prev = {}
+
+    def feed(self, roi_frame, params: DetectionParams, mask=None) -> bool:
+        """送入一帧ROI图像（BGR或灰度），返回校准是否已结束"""
+        gray = roi_frame if roi_frame.ndim == 2 else cv2.cvtColor(roi_frame, cv2.COLOR_BGR2GRAY)
+        if self.progress < 0.5:
+            for k in self.BLUR_CANDIDATES:
+                delta = self._delta(k, cv2.GaussianBlur(gray, (k, k), 0))
+                if delta is None:
+                    continue
+                values = delta[mask > 0] if mask is not None else delta.ravel()
+                self.hist[k] += np.bincount(values, minlength=256)
+                self._diff_frames += k == self.BLUR_CANDIDATES[0]
+            return False
+
+        if self.blur is None:
+            self._choose_threshold()
+        delta = self._delta(self.blur, cv2.GaussianBlur(gray, (self.blur, self.blur), 0))
+        if delta is not None:
+            thresh = cv2.threshold(delta, self.threshold, 255, cv2.THRESH_BINARY)[1]
+            if mask is not None:
+                thresh = cv2.bitwise_and(thresh, mask)
+            thresh = cv2.dilate(thresh, None, iterations=params.dilate_iterations)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+            self.max_blobs.append(int(stats[1:, cv2.CC_STAT_AREA].max()) if n > 1 else 0)
+        return self.progress >= 1.0
+
+    def propose(self) -> Optional[Dict[str, int]]:
+        """根据统计结果给出参数建议，有效帧数不足时返回None"""
+        if self._diff_frames < self.MIN_FRAMES or len(self.max_blobs) < self.MIN_FRAMES:
+            return None
+        areas = np.array(self.max_blobs)
+        min_area = int(max(50, math.ceil(np.percentile(areas, 99) * 1.5 / 10) * 10))
+
+        # 面积达到min_area一半的噪声斑块最长连续出现了几帧
+        noisy = np.concatenate(([0], (areas > min_area / 2).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(noisy))
+        longest_run = int((edges[1::2] - edges[::2]).max()) if len(edges) else 0
+
+        return {
+            "threshold": self.threshold,
+            "min_area": min_area,
+            "continuous_frames": max(2, min(10, longest_run + 1)),
+            "gaussian_blur": self.blur,
+        }
+
+    def summary(self) -> str:
+        noise = ", ".join(f"k{k}:{v}" for k, v in self.noise_levels.items())
+        peak = max(self.max_blobs) if self.max_blobs else 0
+        return f"帧差噪声p99.9[{noise}] 最大噪声斑块{peak}px 样本{self._diff_frames}+{len(self.max_blobs)}帧"
+
+
+class CaptureWatchdog:
+    """采集看门狗 - 用极小的缩略签名发现画面冻结、镜头遮挡和视角突变
+
+    每帧只取一次跨步采样（约1/64像素），在采样上比较并缩小到 32×24 签名（约0.1毫秒）:
+      冻结: 跨步采样的原始像素与上一帧完全相同（真实传感器总有噪声），持续 frozen_seconds 秒
+      遮挡: 签名标准差低于 cover_std（画面几乎全黑或均一），持续 tamper_frames 帧
+      视角突变: 去均值后的签名与参考签名差异超过 view_shift_threshold，且新画面本身是稳定的，
+               持续 tamper_frames 帧（区别于从镜头前走过的人）。之后以新画面为参考。
+    """
+    SIGNATURE_SIZE = (32, 24)
+    SAMPLE_STEP = 8        # 跨步采样间隔（像素）
+    STABLE_DIFF = 4.0      # 相邻两帧签名差异低于此值视为画面稳定
+    REF_ALPHA = 0.05       # 参考签名跟随缓慢变化的速度
+
+    def __init__(self):
+        self.frozen_events = 0
+        self.cover_events = 0
+        self.view_shift_events = 0
+        self.reset()
+
+    def reset(self):
+        """重连或ROI变更后重新建立基准"""
+        self.frozen = False
+        self.covered = False
+        self.signature_std = 0.0
+        self._sample = None
+        self._same_since = None
+        self._prev_sig = None
+        self._ref_sig = None
+        self._cover_count = 0
+        self._shift_count = 0
+
+    def update(self, frame, params: "DetectionParams") -> Optional[str]:
+        """检查一帧（BGR或灰度整帧），返回新发生的事件: 'frozen' / 'covered' / 'uncovered' / 'view_shift'
+
+        先判断遮挡：全黑/均一的画面（镜头被挡、关灯）采样值本来就可能完全相同，不参与冻结判断。
+        """
+        now = time.monotonic()
+        step = self.SAMPLE_STEP
+        sample = frame[::step, ::step]
+        small = cv2.resize(sample, self.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        mean, std = cv2.meanStdDev(small)
+        self.signature_std = float(std[0, 0])
+        tamper_frames = params.tamper_frames
+
+        event = None
+        # 遮挡
+        uniform = self.signature_std < params.cover_std
+        if uniform:
+            self._cover_count += 1
+            if not self.covered and self._cover_count >= tamper_frames:
+                self.covered = True
+                self.cover_events += 1
+                event = 'covered'
+        else:
+            self._cover_count = 0
+            if self.covered:
+                self.covered = False
+                self._ref_sig = None  # 遮挡期间的参考没有意义，以解除后的画面重新建立
+                event = 'uncovered'
+
+        # 冻结（只对有内容的画面判断）
+        if uniform:
+            self._sample = None
+            self._same_since = None
+            self.frozen = False
+        elif self._sample is not None and self._sample.shape == sample.shape and np.array_equal(sample, self._sample):
+            if self._same_since is None:
+                self._same_since = now
+            if not self.frozen and now - self._same_since >= params.frozen_seconds:
+                self.frozen = True
+                self.frozen_events += 1
+                return 'frozen'
+            return event  # 冻结的画面不再做视角判断
+        else:
+            self._sample = sample.copy()
+            self._same_since = None
+            self.frozen = False
+
+        # 视角突变
+        sig = small.astype(np.float32) - float(mean[0, 0])  # 去均值，整体明暗变化不算视角变化
+        if self._ref_sig is None or self._ref_sig.shape != sig.shape or self.covered:
+            self._ref_sig = sig
+        else:
+            ref_diff = float(cv2.norm(sig, self._ref_sig, cv2.NORM_L1)) / sig.size
+            prev_diff = float(cv2.norm(sig, self._prev_sig, cv2.NORM_L1)) / sig.size
+            if ref_diff > params.view_shift_threshold and prev_diff < self.STABLE_DIFF:
+                self._shift_count += 1
+                if self._shift_count >= tamper_frames:
+                    self._shift_count = 0
+                    self._ref_sig = sig
+                    self.view_shift_events += 1
+                    event = event or 'view_shift'
+            else:
+                self._shift_count = 0
+                if ref_diff <= params.view_shift_threshold:
+                    cv2.accumulateWeighted(sig, self._ref_sig, self.REF_ALPHA)
+        self._prev_sig = sig
+        return event
+
+
+class RegionMask:
+    """多边形检测区域与屏蔽区 - 一次性栅格化为掩码并缓存
+
+    检测只在所有区域的外接矩形（并集包围盒）内进行，矩形外的像素完全不参与处理；
+    包围盒内不属于任何区域、或落在屏蔽区内的像素由掩码在二值化后清零。
+    没有多边形时退回到 roi 矩形（无效时为整幅画面）。
+    只在帧尺寸变化或调用 invalidate() 后重建，不再逐帧校验ROI。
+    """
+    def __init__(self):
+        self._shape = None
+        self._dirty = True
+        self.rect = (0, 0, 0, 0)   # 检测用的包围盒 (x, y, w, h)
+        self.mask = None           # 裁剪到rect的uint8掩码，None表示rect内全部检测
+        self.regions = []          # [(名称, 顶点数组)]，用于绘制
+        self.exclusions = []
+
+    def invalidate(self):
+        """区域配置变化后调用，下一帧重建掩码"""
+        self._dirty = True
+
+    @staticmethod
+    def _polygons(items, default_prefix: str):
+        polygons = []
+        for i, item in enumerate(items or []):
+            try:
+                points = np.array(item.get('points', []), dtype=np.int32).reshape(-1, 2)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if len(points) >= 3:
+                polygons.append((str(item.get('name', f"{default_prefix}{i + 1}")), points))
+        return polygons
+
+    def update(self, config: Dict[str, Any], frame_shape) -> bool:
+        """帧尺寸或区域配置变化时重建掩码，返回是否发生了重建"""
+        shape = tuple(frame_shape[:2])
+        if not self._dirty and shape == self._shape:
+            return False
+        self._dirty = False
+        self._shape = shape
+        frame_h, frame_w = shape
+
+        self.regions = self._polygons(config.get('regions'), "区域")
+        self.exclusions = self._polygons(config.get('exclusions'), "屏蔽")
+
+        mask = None
+        x, y, w, h = 0, 0, frame_w, frame_h
+        if self.regions:
+            full = np.zeros(shape, dtype=np.uint8)
+            cv2.fillPoly(full, [pts for _, pts in self.regions], 255)
+            bx, by, bw, bh = cv2.boundingRect(full)
+            if bw > 0 and bh > 0:
+                x, y, w, h = bx, by, bw, bh
+                mask = full[y:y+h, x:x+w].copy()
+        elif config.get('roi') and validate_roi(tuple(config['roi']), frame_shape):
+            x, y, w, h = config['roi']
+
+        if self.exclusions:
+            if mask is None:
+                mask = np.full((h, w), 255, dtype=np.uint8)
+            offset = np.array([x, y], dtype=np.int32)
+            cv2.fillPoly(mask, [pts - offset for _, pts in self.exclusions], 0)
+
+        # 掩码全为255时等价于不加掩码，省掉每帧的bitwise_and
+        if mask is not None and cv2.countNonZero(mask) == mask.size:
+            mask = None
+        self.rect = (x, y, w, h)
+        self.mask = mask
+        return True
+
+
+class ZoneGrid:
+    """网格分区运动图 - 把二值化掩码划分成 行×列 个格子，一次reshape求和得到每格变化像素数
+
+    每个分区可单独设置名称、min_area、continuous_frames，或用 enabled=False 禁用，
+    一遍处理同时覆盖门口、长椅、柜子等多个区域，不必为每个区域各跑一个检测器。
+    掩码尺寸不能被行列数整除时，右侧/底部不足一格的余数像素不计入。
+    """
+    MAX_CELLS = 16  # 行、列数上限
+
+    def __init__(self):
+        self._key = None
+        self.rows = self.cols = 0
+        self.names = []             # 按行优先排列的分区名
+        self.min_area = None        # (rows, cols) 每格面积阈值
+        self.frames_needed = None   # (rows, cols) 每格连续帧数
+        self.enabled = None         # (rows, cols) 是否参与判定
+        self.counts = None          # (rows, cols) 最近一帧每格变化像素数
+        self.streak = None          # (rows, cols) 每格连续超阈值的帧数
+
+    def configure(self, config: Dict[str, Any], params: DetectionParams) -> List[str]:
+        """按配置重建分区参数数组（配置未变化时直接返回），返回无效分区设置的说明
+
+        config.json 可能被手工编辑，无效的分区设置改用全局 min_area / continuous_frames，不中断监控。
+        """
+        grid = config.get('zone_grid') or [3, 3]
+        zones = config.get('zones') or {}
+        key = (repr(grid), params.min_area, params.continuous_frames,
+               json.dumps(zones, sort_keys=True, ensure_ascii=False, default=str))
+        if key == self._key:
+            return []
+        self._key = key
+        problems = []
+        if not isinstance(zones, dict):
+            problems.append(f"zones 应为对象，已忽略: {zones!r}")
+            zones = {}
+
+        try:
+            rows, cols = (max(1, min(self.MAX_CELLS, int(v))) for v in grid)
+        except (TypeError, ValueError):
+            problems.append(f"zone_grid 无效，使用3×3: {grid!r}")
+            rows, cols = 3, 3
+        self.rows, self.cols = rows, cols
+        self.min_area = np.full((rows, cols), params.min_area, dtype=np.int64)
+        self.frames_needed = np.full((rows, cols), params.continuous_frames, dtype=np.int64)
+        self.enabled = np.ones((rows, cols), dtype=bool)
+        self.names = []
+        for r in range(rows):
+            for c in range(cols):
+                zone_id = f"{r + 1}-{c + 1}"
+                zone = zones.get(zone_id, {})
+                if not isinstance(zone, dict):
+                    problems.append(f"分区 {zone_id} 的设置应为对象，已忽略: {zone!r}")
+                    zone = {}
+                self.names.append(str(zone.get('name', zone_id)))
+                self.enabled[r, c] = bool(zone.get('enabled', True))
+                for field, target, minimum in (('min_area', self.min_area, 0),
+                                               ('continuous_frames', self.frames_needed, 1)):
+                    if field not in zone:
+                        continue
+                    try:
+                        target[r, c] = max(minimum, int(zone[field]))
+                    except (TypeError, ValueError, OverflowError):
+                        problems.append(f"分区 {zone_id} 的 {field} 无效({zone[field]!r})，使用全局值 {target[r, c]}")
+        self.counts = np.zeros((rows, cols), dtype=np.int64)
+        self.streak = np.zeros((rows, cols), dtype=np.int64)
+        return problems
+
+    @property
+    def gate_area(self) -> int:
+        """启用分区中最小的面积阈值，供检测器早退门限使用"""
+        if self.enabled is None or not self.enabled.any():
+            return 0
+        return int(self.min_area[self.enabled].min())
+
+    @property
+    def max_streak(self) -> int:
+        return int(self.streak.max()) if self.streak is not None else 0
+
+    def reset(self):
+        if self.streak is not None:
+            self.counts[:] = 0
+            self.streak[:] = 0
+
+    def update(self, mask) -> list:
+        """统计一帧掩码（None表示无变化），返回本帧达到连续帧数要求的分区名"""
+        h, w = mask.shape[:2] if mask is not None else (0, 0)
+        ch, cw = h // self.rows, w // self.cols
+        if ch == 0 or cw == 0:
+            self.reset()
+            return []
+
+        # (rows*ch, cols*cw) -> (rows, ch, cols, cw)，对每格内的两个轴求和；掩码取值0/255
+        cells = mask[:self.rows * ch, :self.cols * cw].reshape(self.rows, ch, self.cols, cw)
+        self.counts = cells.sum(axis=(1, 3), dtype=np.int64) // 255
+
+        active = (self.counts > self.min_area) & self.enabled
+        self.streak = np.where(active, self.streak + 1, 0)
+        fired = active & (self.streak >= self.frames_needed)
+        return [self.names[i] for i in np.flatnonzero(fired)]
+
+    def cell_rects(self, x: int, y: int, w: int, h: int):
+        """生成 (行, 列, x1, y1, x2, y2)，用于在画面上绘制网格"""
+        ch, cw = h // self.rows, w // self.cols
+        for r in range(self.rows):
+            for c in range(self.cols):
+                yield r, c, x + c * cw, y + r * ch, x + (c + 1) * cw, y + (r + 1) * ch
+
+
+class BlobTracker:
+    """轻量多目标跟踪 - 对二值化掩码做连通域分析，按质心最近邻把斑块关联到已有目标
+
+    目标状态存放在固定容量的numpy数组中（槽位复用），每帧只分配与斑块数成正比的小数组，
+    稳态下不为每个目标创建Python对象。目标在ROI边缘附近出现/消失，计为从该边进入/离开，
+    可用于门口进出计数；连续 max_missed 帧未匹配的目标视为已离开。
+    """
+    CAPACITY = 32  # 同时跟踪的目标数上限
+    EDGES = ("top", "bottom", "left", "right")
+    EDGE_LABELS = ("上", "下", "左", "右")
+
+    def __init__(self):
+        cap = self.CAPACITY
+        self.pos = np.zeros((cap, 2), dtype=np.float32)  # 质心 (x, y)，ROI坐标
+        self.area = np.zeros(cap, dtype=np.int32)        # 最近一次匹配的斑块面积
+        self.missed = np.zeros(cap, dtype=np.int32)      # 连续未匹配帧数
+        self.ids = np.zeros(cap, dtype=np.int32)
+        self.alive = np.zeros(cap, dtype=bool)
+        self.alerted = np.zeros(cap, dtype=bool)         # 是否已为该目标报过警
+        self.entries = np.zeros(len(self.EDGES), dtype=np.int64)
+        self.exits = np.zeros(len(self.EDGES), dtype=np.int64)
+        self.crossings = []  # 本帧的进出记录 (kind, 边序号, 目标ID)，kind为'in'/'out'
+        self.next_id = 1
+        self._labels = None
+        self._size = (0, 0)
+
+    @property
+    def count(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    def reset(self):
+        """清空目标（ROI变更、重连后），进出计数保留"""
+        self.alive[:] = False
+        self.alerted[:] = False
+        self.crossings = []
+
+    def all_alerted(self) -> bool:
+        """画面中有跟踪目标且全部已报过警"""
+        return bool(self.alive.any()) and not (self.alive & ~self.alerted).any()
+
+    def mark_alerted(self):
+        self.alerted |= self.alive
+
+    def _nearest_edge(self, pts, margin: float):
+        """每个点最近的ROI边序号，不在边缘带内的为-1"""
+        w, h = self._size
+        dist = np.stack((pts[:, 1], h - pts[:, 1], pts[:, 0], w - pts[:, 0]), axis=1)
+        edge = dist.argmin(axis=1)
+        near = dist[np.arange(len(pts)), edge] <= margin * min(w, h)
+        return np.where(near, edge, -1)
+
+    def update(self, mask, min_area: int, max_missed: int, max_distance: float, edge_margin: float):
+        """用一帧二值化掩码（None表示无变化）更新目标"""
+        self.crossings = []
+        if mask is not None:
+            if self._labels is None or self._labels.shape != mask.shape:
+                self._labels = np.empty(mask.shape, dtype=np.int32)
+                self._size = (mask.shape[1], mask.shape[0])
+            _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, self._labels, connectivity=8,
+                                                                     ltype=cv2.CV_32S)
+            keep = stats[1:, cv2.CC_STAT_AREA] > min_area  # 第0个是背景
+            points = centroids[1:][keep].astype(np.float32)
+            areas = stats[1:, cv2.CC_STAT_AREA][keep]
+        else:
+            points = np.empty((0, 2), dtype=np.float32)
+            areas = np.empty(0, dtype=np.int32)
+        if self._size == (0, 0):
+            return
+
+        # 1. 贪心最近邻匹配：按距离从小到大，每个目标和斑块最多匹配一次
+        live = np.flatnonzero(self.alive)
+        matched = np.zeros(len(points), dtype=bool)
+        if live.size and len(points):
+            dist = np.linalg.norm(self.pos[live, None, :] - points[None, :, :], axis=2)
+            limit = max_distance * math.hypot(*self._size)
+            used = np.zeros(live.size, dtype=bool)
+            for flat in np.argsort(dist, axis=None):
+                ti, pi = divmod(int(flat), len(points))
+                if dist[ti, pi] > limit:
+                    break
+                if used[ti] or matched[pi]:
+                    continue
+                used[ti] = matched[pi] = True
+                slot = live[ti]
+                self.pos[slot] = points[pi]
+                self.area[slot] = areas[pi]
+                self.missed[slot] = 0
+            self.missed[live[~used]] += 1
+        elif live.size:
+            self.missed[live] += 1
+
+        # 2. 长时间未匹配的目标离开：最后位置靠近哪条边就计为从哪条边离开
+        gone = live[self.missed[live] > max_missed]
+        if gone.size:
+            self.alive[gone] = False
+            edges = self._nearest_edge(self.pos[gone], edge_margin)
+            np.add.at(self.exits, edges[edges >= 0], 1)
+            self.crossings += [('out', int(e), int(i)) for e, i in zip(edges, self.ids[gone]) if e >= 0]
+
+        # 3. 未匹配的斑块成为新目标：出现在边缘带内计为从该边进入
+        new = np.flatnonzero(~matched)
+        free = np.flatnonzero(~self.alive)[:new.size]
+        if free.size:
+            new = new[:free.size]
+            self.pos[free] = points[new]
+            self.area[free] = areas[new]
+            self.missed[free] = 0
+            self.alive[free] = True
+            self.alerted[free] = False
+            self.ids[free] = np.arange(self.next_id, self.next_id + free.size)
+            self.next_id += int(free.size)
+            edges = self._nearest_edge(points[new], edge_margin)
+            np.add.at(self.entries, edges[edges >= 0], 1)
+            self.crossings += [('in', int(e), int(i)) for e, i in zip(edges, self.ids[free]) if e >= 0]
+
+    def summary(self) -> str:
+        return f"跟踪{self.count} 进{int(self.entries.sum())} 出{int(self.exits.sum())}"
+
+    def edge_summary(self) -> str:
+        return " ".join(f"{label}:进{int(i)}/出{int(o)}"
+                        for label, i, o in zip(self.EDGE_LABELS, self.entries, self.exits))
+
+
+class MotionHeatmap:
+    """运动热力图 - 把每帧二值化后、膨胀前的变化掩码累加到整帧大小的 float32 计数缓冲区
+
+    累加用 cv2.add(..., mask) 原地写入ROI对应的切片，没有变化像素的帧直接跳过。
+    当前时段（默认1小时）单独计数，快照保存后并入总计数并清零；不保存任何视频画面。
+    """
+    REFRESH_INTERVAL = 1.0  # 叠加显示的彩色图刷新间隔（秒）
+
+    def __init__(self):
+        self.period = None       # 当前时段的计数（float32，整帧大小）
+        self.total = None        # 之前各时段的累计计数（float64）
+        self.frames = 0          # 当前时段累加过的帧数
+        self.period_start = time.time()
+        self._color = None
+        self._color_mask = None
+        self._color_time = 0.0
+
+    def reset(self):
+        self.period = None
+        self.total = None
+        self.frames = 0
+        self.period_start = time.time()
+        self._color = None
+
+    def add(self, mask, x: int, y: int, frame_shape):
+        """累加一帧ROI掩码（掩码取值0/255，左上角位于整帧的(x, y)）
+
+        分辨率变化时先结束当前时段，返回其 (计数, 帧数, 开始时间) 供调用方保存，否则返回None。
+        """
+        finished = None
+        if self.period is None or self.period.shape != frame_shape[:2]:
+            if self.frames:
+                finished = self.take_period()
+            self.period = np.zeros(frame_shape[:2], dtype=np.float32)
+            self.total = np.zeros(frame_shape[:2], dtype=np.float64)
+            self._color = None
+        h, w = mask.shape[:2]
+        region = self.period[y:y+h, x:x+w]
+        cv2.add(region, 1.0, dst=region, mask=mask)
+        self.frames += 1
+        return finished
+
+    def due(self, interval: float) -> bool:
+        return self.frames > 0 and time.time() - self.period_start >= interval
+
+    def take_period(self):
+        """结束当前时段：返回 (计数, 帧数, 开始时间)，计数并入总计后清零"""
+        counts, frames, start = self.period.copy(), self.frames, self.period_start
+        self.total += counts
+        self.period[:] = 0
+        self.frames = 0
+        self.period_start = time.time()
+        return counts, frames, start
+
+    @staticmethod
+    def colorize(counts):
+        """对数压缩后映射为JET伪彩色，返回 (BGR图, 有运动像素的掩码)"""
+        peak = float(counts.max())
+        scaled = np.log1p(counts, dtype=np.float32)
+        if peak > 0:
+            scaled *= 255.0 / math.log1p(peak)
+        color = cv2.applyColorMap(scaled.astype(np.uint8), cv2.COLORMAP_JET)
+        return color, (counts > 0).astype(np.uint8)
+
+    @classmethod
+    def save(cls, counts, frames: int, start: float, directory: str) -> str:
+        """保存一个时段的快照（.npz计数 + .png彩色图），返回文件名前缀"""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.fromtimestamp(start).strftime('%Y%m%d_%H%M%S')
+        base = os.path.join(directory, f"heatmap_{stamp}")
+        np.savez_compressed(base + ".npz", counts=counts.astype(np.uint32), frames=frames,
+                            start=start, end=time.time())
+        color, mask = cls.colorize(counts)
+        color[mask == 0] = 0
+        success, encoded = cv2.imencode('.png', color)
+        if success:
+            with open(base + ".png", 'wb') as f:
+                f.write(encoded.tobytes())
+        return base
+
+    def blend(self, frame, alpha: float = 0.5):
+        """把累计热力图半透明叠加到预览画面（彩色图每秒刷新一次）"""
+        if self.period is None or self.period.shape != frame.shape[:2]:
+            return
+        now = time.time()
+        if self._color is None or now - self._color_time >= self.REFRESH_INTERVAL:
+            self._color, self._color_mask = self.colorize(self.total + self.period)
+            self._color_time = now
+        blended = cv2.addWeighted(frame, 1 - alpha, self._color, alpha, 0)
+        cv2.copyTo(blended, self._color_mask, frame)
+
+
+class SeriesRing:
+    """固定容量的 (时间, 最小, 平均, 最大) 环形缓冲区，写满后覆盖最旧的记录"""
+    DTYPE = np.dtype([('t', '<f8'), ('min', '<f4'), ('mean', '<f4'), ('max', '<f4')])
+
+    def __init__(self, capacity: int):
+        self.data = np.zeros(capacity, dtype=self.DTYPE)
+        self.head = 0   # 下一条写入位置
+        self.count = 0
+
+    def append(self, t: float, lo: float, mean: float, hi: float):
+        self.data[self.head] = (t, lo, mean, hi)
+        self.head = (self.head + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def latest(self, n: Optional[int] = None):
+        """按时间顺序返回最近n条（默认全部）"""
+        n = self.count if n is None else min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % len(self.data)
+        return self.data[idx]
+
+    def load(self, records):
+        records = records[-len(self.data):]
+        self.data[:len(records)] = records
+        self.count = len(records)
+        self.head = self.count % len(self.data)
+
+
+class MotionSeries:
+    """运动强度时间序列 - 每帧的变化像素比例写入逐帧环形缓冲区，同时滚动汇总成分钟级和小时级的 最小/平均/最大
+
+    汇总用增量累加完成，不回扫缓冲区；各级容量固定（逐帧4096帧、分钟级一周、小时级一年），
+    内存和文件大小都不随运行时间增长。分钟级和小时级写入一个 .npz 二进制文件，重启后继续累计。
+    """
+    FRAME_CAPACITY = 4096
+    MINUTE_CAPACITY = 7 * 24 * 60
+    HOUR_CAPACITY = 365 * 24
+
+    def __init__(self):
+        self.frame_t = np.zeros(self.FRAME_CAPACITY, dtype=np.float64)
+        self.frame_v = np.zeros(self.FRAME_CAPACITY, dtype=np.float32)
+        self.frame_head = 0
+        self.minutes = SeriesRing(self.MINUTE_CAPACITY)
+        self.hours = SeriesRing(self.HOUR_CAPACITY)
+        self._minute = None  # 当前分钟的起点（整分钟的时间戳）
+        self._hour = None
+        self._m = [math.inf, 0.0, -math.inf, 0]  # 当前分钟: 最小, 总和, 最大, 帧数
+        self._h = [math.inf, 0.0, -math.inf, 0]  # 当前小时: 最小, 加权总和, 最大, 帧数
+
+    def record(self, value: float, now: float) -> bool:
+        """记录一帧运动强度，返回是否刚完成一个小时的汇总（调用方可据此保存）"""
+        head = self.frame_head
+        self.frame_t[head] = now
+        self.frame_v[head] = value
+        self.frame_head = (head + 1) % self.FRAME_CAPACITY
+
+        minute = now - now % 60
+        hour_done = False
+        if minute != self._minute:
+            if self._minute is not None:
+                hour_done = self._close_minute(minute)
+            else:
+                self._hour = now - now % 3600
+            self._minute = minute
+        m = self._m
+        if value < m[0]:
+            m[0] = value
+        if value > m[2]:
+            m[2] = value
+        m[1] += value
+        m[3] += 1
+        return hour_done
+
+    def _close_minute(self, next_minute: float) -> bool:
+        m, h = self._m, self._h
+        if m[3]:
+            self.minutes.append(self._minute, m[0], m[1] / m[3], m[2])
+            h[0] = min(h[0], m[0])
+            h[1] += m[1]
+            h[2] = max(h[2], m[2])
+            h[3] += m[3]
+        self._m = [math.inf, 0.0, -math.inf, 0]
+        next_hour = next_minute - next_minute % 3600
+        if next_hour == self._hour:
+            return False
+        if h[3]:
+            self.hours.append(self._hour, h[0], h[1] / h[3], h[2])
+        self._h = [math.inf, 0.0, -math.inf, 0]
+        self._hour = next_hour
+        return True
+
+    def last_hour(self, now: float):
+        """时间在 [now-3600, now] 内的分钟级记录（含进行中的当前分钟），用于走势图；停机期间没有记录"""
+        records = self.minutes.latest(61)
+        records = records[records['t'] >= now - 3600]
+        m = self._m
+        if m[3] and self._minute >= now - 3600:
+            current = np.array([(self._minute, m[0], m[1] / m[3], m[2])], dtype=SeriesRing.DTYPE)
+            records = np.concatenate((records, current))
+        return records
+
+    def save(self, path: str):
+        """保存分钟级、小时级记录和进行中的分钟/小时累加值（重启后接着累计，不丢失未满的时段）"""
+        nan = math.nan
+        state = np.array([nan if self._minute is None else self._minute, *self._m,
+                          nan if self._hour is None else self._hour, *self._h], dtype=np.float64)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, minutes=self.minutes.latest(), hours=self.hours.latest(), state=state)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        with np.load(path) as data:
+            self.minutes.load(data['minutes'].astype(SeriesRing.DTYPE))
+            self.hours.load(data['hours'].astype(SeriesRing.DTYPE))
+            state = data['state'] if 'state' in data.files else None
+        if state is not None and not math.isnan(state[0]):
+            # 下一次record时，保存的分钟/小时会按正常流程结束并写入（时间已过去的话）
+            self._minute = float(state[0])
+            self._m = [float(state[1]), float(state[2]), float(state[3]), int(state[4])]
+            self._hour = float(state[5])
+            self._h = [float(state[6]), float(state[7]), float(state[8]), int(state[9])]
+
+
+# ==================== 界面组件 ====================
+
 class ToolTip:
     """工具提示类 - 鼠标悬停显示提示信息"""
     def __init__(self, widget, text):
@@ -137,11 +1961,16 @@ class ToolTip:
 
 
 class CollapsibleFrame(ctk.CTkFrame):
-    """可折叠面板 - 带展开/收起按钮的框架"""
-    def __init__(self, parent, title, **kwargs):
+    """可折叠面板 - 带展开/收起按钮的框架
+
+    传入builder时内容延迟构建：首次展开或调用build()时才创建子控件。
+    """
+    def __init__(self, parent, title, title_color=COLOR_TEXT_BLUE, builder=None, **kwargs):
         super().__init__(parent, corner_radius=8, **kwargs)
 
         self.is_collapsed = False
+        self.builder = builder
+        self.is_built = builder is None
 
         # 标题栏（可点击）
         self.title_frame = ctk.CTkFrame(self, fg_color="transparent", cursor="hand2")
@@ -150,14 +1979,14 @@ class CollapsibleFrame(ctk.CTkFrame):
         # 展开/折叠图标
         self.toggle_icon = ctk.CTkLabel(self.title_frame, text="▼",
                                        font=("Arial", 12),
-                                       text_color=COLOR_TEXT_BLUE,
+                                       text_color=title_color,
                                        width=20)
         self.toggle_icon.pack(side="left", padx=(5, 0))
 
         # 标题文本
         self.title_label = ctk.CTkLabel(self.title_frame, text=title,
                                        font=(FONT_FAMILY, FONT_SIZE_TITLE, "bold"),
-                                       text_color=COLOR_TEXT_BLUE)
+                                       text_color=title_color)
         self.title_label.pack(side="left", padx=5)
 
         # 内容容器
@@ -177,17 +2006,25 @@ class CollapsibleFrame(ctk.CTkFrame):
             self.content_frame.pack_forget()
             self.toggle_icon.configure(text="▶")
         else:
+            self.build()
             self.content_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
             self.toggle_icon.configure(text="▼")
 
+    def build(self):
+        """构建延迟加载的内容（只执行一次）"""
+        if not self.is_built:
+            self.is_built = True
+            self.builder(self.content_frame)
+
     def get_content_frame(self):
         """获取内容框架，用于添加子控件"""
         return self.content_frame
 
 
 class SecurityApp:
-    def __init__(self, root):
+    def __init__(self, root, startup_benchmark=False):
         self.root = root
+        self.startup_benchmark = startup_benchmark  # 启动基准测试模式：首帧显示后输出计时并退出
         self.root.title("实验室智能监控系统 v3.0 Pro")
 
         # 加载窗口布局（如果有保存的配置则使用，否则使用默认值）
@@ -199,22 +2036,74 @@ class SecurityApp:
         self.root.minsize(1200, 700)
 
         # --- 状态变量初始化 ---
+        self.config_store = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG)
         self.config = self.load_config()
+        self.lazy_startup = self.config.get('lazy_startup', True)
+        self.alert_tree = None
+        self.first_frame_pending = False  # 启动监控后等待首帧显示（用于统计首帧耗时）
+        self.monitor_start_perf = 0.0
         self.lock = Lock()
         self.cap = None
         self.is_running = False
         self.is_paused = False
         self.is_alerting = False
         
-        self.last_alert_time = 0
         self.alert_count = 0
+        self.event_tracker = EventTracker()  # 只在视频线程中更新（监控停止时也由视频线程退出前结束事件）
+        self.video_thread = None
         self.screenshot_count = 0
         self.motion_frame_count = 0 # 连续检测计数器
+        self.capture_failures = 0    # 读帧失败总次数
+        self.reconnect_count = 0     # 摄像头重连成功次数
+        self.frame_seq = 0           # 帧序号（每次成功读帧+1，用于报警追踪）
+        self.detector = MotionDetector()
+        self.zone_grid = ZoneGrid()
+        self.region_mask = RegionMask()
+        try:
+            self.params = DetectionParams.from_config(self.config)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"配置中的检测参数无效，使用默认值: {e}")
+            self.params = DetectionParams.from_config(DEFAULT_CONFIG)
+        self.illumination_logged = 0  # 已写入日志的光照抑制次数
+        self.capture_info = {}  # 摄像头实际协商到的格式/分辨率/帧率
+        self.decoder = FrameDecoder()  # 原始帧 -> 灰度/彩色
+        self.capture_supervisor = CaptureSupervisor(self.open_camera)
+        self.watchdog = CaptureWatchdog()
+        self.calibrator = None  # 进行中的噪声校准
+        self.zone_grid_enabled = tk.BooleanVar(value=self.config.get('zone_grid_enabled', False))
+        self.blob_tracker = BlobTracker()
+        self.heatmap = MotionHeatmap()  # 只在视频线程中累加和取快照（监控停止后才由界面线程直接访问）
+        self.heatmap_snapshot_requested = False  # 界面请求保存快照，由视频线程在下一帧处理
+        self.blackbox = None  # 监控运行且启用黑匣子时的录像器
+        self.motion_series = MotionSeries()
+        self._sparkline_time = 0.0
+        if os.path.exists(MOTION_SERIES_FILE):
+            try:
+                self.motion_series.load(MOTION_SERIES_FILE)
+            except Exception as e:
+                logging.warning(f"运动强度历史文件无法读取，重新开始记录: {e}")
+        self.heatmap_overlay = tk.BooleanVar(value=self.config.get('heatmap_overlay', False))
+        self.person_verify_enabled = tk.BooleanVar(value=self.config.get('person_verify_enabled', False))
+        self.verifier = None  # 首次开启人形确认时创建（后台线程）
+        self._verify_pending = None  # 等待人形确认的 (事件, 追踪, 分区)
+        self.tracking_enabled = tk.BooleanVar(value=self.config.get('tracking_enabled', False))
+
+        # 报警端到端延迟追踪
+        self.alert_tracer = AlertTracer(self.config.get('alert_trace_history', 200))
 
         # FPS计算相关
         self.fps = 0.0
         self.frame_count = 0
-        self.fps_start_time = time.time()
+        self.fps_start_time = time.perf_counter()
+
+        # 自适应帧率与截止时间调度
+        self.frame_rate = AdaptiveFrameRate()
+        self.scheduler = FrameScheduler()
+
+        # 分阶段耗时统计（关闭时使用空实现，几乎无开销）
+        self.stage_timing_enabled = tk.BooleanVar(value=self.config.get('stage_timing_enabled', False))
+        self.stage_profiler = StageProfiler() if self.stage_timing_enabled.get() else NullStageProfiler()
+        self.last_stage_stats_update = 0.0
 
         # 运行时长
         self.start_time = None
@@ -224,12 +2113,15 @@ class SecurityApp:
         self.roi_selecting = False  # ROI选择中标志，防止重复调用
 
         # 报警历史记录
-        self.alert_history = []  # 存储报警记录：{'time': str, 'frames': int, 'screenshots': [str]}
+        self.alert_history = []  # 存储报警记录：{'time': str, 'event': MotionEvent, 'screenshots': [str], 'alert_id': int}
 
         # 音效配置
         self.sound_enabled = tk.BooleanVar(value=True)
         self.sound_type = tk.StringVar(value="标准警报")
 
+        # 在线性能分析
+        self.profiling = False
+
         # 系统托盘相关
         self.tray_icon = None
         self.tray_running = False
@@ -237,8 +2129,18 @@ class SecurityApp:
         # 窗口可见性标志（用于性能优化）
         self.window_visible = True
 
+        # 后台截图写入线程
+        self.screenshot_writer = ScreenshotWriter(self._on_screenshot_written,
+                                                  maxsize=self.config.get('writer_queue_size', 32))
+
+        # 本地指标服务（可选，在界面构建后启动）
+        self.metrics_server = None
+        self._dir_usage_cache = (0.0, 0, 0)  # (扫描时间, 字节数, 文件数)
+        STARTUP.mark("状态初始化")
+
         # --- 构建界面 ---
         self.setup_ui()
+        STARTUP.mark("界面构建")
 
         # 应用保存的窗口布局（分隔条位置等）
         self.apply_saved_layout()
@@ -251,38 +2153,95 @@ class SecurityApp:
         self.last_memory_cleanup = time.time()
         self.last_screenshot_cleanup = time.time()
 
-        # 启动时清理旧截图
-        if self.config.get('auto_cleanup_enabled', True):
-            Thread(target=self.cleanup_old_screenshots, daemon=True).start()
-
         self.log(f"系统就绪。灵敏度阈值: {self.config['min_area']}, 防抖帧数: {self.config['continuous_frames']}")
-        self.log("快捷键: Space(启动/暂停) | Ctrl+S(截图) | Ctrl+R(重设ROI) | Ctrl+1/2/3(预设)")
+        self.log("快捷键: Space(启动/暂停) | Ctrl+S(截图) | Ctrl+R(重设ROI) | Ctrl+P(性能分析) | Ctrl+1/2/3(预设)")
 
-        # 初始化系统托盘
-        self.init_tray()
+        if self.lazy_startup:
+            # 先让窗口显示出来，其余子系统在事件循环空闲后依次加载
+            self.root.after(0, self._deferred_init)
+        else:
+            preload_heavy_modules()
+            self._deferred_init()
+
+    def _deferred_init(self):
+        """延后初始化：托盘、旧截图清理、预设、报警历史面板、指标服务"""
+        STARTUP.mark("首次显示")
+        Thread(target=preload_heavy_modules, daemon=True, name="Preload").start()
 
         # 加载自定义预设
         self._populate_presets_combo()
 
+        # 构建报警历史面板
+        if not self.alert_history_panel.is_collapsed:
+            self.alert_history_panel.build()
+        STARTUP.mark("延后面板")
+
+        # 初始化系统托盘
+        self.init_tray()
+
+        # 本地指标服务
+        if self.config.get('metrics_enabled', False):
+            self.start_metrics_server()
+        STARTUP.mark("托盘/指标")
+
+        # 启动时清理旧截图（稍后在后台执行，避免与启动争抢磁盘）
+        if self.config.get('auto_cleanup_enabled', True):
+            delay = 3000 if self.lazy_startup else 0
+            self.root.after(delay, lambda: Thread(target=self.cleanup_old_screenshots, daemon=True).start())
+
+        # 配置文件损坏提示与外部修改监视
+        if self.config_store.load_error:
+            self.log(f"⚠️ {self.config_store.load_error}")
+        self.root.after(int(self.config.get('config_watch_interval', 2) * 1000), self._watch_config)
+
+        imports = ", ".join(f"{name} {ms:.0f}ms" for name, ms in IMPORT_TIMES.items())
+        self.log(f"启动耗时: {STARTUP.summary()} (共{STARTUP.since_start_ms():.0f}ms)")
+        if imports:
+            self.log(f"延迟导入: {imports}")
+
     def load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, "r", encoding='utf-8') as f:
-                    user_config = json.load(f)
-                    # 更新默认配置，确保新参数存在
-                    config = DEFAULT_CONFIG.copy()
-                    config.update(user_config)
-                    return config
-            except: pass
-        return DEFAULT_CONFIG.copy()
+        # 更新默认配置，确保新参数存在；损坏的文件会被备份
+        return self.config_store.load()
 
-    def save_config(self):
+    def save_config(self, immediate=False):
+        """保存配置（默认合并短时间内的多次保存，退出时immediate=True立即写入）"""
         try:
-            with open(CONFIG_FILE, "w", encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
+            self.config_store.save(self.config, immediate=immediate)
         except Exception as e:
             self.log(f"配置保存失败: {e}")
 
+    def _watch_config(self):
+        """定期检查config.json是否被外部修改，修改后热加载（不中断监控）"""
+        try:
+            if self.config_store.changed_externally():
+                self.reload_config()
+        except Exception as e:
+            logging.error(f"检查配置文件失败: {e}")
+        self.root.after(int(self.config.get('config_watch_interval', 2) * 1000), self._watch_config)
+
+    def reload_config(self):
+        """从磁盘重新加载配置并应用到界面和视频循环"""
+        new_config = self.config_store.load()
+        if self.config_store.load_error:
+            self.log(f"⚠️ {self.config_store.load_error.replace('使用默认配置', '保留当前配置')}")
+            return
+        # 内存中的值可能是元组（如roi），按JSON往返后的形式比较，避免误判为已修改
+        current = json.loads(json.dumps(self.config, ensure_ascii=False))
+        changed = sorted(k for k, v in new_config.items() if current.get(k) != v)
+        if not changed:
+            return
+        self.config.update(new_config)
+        self.refresh_params()
+        self._sync_param_widgets()
+        self.zone_grid_enabled.set(self.config.get('zone_grid_enabled', False))
+        self.tracking_enabled.set(self.config.get('tracking_enabled', False))
+        self.person_verify_enabled.set(self.config.get('person_verify_enabled', False))
+        self.heatmap_overlay.set(self.config.get('heatmap_overlay', False))
+        if {'roi', 'regions', 'exclusions', 'gaussian_blur'} & set(changed):
+            self.roi_reset_flag = True
+        self._populate_presets_combo()
+        self.log(f"检测到配置文件被修改，已热加载: {', '.join(changed)}")
+
     def load_window_layout(self):
         """加载窗口布局配置"""
         layout_file = os.path.join(os.path.dirname(CONFIG_FILE), "window_layout.json")
@@ -459,6 +2418,10 @@ class SecurityApp:
                                           activebackground=COLOR_BUTTON_BG, activeforeground="white")
         self.video_context_menu.add_command(label="📷 手动截图", command=self.manual_snapshot)
         self.video_context_menu.add_command(label="◪ 重设ROI", command=self.reset_roi)
+        self.video_context_menu.add_separator()
+        self.video_context_menu.add_checkbutton(label="🔥 叠加运动热力图", variable=self.heatmap_overlay,
+                                                command=self.on_heatmap_overlay_toggle)
+        self.video_context_menu.add_command(label="💾 保存热力图快照", command=self.save_heatmap_snapshot)
         self.lbl_video.bind("<Button-3>", self.show_video_context_menu)
 
         # 右侧控制区 - 使用滚动框架
@@ -615,6 +2578,39 @@ class SecurityApp:
         ToolTip(self.scale_target_fps, "视频处理的目标帧率\n数值越低CPU占用越少，适合后台运行")
         ToolTip(self.lbl_target_fps, "点击可直接编辑数值\n按Enter保存，ESC取消")
 
+        # 网格分区检测
+        zone_check = ctk.CTkCheckBox(params_container, text="▦ 网格分区检测",
+                                     font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
+                                     fg_color=COLOR_BUTTON_BG,
+                                     hover_color=COLOR_BUTTON_BG,
+                                     variable=self.zone_grid_enabled,
+                                     command=self.on_zone_grid_toggle)
+        zone_check.pack(anchor="w", pady=(8, 0))
+        ToolTip(zone_check, "把ROI划分为网格，每个格子单独判定运动\n报警时显示触发的分区\n"
+                            "行列数(zone_grid)和各分区的名称/面积/帧数(zones)在config.json中设置")
+
+        # 目标跟踪
+        track_check = ctk.CTkCheckBox(params_container, text="🚶 目标跟踪/进出计数",
+                                      font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
+                                      fg_color=COLOR_BUTTON_BG,
+                                      hover_color=COLOR_BUTTON_BG,
+                                      variable=self.tracking_enabled,
+                                      command=self.on_tracking_toggle)
+        track_check.pack(anchor="w", pady=(8, 0))
+        ToolTip(track_check, "跟踪画面中的运动目标，统计从ROI各边进入/离开的次数\n"
+                             "已报过警的目标停下后再次移动不重复报警")
+
+        # 人形确认
+        verify_check = ctk.CTkCheckBox(params_container, text="🧍 人形确认",
+                                       font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
+                                       fg_color=COLOR_BUTTON_BG,
+                                       hover_color=COLOR_BUTTON_BG,
+                                       variable=self.person_verify_enabled,
+                                       command=self.on_person_verify_toggle)
+        verify_check.pack(anchor="w", pady=(8, 0))
+        ToolTip(verify_check, "运动确认后先在后台检测画面中是否有人，有人才弹窗/响铃/连拍\n"
+                              "过滤阴影、窗帘、屏幕闪烁等误报，检测不影响视频循环")
+
         # 自定义预设
         ctk.CTkLabel(param_frame, text="自定义预设",
                     font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
@@ -666,6 +2662,16 @@ class SecurityApp:
         self.btn_delete_preset.grid(row=0, column=2, sticky="ew", padx=(2, 0))
         ToolTip(self.btn_delete_preset, "删除选中的预设方案")
 
+        self.btn_calibrate = ctk.CTkButton(presets_container, text="🎯 噪声校准",
+                     font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
+                     fg_color=COLOR_BUTTON_BG, hover_color=COLOR_BUTTON_BG,
+                     text_color=COLOR_TEXT_PRIMARY,
+                     height=32,
+                     command=self.start_calibration)
+        self.btn_calibrate.pack(fill="x", pady=(5, 0))
+        ToolTip(self.btn_calibrate, "在画面中无人时观察一段时间，统计噪声\n"
+                                    "自动给出阈值、最小面积、连续帧数、模糊核并保存为预设")
+
         # 音效设置
         ctk.CTkLabel(param_frame, text="🔊 报警音效",
                     font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
@@ -742,6 +2748,34 @@ class SecurityApp:
         self.lbl_fps_stat.pack(side="right")
         ToolTip(self.lbl_fps_stat, "当前视频处理的帧率\n数值越高表示处理越流畅")
 
+        # 迟到/丢帧
+        late_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        late_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(late_row, text="⏳ 迟到/跳帧:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_late_stat = ctk.CTkLabel(late_row, text="0 / 0",
+                                          font=(FONT_MONO, FONT_SIZE_LARGE, "bold"),
+                                          text_color=COLOR_TEXT_BLUE)
+        self.lbl_late_stat.pack(side="right")
+        ToolTip(self.lbl_late_stat, "迟到: 处理耗时超过帧间隔的次数\n跳帧: 为追上目标帧率而丢弃(不解码)的帧数")
+
+        # 分阶段耗时
+        stage_row = ctk.CTkFrame(stats_container, fg_color="transparent")
+        stage_row.pack(fill="x", pady=3)
+        stage_check = ctk.CTkCheckBox(stage_row, text="⏲ 阶段耗时统计",
+                                      font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"),
+                                      fg_color=COLOR_BUTTON_BG,
+                                      hover_color=COLOR_BUTTON_BG,
+                                      variable=self.stage_timing_enabled,
+                                      command=self.on_stage_timing_toggle)
+        stage_check.pack(anchor="w")
+        ToolTip(stage_check, "统计视频循环各阶段耗时（毫秒）\n显示p50/p95/p99/max，关闭时无额外开销")
+        self.lbl_stage_stats = ctk.CTkLabel(stage_row, text="",
+                                            font=(FONT_MONO, FONT_SIZE_SMALL),
+                                            text_color=COLOR_TEXT_SECONDARY,
+                                            justify="left", anchor="w")
+        self.lbl_stage_stats.pack(fill="x", pady=(3, 0))
+
         # 报警次数
         alerts_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
         alerts_row.pack(fill="x", pady=3)
@@ -764,6 +2798,90 @@ class SecurityApp:
         self.lbl_screenshots_stat.pack(side="right")
         ToolTip(self.lbl_screenshots_stat, "已保存的截图总数\n包括自动抓拍和手动抓拍")
 
+        # 早退门限命中率
+        gate_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        gate_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(gate_row, text="🚪 早退命中率:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_gate_stat = ctk.CTkLabel(gate_row, text="0%",
+                                          font=(FONT_MONO, FONT_SIZE_LARGE, "bold"),
+                                          text_color=COLOR_TEXT_BLUE)
+        self.lbl_gate_stat.pack(side="right")
+        ToolTip(self.lbl_gate_stat, "变化像素总数不足最小面积、直接跳过轮廓提取的帧占比\n空房间时通常接近100%")
+
+        # 光照抑制
+        illumination_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        illumination_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(illumination_row, text="💡 光照抑制:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_illumination_stat = ctk.CTkLabel(illumination_row, text="0",
+                                                  font=(FONT_MONO, FONT_SIZE_LARGE, "bold"),
+                                                  text_color=COLOR_TEXT_BLUE)
+        self.lbl_illumination_stat.pack(side="right")
+        ToolTip(self.lbl_illumination_stat, "开关灯、云层遮挡等全局光照变化被识别并忽略的次数\n"
+                                            "每次抑制都省去一次报警弹窗、音效和连拍截图")
+
+        # 目标跟踪
+        track_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        track_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(track_row, text="🚶 进出计数:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_tracking_stat = ctk.CTkLabel(track_row, text="未开启",
+                                              font=(FONT_MONO, FONT_SIZE_NORMAL, "bold"),
+                                              text_color=COLOR_TEXT_BLUE)
+        self.lbl_tracking_stat.pack(side="right")
+        self.tracking_tooltip = ToolTip(self.lbl_tracking_stat, "当前跟踪的目标数和累计进出次数")
+
+        # 运动强度走势
+        spark_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        spark_row.pack(fill="x", pady=(3, 0))
+        ctk.CTkLabel(spark_row, text="📈 近1小时运动:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_sparkline = ctk.CTkLabel(spark_row, text="",
+                                          font=(FONT_MONO, FONT_SIZE_SMALL),
+                                          text_color=COLOR_TEXT_SECONDARY)
+        self.lbl_sparkline.pack(side="right")
+        self.sparkline_canvas = tk.Canvas(stats_container, height=36, bg=COLOR_BG_DARK, highlightthickness=0)
+        self.sparkline_canvas.pack(fill="x", pady=(2, 3))
+        self.sparkline_canvas.create_line(0, 0, 0, 0, fill=COLOR_DANGER, width=1, tags="max")
+        self.sparkline_canvas.create_line(0, 0, 0, 0, fill=COLOR_TEXT_BLUE, width=1, tags="mean")
+        ToolTip(self.sparkline_canvas, "最近一小时每分钟的运动强度（变化像素占检测区域的比例）\n"
+                                       "红线为每分钟最大值，蓝线为平均值，可据此调整阈值和最小面积")
+
+        # 人形确认
+        verify_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        verify_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(verify_row, text="🧍 人形确认:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_verify_stat = ctk.CTkLabel(verify_row, text="未开启",
+                                            font=(FONT_MONO, FONT_SIZE_NORMAL, "bold"),
+                                            text_color=COLOR_TEXT_BLUE)
+        self.lbl_verify_stat.pack(side="right")
+        ToolTip(self.lbl_verify_stat, "人形确认的通过/否决/超时次数\n以及从运动确认到得出结论的中位耗时")
+
+        # 帧率模式
+        rate_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        rate_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(rate_row, text="⚡ 帧率模式:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_rate_stat = ctk.CTkLabel(rate_row, text="全速",
+                                          font=(FONT_MONO, FONT_SIZE_NORMAL, "bold"),
+                                          text_color=COLOR_SUCCESS)
+        self.lbl_rate_stat.pack(side="right")
+        ToolTip(self.lbl_rate_stat, "自适应帧率状态\n长时间无运动时降到空闲帧率以节省CPU\n显示空闲时间占比和估算节省的CPU时间")
+
+        # 摄像头连接状态
+        capture_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
+        capture_row.pack(fill="x", pady=3)
+        ctk.CTkLabel(capture_row, text="📡 摄像头:",
+                    font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold")).pack(side="left")
+        self.lbl_capture_stat = ctk.CTkLabel(capture_row, text="正常",
+                                             font=(FONT_MONO, FONT_SIZE_NORMAL, "bold"),
+                                             text_color=COLOR_SUCCESS)
+        self.lbl_capture_stat.pack(side="right")
+        ToolTip(self.lbl_capture_stat, "摄像头连接状态: 正常 / 不稳定(读帧失败) / 重连中\n"
+                                       "断线后在后台不限次数重连，显示故障次数和累计中断时间")
+
         # 连续检测
         motion_row = ctk.CTkFrame(stats_container, fg_color="transparent", height=30)
         motion_row.pack(fill="x", pady=(3, 10))
@@ -775,70 +2893,13 @@ class SecurityApp:
         self.lbl_motion_stat.pack(side="right")
         ToolTip(self.lbl_motion_stat, "当前连续检测到运动的帧数\n达到设定的连续帧数后将触发报警")
 
-        # 报警历史面板
-        alert_history_frame = ctk.CTkFrame(right_panel, corner_radius=8)
-        alert_history_frame.pack(fill="x", pady=(0, 10))
-
-        # 标题
-        ctk.CTkLabel(alert_history_frame, text="⚠ 报警历史",
-                    font=(FONT_FAMILY, FONT_SIZE_TITLE, "bold"),
-                    text_color=COLOR_DANGER).pack(anchor="w", padx=15, pady=(10, 5))
-
-        # Treeview容器（使用tk Frame包装以匹配深色主题）
-        tree_container = tk.Frame(alert_history_frame, bg=COLOR_BG_MEDIUM)
-        tree_container.pack(fill="x", padx=10, pady=(5, 10))
-
-        # 创建Treeview显示报警记录
-        columns = ("time", "frames", "screenshots")
-        self.alert_tree = tk.ttk.Treeview(tree_container, columns=columns, show="headings",
-                                         height=5, style="Custom.Treeview")
-
-        # 配置Treeview样式（深色主题）
-        style = tk.ttk.Style()
-        style.theme_use("default")
-        style.configure("Custom.Treeview",
-                       background=COLOR_BG_MEDIUM,
-                       foreground="white",
-                       fieldbackground=COLOR_BG_MEDIUM,
-                       borderwidth=0,
-                       font=(FONT_FAMILY, FONT_SIZE_NORMAL))
-        style.configure("Custom.Treeview.Heading",
-                       background="#1e1e1e",
-                       foreground=COLOR_TEXT_BLUE,
-                       relief="flat",
-                       font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"))
-        style.map("Custom.Treeview",
-                 background=[("selected", COLOR_BUTTON_BG)])
-
-        self.alert_tree.heading("time", text="时间")
-        self.alert_tree.heading("frames", text="帧数")
-        self.alert_tree.heading("screenshots", text="截图")
-
-        self.alert_tree.column("time", width=100, anchor="center")
-        self.alert_tree.column("frames", width=70, anchor="center")
-        self.alert_tree.column("screenshots", width=70, anchor="center")
-
-        self.alert_tree.pack(side="left", fill="both", expand=True)
-        ToolTip(self.alert_tree, "显示所有报警记录\n双击记录可查看对应的截图")
-
-        # 滚动条
-        alert_scrollbar = tk.ttk.Scrollbar(tree_container, orient="vertical",
-                                          command=self.alert_tree.yview)
-        alert_scrollbar.pack(side="right", fill="y")
-        self.alert_tree.configure(yscrollcommand=alert_scrollbar.set)
-
-        # 双击查看截图
-        self.alert_tree.bind("<Double-1>", self.on_alert_double_click)
-
-        # 右键菜单
-        self.alert_context_menu = tk.Menu(self.alert_tree, tearoff=0,
-                                          bg=COLOR_BG_MEDIUM, fg="white",
-                                          activebackground=COLOR_BUTTON_BG, activeforeground="white")
-        self.alert_context_menu.add_command(label="查看截图", command=self.view_alert_screenshots)
-        self.alert_context_menu.add_command(label="删除记录", command=self.delete_alert_record)
-        self.alert_context_menu.add_separator()
-        self.alert_context_menu.add_command(label="清空全部", command=self.clear_all_alerts)
-        self.alert_tree.bind("<Button-3>", self.show_alert_context_menu)
+        # 报警历史面板（可折叠，内容在窗口显示后再构建）
+        self.alert_history_panel = CollapsibleFrame(right_panel, "⚠ 报警历史",
+                                                    title_color=COLOR_DANGER,
+                                                    builder=self._build_alert_history_panel)
+        self.alert_history_panel.pack(fill="x", pady=(0, 10))
+        if not self.lazy_startup:
+            self.alert_history_panel.build()
 
         # 运行日志
         log_frame = ctk.CTkFrame(right_panel, corner_radius=8)
@@ -884,7 +2945,7 @@ class SecurityApp:
 
         # 快捷键提示
         ctk.CTkLabel(status_frame,
-                    text="快捷键: Space(启停) | Ctrl+S(截图) | Ctrl+R(ROI) | Ctrl+1/2/3(预设)",
+                    text="快捷键: Space(启停) | Ctrl+S(截图) | Ctrl+R(ROI) | Ctrl+P(性能分析) | Ctrl+1/2/3(预设)",
                     font=(FONT_MONO, FONT_SIZE_SMALL),
                     text_color=COLOR_TEXT_SECONDARY,
                     anchor="e").pack(side="right", padx=20, pady=5)
@@ -893,6 +2954,7 @@ class SecurityApp:
         self.root.bind("<space>", self.hotkey_toggle_monitoring)
         self.root.bind("<Control-s>", self.hotkey_snapshot)
         self.root.bind("<Control-r>", self.hotkey_reset_roi)
+        self.root.bind("<Control-p>", self.hotkey_profile)
         self.root.bind("<Control-Key-1>", lambda e: self.apply_preset("high"))
         self.root.bind("<Control-Key-2>", lambda e: self.apply_preset("standard"))
         self.root.bind("<Control-Key-3>", lambda e: self.apply_preset("low"))
@@ -907,6 +2969,68 @@ class SecurityApp:
         # 启动窗口可见性监控（备用方案，处理某些边界情况）
         self.check_window_visibility()
 
+    def _build_alert_history_panel(self, parent):
+        """构建报警历史面板内容（Treeview、样式、右键菜单）"""
+        # Treeview容器（使用tk Frame包装以匹配深色主题）
+        tree_container = tk.Frame(parent, bg=COLOR_BG_MEDIUM)
+        tree_container.pack(fill="x", pady=(0, 5))
+
+        # 创建Treeview显示报警记录
+        columns = ("time", "frames", "screenshots")
+        self.alert_tree = tk.ttk.Treeview(tree_container, columns=columns, show="headings",
+                                         height=5, style="Custom.Treeview")
+
+        # 配置Treeview样式（深色主题）
+        style = tk.ttk.Style()
+        style.theme_use("default")
+        style.configure("Custom.Treeview",
+                       background=COLOR_BG_MEDIUM,
+                       foreground="white",
+                       fieldbackground=COLOR_BG_MEDIUM,
+                       borderwidth=0,
+                       font=(FONT_FAMILY, FONT_SIZE_NORMAL))
+        style.configure("Custom.Treeview.Heading",
+                       background="#1e1e1e",
+                       foreground=COLOR_TEXT_BLUE,
+                       relief="flat",
+                       font=(FONT_FAMILY, FONT_SIZE_NORMAL, "bold"))
+        style.map("Custom.Treeview",
+                 background=[("selected", COLOR_BUTTON_BG)])
+
+        self.alert_tree.heading("time", text="时间")
+        self.alert_tree.heading("frames", text="事件")
+        self.alert_tree.heading("screenshots", text="截图")
+
+        self.alert_tree.column("time", width=100, anchor="center")
+        self.alert_tree.column("frames", width=110, anchor="center")
+        self.alert_tree.column("screenshots", width=70, anchor="center")
+
+        self.alert_tree.pack(side="left", fill="both", expand=True)
+        ToolTip(self.alert_tree, "显示所有报警记录\n双击记录可查看对应的截图")
+
+        # 滚动条
+        alert_scrollbar = tk.ttk.Scrollbar(tree_container, orient="vertical",
+                                          command=self.alert_tree.yview)
+        alert_scrollbar.pack(side="right", fill="y")
+        self.alert_tree.configure(yscrollcommand=alert_scrollbar.set)
+
+        # 双击查看截图
+        self.alert_tree.bind("<Double-1>", self.on_alert_double_click)
+
+        # 右键菜单
+        self.alert_context_menu = tk.Menu(self.alert_tree, tearoff=0,
+                                          bg=COLOR_BG_MEDIUM, fg="white",
+                                          activebackground=COLOR_BUTTON_BG, activeforeground="white")
+        self.alert_context_menu.add_command(label="查看截图", command=self.view_alert_screenshots)
+        self.alert_context_menu.add_command(label="删除记录", command=self.delete_alert_record)
+        self.alert_context_menu.add_separator()
+        self.alert_context_menu.add_command(label="导出延迟追踪", command=self.export_alert_trace)
+        self.alert_context_menu.add_command(label="清空全部", command=self.clear_all_alerts)
+        self.alert_tree.bind("<Button-3>", self.show_alert_context_menu)
+
+        # 显示构建前已产生的记录
+        self._update_alert_tree()
+
     def _setup_focus_recovery(self):
         """设置所有按钮的焦点自动恢复功能"""
         def restore_focus(event):
@@ -952,21 +3076,80 @@ class SecurityApp:
         self.txt_log.insert(tk.END, f"[{timestamp}] {msg}\n")
         self.txt_log.see(tk.END)
 
+    def _log_async(self, msg):
+        """从后台线程写日志：日志框只在Tk线程中修改"""
+        self.root.after(0, self.log, msg)
+
+    def open_camera(self):
+        """按当前采集配置打开摄像头并探测解码方式，返回 (cap, 协商结果)，失败时返回None（启动和重连共用）
+
+        只打开连接、不修改应用状态也不写日志框（重连时在后台线程执行），
+        由使用这个连接的线程调用 _apply_capture 应用解码器和采集信息。
+        """
+        messages = []
+        name = self.config.get('capture_profile', 'default')
+        profiles = self.config.get('capture_profiles') or DEFAULT_CONFIG['capture_profiles']
+        profile = profiles.get(name)
+        if profile is None:
+            messages.append(f"采集配置 '{name}' 不存在，使用 default")
+            name, profile = 'default', profiles.get('default', DEFAULT_CONFIG['capture_profiles']['default'])
+
+        cap, report = open_capture(self.config['camera_id'], profile)
+        if cap is None:
+            for msg in messages:
+                logging.warning(msg)
+            return None
+        actual = report['actual']
+        buffer_text = actual['buffer_size'] if actual['buffer_size'] > 0 else "不支持"
+        messages.append(f"摄像头已打开 [{name}]: {actual['fourcc']} {actual['width']}x{actual['height']} "
+                        f"@{actual['fps']:g}fps 缓冲{buffer_text}")
+        if report['mismatch']:
+            details = ", ".join(f"{k} 请求{report['requested'][k]}/实际{actual[k]}" for k in report['mismatch'])
+            messages.append(f"⚠️ 摄像头未完全接受采集配置: {details}")
+
+        decoder = FrameDecoder('bgr', actual['width'], actual['height'])
+        if self.config.get('luma_capture_enabled', False):
+            decoder = FrameDecoder.probe(cap, actual['width'], actual['height'])
+            if decoder.luma_native:
+                messages.append(f"亮度直通已启用 ({decoder.mode.upper()})，彩色转换仅用于显示和截图")
+            else:
+                messages.append("⚠️ 摄像头后端不支持输出原始数据，亮度直通未启用")
+        info = dict(actual, profile=name, decode=decoder.mode)
+        return cap, {'capture_info': info, 'decoder': decoder, 'messages': messages}
+
+    def _apply_capture(self, setup, log):
+        """换上新连接时应用解码器和采集信息（启动时在Tk线程、重连后在视频线程调用）"""
+        self.decoder = setup['decoder']
+        self.capture_info = setup['capture_info']
+        for msg in setup['messages']:
+            log(msg)
+
     def start_monitoring(self):
         if self.is_running: return
+        if self.video_thread is not None and self.video_thread.is_alive():
+            self.log("上一次监控仍在退出中，请稍后再启动")
+            return
         try:
-            self.cap = cv2.VideoCapture(self.config['camera_id'])
-            if not self.cap.isOpened():
+            opened = self.open_camera()
+            if opened is None:
                 messagebox.showerror("错误", "无法连接摄像头")
                 return
-
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.cap, setup = opened
+            self._apply_capture(setup, self.log)
 
             self.is_running = True
             self.is_paused = False
             self.motion_frame_count = 0
             self.start_time = time.time()  # 记录启动时间
+            self.monitor_start_perf = time.perf_counter()
+            self.first_frame_pending = True
+            self.stage_profiler.reset()
+            self.frame_rate.reset()
+            self.scheduler.reset()
+            self.capture_supervisor = CaptureSupervisor(
+                self.open_camera, self._log_async,
+                base_delay=self.config.get('reconnect_base_delay', 1.0),
+                max_delay=self.config.get('reconnect_max_delay', 30.0))
 
             # 按钮状态更新
             self.btn_start.configure(state="disabled")
@@ -975,20 +3158,42 @@ class SecurityApp:
             self.status_var.set("正在运行")
             self.log("监控服务已启动")
 
+            if self.config.get('blackbox_enabled', False):
+                self.blackbox = BlackBoxRecorder(
+                    BLACKBOX_FILE, self.config.get('blackbox_minutes', 5), self.config.get('blackbox_fps', 5),
+                    self.config.get('blackbox_width', 320), self.config.get('blackbox_format', 'jpeg'),
+                    self.config.get('blackbox_jpeg_quality', 70))
+                self.log(f"黑匣子录像已开启: 保留最近{self.config.get('blackbox_minutes', 5)}分钟 → {BLACKBOX_FILE}")
+
             # 启动线程
-            Thread(target=self.video_loop, daemon=True).start()
+            self.video_thread = Thread(target=self.video_loop, daemon=True, name="VideoLoop")
+            self.video_thread.start()
 
         except Exception as e:
             self.log(f"启动异常: {e}")
 
     def stop_monitoring(self):
         self.is_running = False
+        self.capture_supervisor.stop()
         if self.cap: self.cap.release()
+        if self.blackbox is not None:
+            self.blackbox.close()
+            self.blackbox = None
+        # 进行中的事件、人形确认、热力图的最后一个时段和运动强度历史由视频线程退出循环时处理（避免与正在进行的帧竞争）
         self.lbl_video.configure(image='', text="[ 监控已停止 ]", bg=COLOR_BG_DARK)
         self.btn_start.configure(state="normal")
         self.btn_stop.configure(state="disabled")
         self.btn_pause.configure(state="disabled", text="⏸ 暂停")
+        if self.calibrator is not None:
+            self.calibrator = None
+            self.btn_calibrate.configure(state="normal", text="🎯 噪声校准")
+            self.log("监控停止，噪声校准已取消")
         self.status_var.set("已停止")
+
+    def _on_video_loop_exit(self, event: Optional[MotionEvent]):
+        """视频线程退出后在Tk线程中收尾：记录被停止打断的事件"""
+        if event is not None:
+            self._finish_event(event)
         self.log("监控服务已停止")
 
     def toggle_pause(self):
@@ -1029,6 +3234,8 @@ class SecurityApp:
 
             ret, frame = self.cap.read()
             if ret:
+                frame = self.decoder.color(frame)
+            if frame is not None:
                 # 使用Tkinter选择器（避免OpenCV窗口问题）
                 self.root.after(0, lambda: self._show_tkinter_roi_selector(frame, was_paused))
             else:
@@ -1047,7 +3254,7 @@ class SecurityApp:
         """使用Tkinter实现的ROI选择器"""
         # 创建选择窗口
         selector_win = tk.Toplevel(self.root)
-        selector_win.title("ROI区域选择 - 拖动鼠标框选区域")
+        selector_win.title("ROI区域选择 - 框选矩形或绘制多边形区域")
         selector_win.attributes('-topmost', True)
 
         # 转换图像
@@ -1064,13 +3271,85 @@ class SecurityApp:
         # ROI选择变量
         roi_data = {'start_x': None, 'start_y': None, 'rect': None, 'confirmed': False, 'roi': None}
 
+        # 多边形：区域/屏蔽区，载入已有配置以便在此基础上增删
+        mode = tk.StringVar(value="rect")
+        poly_data = {
+            'regions': [dict(r) for r in self.config.get('regions', [])],
+            'exclusions': [dict(r) for r in self.config.get('exclusions', [])],
+            'points': [], 'items': [], 'changed': False
+        }
+        poly_styles = {'regions': ('#00FFFF', "区域"), 'exclusions': ('#FF5050', "屏蔽")}
+
+        def draw_polygon(kind, item):
+            color, _ = poly_styles[kind]
+            flat = [v for pt in item['points'] for v in pt]
+            canvas.create_polygon(*flat, outline=color, fill='', width=2, tags="poly")
+            x0, y0 = item['points'][0]
+            canvas.create_text(x0 + 4, y0 + 4, text=item.get('name', ''), fill=color,
+                               anchor="nw", font=(FONT_FAMILY, FONT_SIZE_SMALL), tags="poly")
+
+        def redraw_polygons():
+            canvas.delete("poly")
+            for kind in ('regions', 'exclusions'):
+                for item in poly_data[kind]:
+                    if len(item.get('points', [])) >= 3:
+                        draw_polygon(kind, item)
+
+        def clear_pending():
+            for item_id in poly_data['items']:
+                canvas.delete(item_id)
+            poly_data['points'].clear()
+            poly_data['items'].clear()
+
+        def add_vertex(event):
+            color, _ = poly_styles[mode.get()]
+            pts = poly_data['points']
+            if pts:
+                px, py = pts[-1]
+                poly_data['items'].append(canvas.create_line(px, py, event.x, event.y, fill=color, width=2))
+            poly_data['items'].append(canvas.create_oval(event.x - 2, event.y - 2, event.x + 2, event.y + 2,
+                                                         outline=color, fill=color))
+            pts.append([event.x, event.y])
+
+        def close_polygon(event=None):
+            kind = mode.get()
+            if kind == "rect":
+                return
+            pts = list(poly_data['points'])
+            clear_pending()
+            if len(pts) < 3:
+                return
+            _, prefix = poly_styles[kind]
+            item = {'name': f"{prefix}{len(poly_data[kind]) + 1}", 'points': pts}
+            poly_data[kind].append(item)
+            poly_data['changed'] = True
+            draw_polygon(kind, item)
+
+        def clear_polygons():
+            clear_pending()
+            poly_data['regions'].clear()
+            poly_data['exclusions'].clear()
+            poly_data['changed'] = True
+            redraw_polygons()
+
+        def on_mode_change():
+            clear_pending()
+            canvas.configure(cursor="cross" if mode.get() == "rect" else "tcross")
+
+        redraw_polygons()
+
         def on_mouse_down(event):
+            if mode.get() != "rect":
+                add_vertex(event)
+                return
             roi_data['start_x'] = event.x
             roi_data['start_y'] = event.y
             if roi_data['rect']:
                 canvas.delete(roi_data['rect'])
 
         def on_mouse_drag(event):
+            if mode.get() != "rect":
+                return
             if roi_data['start_x'] is not None:
                 if roi_data['rect']:
                     canvas.delete(roi_data['rect'])
@@ -1081,6 +3360,8 @@ class SecurityApp:
                 )
 
         def on_mouse_up(event):
+            if mode.get() != "rect":
+                return
             if roi_data['start_x'] is not None:
                 x1, y1 = roi_data['start_x'], roi_data['start_y']
                 x2, y2 = event.x, event.y
@@ -1094,6 +3375,7 @@ class SecurityApp:
                 roi_data['roi'] = (x, y, w, h)
 
         def confirm_selection():
+            close_polygon()  # 未闭合的多边形按当前顶点闭合
             roi_data['confirmed'] = True
             selector_win.destroy()
 
@@ -1106,12 +3388,22 @@ class SecurityApp:
         canvas.bind("<ButtonPress-1>", on_mouse_down)
         canvas.bind("<B1-Motion>", on_mouse_drag)
         canvas.bind("<ButtonRelease-1>", on_mouse_up)
+        canvas.bind("<ButtonPress-3>", close_polygon)
+
+        # 模式选择
+        mode_frame = tk.Frame(selector_win)
+        mode_frame.pack(fill='x', pady=(5, 0))
+        for text, value in (("矩形ROI", "rect"), ("多边形区域", "regions"), ("屏蔽区", "exclusions")):
+            ttk.Radiobutton(mode_frame, text=text, value=value, variable=mode,
+                            command=on_mode_change).pack(side='left', padx=10)
+        ttk.Button(mode_frame, text="清除多边形", command=clear_polygons).pack(side='right', padx=5)
 
         # 创建按钮
         btn_frame = tk.Frame(selector_win)
         btn_frame.pack(fill='x', pady=5)
 
-        ttk.Label(btn_frame, text="拖动鼠标框选区域，然后点击确认", font=(FONT_FAMILY, FONT_SIZE_SMALL)).pack(side='left', padx=10)
+        ttk.Label(btn_frame, text="矩形: 拖动框选 | 多边形: 左键加点，右键闭合 | 然后点击确认",
+                  font=(FONT_FAMILY, FONT_SIZE_SMALL)).pack(side='left', padx=10)
         ttk.Button(btn_frame, text="✓ 确认 (Enter)", command=confirm_selection).pack(side='right', padx=5)
         ttk.Button(btn_frame, text="✗ 取消 (ESC)", command=cancel_selection).pack(side='right', padx=5)
 
@@ -1145,6 +3437,16 @@ class SecurityApp:
         self.root.focus_force()
 
         # 处理结果
+        if roi_data['confirmed'] and poly_data['changed']:
+            self.config['regions'] = poly_data['regions']
+            self.config['exclusions'] = poly_data['exclusions']
+            self.save_config()
+            self.roi_reset_flag = True
+            self.motion_frame_count = 0
+            self.log(f"多边形区域更新: {len(poly_data['regions'])}个检测区域, {len(poly_data['exclusions'])}个屏蔽区")
+            if poly_data['regions']:
+                points = np.array([pt for r in poly_data['regions'] for pt in r['points']], dtype=np.int32)
+                self.update_sensitivity_range(cv2.boundingRect(points))
         if roi_data['confirmed'] and roi_data['roi']:
             x, y, w, h = roi_data['roi']
             if w > 0 and h > 0:
@@ -1153,10 +3455,13 @@ class SecurityApp:
                 self.roi_reset_flag = True
                 self.motion_frame_count = 0
                 self.log(f"ROI 更新成功: ({x}, {y}, {w}, {h})")
-                self.update_sensitivity_range((x, y, w, h))
+                if self.config.get('regions'):
+                    self.log("已设置多边形检测区域，矩形ROI暂不生效（清除多边形后恢复）")
+                else:
+                    self.update_sensitivity_range((x, y, w, h))
             else:
                 self.log("选择区域无效（太小）")
-        else:
+        elif not (roi_data['confirmed'] and poly_data['changed']):
             self.log("取消区域设置")
 
         # 恢复状态
@@ -1164,27 +3469,39 @@ class SecurityApp:
         self.is_paused = was_paused
         self.log("ROI选择流程完成")
 
-    def save_screenshot(self, frame, prefix="manual", seq=None):
-        """严格按照你的脚本逻辑，支持中文路径"""
+    def save_screenshot(self, frame, prefix="manual", seq=None, trace=None, record=None):
+        """生成截图文件名并提交到后台写入线程（编码和写盘不阻塞调用方）
+
+        返回的路径只表示已排队；record 为报警历史记录时，写入成功后才把路径加入其截图列表。
+        """
         try:
             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
             suffix = f"_{seq}" if seq is not None else ""
             filename = f"{prefix}_{timestamp}{suffix}.jpg"
             filepath = os.path.join(SCREENSHOT_DIR, filename)
 
-            success, encoded_img = cv2.imencode('.jpg', frame)
-            if success:
-                with open(filepath, 'wb') as f:
-                    f.write(encoded_img.tobytes())
-                self.screenshot_count += 1
-                self.log(f"截图保存: {filename}")
+            if self.screenshot_writer.submit(filepath, frame, (trace, record)):
                 return filepath  # 返回文件路径
+            self.log(f"截图写入队列已满，丢弃: {filename}")
         except Exception as e:
             self.log(f"截图失败: {e}")
         return None
 
-    def capture_burst(self):
-        """连续抓拍逻辑"""
+    def _on_screenshot_written(self, filepath, success, error, context):
+        """截图写入完成回调（在写入线程中执行），context 为 (追踪, 报警历史记录)"""
+        trace, record = context
+        if success:
+            self.alert_tracer.mark(trace, 'file')
+            self.screenshot_count += 1
+            self.log(f"截图保存: {os.path.basename(filepath)}")
+            if record is not None:
+                record['screenshots'].append(filepath)
+                self.root.after(0, self._update_alert_tree)
+        else:
+            self.log(f"截图失败: {error}")
+
+    def capture_burst(self, trace=None, record=None):
+        """连续抓拍逻辑，返回已提交写入的截图路径（写入成功的会加入record）"""
         screenshots = []
         count = self.config.get('screenshot_count', 3)
         interval = self.config.get('screenshot_interval', 0.5)
@@ -1193,7 +3510,9 @@ class SecurityApp:
             if self.cap:
                 ret, frame = self.cap.read()
                 if ret:
-                    filepath = self.save_screenshot(frame, "alert", i+1)
+                    frame = self.decoder.color(frame)
+                if frame is not None:
+                    filepath = self.save_screenshot(frame, "alert", i+1, trace, record)
                     if filepath:
                         screenshots.append(filepath)
             time.sleep(interval)
@@ -1202,7 +3521,9 @@ class SecurityApp:
     def manual_snapshot(self):
         if self.is_running and self.cap:
             ret, frame = self.cap.read()
-            if ret: self.save_screenshot(frame, "manual")
+            if ret:
+                frame = self.decoder.color(frame)
+            if frame is not None: self.save_screenshot(frame, "manual")
 
     def cleanup_old_screenshots(self):
         """清理旧截图"""
@@ -1313,6 +3634,22 @@ class SecurityApp:
                 self.alert_tree.delete(item)
             self.log("已清空所有报警记录")
 
+    def export_alert_trace(self):
+        """导出报警延迟追踪（Chrome trace-event JSON）"""
+        try:
+            from tkinter import filedialog
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            filepath = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")],
+                initialfile=f"alert_trace_{timestamp}.json"
+            )
+            if filepath:
+                self.alert_tracer.export_chrome_trace(filepath)
+                self.log(f"延迟追踪已导出到: {filepath}")
+        except Exception as e:
+            self.log(f"导出追踪失败: {e}")
+
     def copy_log(self):
         """复制所有日志到剪贴板"""
         try:
@@ -1459,10 +3796,19 @@ class SecurityApp:
 
         return entry
 
+    def refresh_params(self):
+        """配置变化后重建检测参数快照并整体替换，视频循环从下一帧开始使用"""
+        try:
+            self.params = DetectionParams.from_config(self.config)
+        except (TypeError, ValueError) as e:
+            self.log(f"检测参数无效，保持原参数: {e}")
+
     def on_sensitivity_change(self, value):
         """灵敏度阈值变化"""
         val = int(float(value))
         self.config['min_area'] = val
+        self.refresh_params()
+        self.save_config()
         # 更新Entry显示
         if not self.lbl_sensitivity.editing:
             self.lbl_sensitivity.delete(0, tk.END)
@@ -1473,6 +3819,8 @@ class SecurityApp:
         """连续帧数变化"""
         val = int(float(value))
         self.config['continuous_frames'] = val
+        self.refresh_params()
+        self.save_config()
         # 更新Entry显示
         if not self.lbl_frames.editing:
             self.lbl_frames.delete(0, tk.END)
@@ -1484,6 +3832,8 @@ class SecurityApp:
         """二值化阈值变化"""
         val = int(float(value))
         self.config['threshold'] = val
+        self.refresh_params()
+        self.save_config()
         # 更新Entry显示
         if not self.lbl_threshold.editing:
             self.lbl_threshold.delete(0, tk.END)
@@ -1494,6 +3844,8 @@ class SecurityApp:
         """报警冷却时间变化"""
         val = int(float(value))
         self.config['alert_cooldown'] = val
+        self.refresh_params()
+        self.save_config()
         # 更新Entry显示
         if not self.lbl_cooldown.editing:
             self.lbl_cooldown.delete(0, tk.END)
@@ -1510,13 +3862,16 @@ class SecurityApp:
             self.lbl_target_fps.original_value = str(val)
         # 根据目标FPS计算loop_delay
         self.config['loop_delay'] = 1.0 / val if val > 0 else 0.2
+        self.refresh_params()
+        self.save_config()
 
-    def play_alert_sound(self):
+    def play_alert_sound(self, trace=None):
         """播放报警音效"""
         if not self.sound_enabled.get():
             return  # 音效已禁用
 
         sound_type = self.sound_type.get()
+        self.alert_tracer.mark(trace, 'sound')  # 即将开始蜂鸣
 
         try:
             if sound_type == "标准警报":
@@ -1587,13 +3942,218 @@ class SecurityApp:
     def update_fps(self):
         """更新FPS计算"""
         self.frame_count += 1
-        elapsed = time.time() - self.fps_start_time
+        now = time.perf_counter()
+        elapsed = now - self.fps_start_time
         if elapsed > 1.0:  # 每秒更新一次
             self.fps = self.frame_count / elapsed
             self.frame_count = 0
-            self.fps_start_time = time.time()
+            self.fps_start_time = now
+
+    def on_zone_grid_toggle(self):
+        """开启/关闭网格分区检测"""
+        enabled = self.zone_grid_enabled.get()
+        self.config['zone_grid_enabled'] = enabled
+        self.refresh_params()
+        self.save_config()
+        self.zone_grid.reset()
+        self.motion_frame_count = 0
+        rows, cols = self.config.get('zone_grid') or [3, 3]
+        self.log(f"网格分区检测: {'开启 (' + str(rows) + '×' + str(cols) + ')' if enabled else '关闭'}")
+
+    def on_tracking_toggle(self):
+        """开启/关闭目标跟踪"""
+        enabled = self.tracking_enabled.get()
+        self.config['tracking_enabled'] = enabled
+        self.refresh_params()
+        self.save_config()
+        self.blob_tracker.reset()
+        self.log(f"目标跟踪: {'开启' if enabled else '关闭'}")
+
+    def save_motion_series(self):
+        """保存运动强度的分钟/小时汇总"""
+        try:
+            self.motion_series.save(MOTION_SERIES_FILE)
+        except Exception as e:
+            logging.error(f"保存运动强度历史失败: {e}")
+
+    def draw_sparkline(self):
+        """在统计面板画出最近一小时每分钟的最大/平均运动强度"""
+        canvas = self.sparkline_canvas
+        now = time.time()
+        records = self.motion_series.last_hour(now)
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if width < 10 or height < 10:
+            return
+        peak = max(float(records['max'].max()) if len(records) else 0.0, 0.01)
+        # 按时间戳定位横坐标（右端为当前时刻），停机造成的空档不会被挤掉
+        xs = width - 1 - (width - 2) * np.clip((now - 60 - records['t']) / 3540, 0.0, 1.0)
+        for tag, field in (("max", 'max'), ("mean", 'mean')):
+            if len(records) < 2:
+                canvas.coords(tag, 0, 0, 0, 0)
+                continue
+            values = records[field]
+            ys = height - 2 - (height - 4) * np.minimum(values / peak, 1.0)
+            canvas.coords(tag, *np.column_stack((xs, ys)).ravel().tolist())
+        self.lbl_sparkline.configure(text=f"峰值 {peak * 100:.1f}%")
+
+    def on_heatmap_overlay_toggle(self):
+        """开启/关闭预览画面上的热力图叠加"""
+        enabled = self.heatmap_overlay.get()
+        self.config['heatmap_overlay'] = enabled
+        self.refresh_params()
+        self.save_config()
+        if enabled and not self.config.get('heatmap_enabled', True):
+            self.log("热力图叠加: 开启（heatmap_enabled 已关闭，不会累计新的运动）")
+        else:
+            self.log(f"热力图叠加: {'开启' if enabled else '关闭'}")
+
+    def save_heatmap_snapshot(self):
+        """保存热力图快照（右键菜单）；监控运行时交给视频线程在下一帧处理"""
+        if self.is_running:
+            self.heatmap_snapshot_requested = True
+        else:
+            self._take_heatmap_snapshot()
+
+    def _take_heatmap_snapshot(self):
+        """结束当前热力图时段并在后台保存快照（在视频线程或监控停止后调用）"""
+        if self.heatmap.frames == 0:
+            self.log("热力图当前时段没有运动记录，无需保存")
+            return
+        self._write_heatmap_snapshot(*self.heatmap.take_period())
 
-    def draw_overlay(self, frame, x: int, y: int, w: int, h: int, motion_detected: bool):
+    def _write_heatmap_snapshot(self, counts, frames, start):
+        Thread(target=self._save_heatmap_worker, args=(counts, frames, start), daemon=True,
+               name="HeatmapWriter").start()
+
+    def _save_heatmap_worker(self, counts, frames, start):
+        try:
+            base = MotionHeatmap.save(counts, frames, start, HEATMAP_DIR)
+            self.log(f"热力图快照已保存: {os.path.basename(base)}.png/.npz ({frames}帧有运动)")
+        except Exception as e:
+            self.log(f"保存热力图失败: {e}")
+
+    def on_person_verify_toggle(self):
+        """开启/关闭人形确认"""
+        enabled = self.person_verify_enabled.get()
+        self.config['person_verify_enabled'] = enabled
+        self.refresh_params()
+        self.save_config()
+        self.log(f"人形确认: {'开启 (' + self.config.get('person_verify_backend', 'hog') + ')' if enabled else '关闭'}")
+
+    def _get_verifier(self) -> PersonVerifier:
+        """返回人形确认器，首次使用或后端配置变化时（重新）创建"""
+        settings = (self.config.get('person_verify_backend', 'hog'), self.config.get('person_verify_model', ''),
+                    self.config.get('person_verify_confidence', 0.5))
+        verifier = self.verifier
+        if verifier is None or (verifier.backend, verifier.model_path, verifier.min_confidence) != settings:
+            if verifier is not None:
+                verifier.stop()  # 旧的检测线程和模型不再使用
+            self.verifier = verifier = PersonVerifier(*settings)
+        return verifier
+
+    def _service_verifier(self, params: DetectionParams, frame, x: int, y: int, w: int, h: int,
+                          ended: bool = False):
+        """视频循环每帧调用：给检测线程送帧、取结论并据此报警（从不阻塞）"""
+        verifier = self.verifier
+        event, trace, zones = self._verify_pending
+        if not ended and verifier.wants_frame():
+            image = self.decoder.color(frame, copy=True)
+            if image is not None:
+                verifier.submit(image[y:y+h, x:x+w])
+        outcome = verifier.poll(force=ended)
+        if outcome is None:
+            return
+        self._verify_pending = None
+        self.alert_tracer.mark(trace, 'verify')
+        latency = trace.latency_ms('verify') if trace else 0.0
+        if verifier.error:
+            self.log(f"人形确认出错: {verifier.error}")
+        if outcome == PersonVerifier.CONFIRMED:
+            self.log(f"🧍 事件#{event.event_id} 人形确认通过 (+{latency:.0f}ms)")
+            self._fire_alert(params, event, trace, zones)
+        elif outcome == PersonVerifier.TIMEOUT and params.person_verify_fallback == 'alert':
+            self.log(f"事件#{event.event_id} 人形确认超时 (+{latency:.0f}ms)，按报警处理")
+            self._fire_alert(params, event, trace, zones)
+        else:
+            event.suppressed = True
+            reason = "未检测到人形" if outcome == PersonVerifier.REJECTED else "人形确认超时"
+            self.log(f"事件#{event.event_id} {reason} (+{latency:.0f}ms)，已忽略")
+
+    def _fire_alert(self, params: DetectionParams, event: MotionEvent, trace, zones):
+        """事件的报警输出：日志、状态栏、历史、弹窗、声音、连拍（每个事件一次）"""
+        self.alert_count += 1
+        zone_text = "、".join(zones)
+        if zone_text:
+            self.log(f"⚠️ 动静检测! 事件#{event.event_id} 分区 [{zone_text}] (连续{event.frames}帧)")
+        else:
+            self.log(f"⚠️ 动静检测! 事件#{event.event_id} (连续{event.frames}帧)")
+        self.status_var.set(f"⚠️ 警告: 检测到运动! (#{event.event_id})")
+        self.add_alert_history(event)
+
+        # 显示弹窗提示
+        self.root.after(0, lambda: self.show_alert_popup(event.frames, trace, zones))
+
+        # 播放报警音效
+        Thread(target=self.play_alert_sound, args=(trace,), daemon=True).start()
+
+        # 自动连拍
+        if params.auto_screenshot:
+            Thread(target=self._capture_event_burst, args=(event, trace), daemon=True).start()
+
+    def _update_tracking(self, params: DetectionParams, motion_detected: bool):
+        """用本帧掩码更新目标跟踪，记录进出（无运动的帧不做连通域分析，只让目标老化）"""
+        tracker = self.blob_tracker
+        tracker.update(self.detector.thresh if motion_detected else None, params.min_area, params.track_max_missed,
+                       params.track_max_distance, params.track_edge_margin)
+        for kind, edge, track_id in tracker.crossings:
+            action = "进入" if kind == 'in' else "离开"
+            self.log(f"🚶 目标#{track_id} 从{BlobTracker.EDGE_LABELS[edge]}边{action} ({tracker.summary()})")
+
+    def draw_tracks(self, frame, x: int, y: int):
+        """在画面上标出当前帧匹配到的跟踪目标及其编号"""
+        tracker = self.blob_tracker
+        for slot in np.flatnonzero(tracker.alive & (tracker.missed == 0)):
+            cx, cy = int(tracker.pos[slot, 0]) + x, int(tracker.pos[slot, 1]) + y
+            color = (0, 165, 255) if tracker.alerted[slot] else (255, 255, 0)
+            cv2.circle(frame, (cx, cy), 4, color, -1)
+            cv2.putText(frame, f"#{tracker.ids[slot]}", (cx + 6, cy - 6), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.4, color, 1, cv2.LINE_AA)
+
+    def on_stage_timing_toggle(self):
+        """开启/关闭分阶段耗时统计"""
+        enabled = self.stage_timing_enabled.get()
+        self.config['stage_timing_enabled'] = enabled
+        self.save_config()
+        self.stage_profiler = StageProfiler() if enabled else NullStageProfiler()
+        if not enabled:
+            self.lbl_stage_stats.configure(text="")
+        self.log(f"阶段耗时统计: {'开启' if enabled else '关闭'}")
+
+    def _sleep_frame(self, prof, iter_start, params: DetectionParams):
+        """按截止时间等待下一帧（计入sleep阶段），帧间隔由自适应帧率决定"""
+        work = time.perf_counter() - iter_start
+        activity = self.motion_frame_count > 0 or self.event_tracker.active
+        was_idle = self.frame_rate.idle
+        delay = self.frame_rate.update(activity, work, params)
+        if self.frame_rate.idle != was_idle:
+            if self.frame_rate.idle:
+                self.log(f"长时间无运动，进入空闲帧率 ({params.idle_fps:g} FPS)")
+            else:
+                self.log("检测到运动，恢复全速帧率")
+        prof.begin()
+        skip = self.scheduler.wait(delay, params.max_frame_skip)
+        prof.lap('sleep')
+
+        # 落后时丢弃驱动缓冲中积压的旧帧（grab不解码），下一次read拿到的是最新画面；
+        # 缓冲只有1帧时没有积压，多余的grab只会阻塞等待新帧。缓冲大小未知时按错过的帧数丢弃
+        buffer_size = self.capture_info.get('buffer_size', 0)
+        if buffer_size > 0:
+            skip = min(skip, buffer_size - 1)
+        if skip > 0 and self.cap:
+            self.scheduler.dropped_frames += sum(1 for _ in range(skip) if self.cap.grab())
+            prof.lap('read')
+
+    def draw_overlay(self, frame, x: int, y: int, w: int, h: int, motion_detected: bool, params: DetectionParams):
         """在画面上绘制叠加信息（移植自security_monitor.py）"""
         # 绘制ROI矩形框（绿色=正常，红色=检测到运动，橙色=暂停）
         # 注意：OpenCV使用BGR格式，不是RGB
@@ -1630,129 +4190,242 @@ class SecurityApp:
         cv2.putText(frame, f"Time: {timestamp}", (15, 42), font, 0.33, (230, 230, 230), 1, cv2.LINE_AA)
         cv2.putText(frame, f"Alerts: {self.alert_count} | FPS: {self.fps:.1f}", (15, 59), font, 0.33, (230, 230, 230), 1, cv2.LINE_AA)
         cv2.putText(frame, f"Status: {status}", (15, 76), font, 0.35, status_color, 1, cv2.LINE_AA)
-        cv2.putText(frame, f"Motion: {self.motion_frame_count}/{self.config['continuous_frames']}", (15, 90), font, 0.33, (230, 230, 230), 1, cv2.LINE_AA)
+        cv2.putText(frame, f"Motion: {self.motion_frame_count}/{params.continuous_frames}", (15, 90), font, 0.33, (230, 230, 230), 1, cv2.LINE_AA)
+
+    def draw_regions(self, frame):
+        """绘制多边形检测区域（青色）和屏蔽区（灰色）的轮廓"""
+        for _, pts in self.region_mask.regions:
+            cv2.polylines(frame, [pts], True, (255, 255, 0), 1, cv2.LINE_AA)
+        for _, pts in self.region_mask.exclusions:
+            cv2.polylines(frame, [pts], True, (128, 128, 128), 1, cv2.LINE_AA)
+
+    def draw_zone_grid(self, frame, x: int, y: int, w: int, h: int):
+        """在ROI内绘制分区网格，有运动的格子标红并显示分区名"""
+        grid = self.zone_grid
+        if grid.streak is None:
+            return
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        for r, c, x1, y1, x2, y2 in grid.cell_rects(x, y, w, h):
+            if not grid.enabled[r, c]:
+                color = (90, 90, 90)
+            elif grid.streak[r, c] > 0 and not self.is_paused:
+                color = (0, 0, 255)
+            else:
+                color = (0, 200, 0)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 1)
+            if grid.streak[r, c] > 0 and not self.is_paused:
+                # cv2.putText不支持中文，自定义分区名只显示格子编号
+                cv2.putText(frame, f"{r + 1}-{c + 1}", (x1 + 4, y1 + 14), font, 0.4, color, 1, cv2.LINE_AA)
+
+    def _on_watchdog_event(self, event, supervisor, params: DetectionParams) -> bool:
+        """处理看门狗事件，返回是否需要释放当前连接（已开始重连）"""
+        if event == 'frozen':
+            frozen_for = params.frozen_seconds
+            self.log(f"⚠️ 摄像头画面已冻结超过{frozen_for}秒，重置摄像头连接")
+            if supervisor.restart(time.monotonic() - frozen_for):
+                self.status_var.set("⚠️ 摄像头重连中...")
+                return True
+        elif event == 'covered':
+            self.log("⚠️ 镜头可能被遮挡（画面几乎全黑或均一）")
+            self.status_var.set("⚠️ 警告: 镜头被遮挡!")
+        elif event == 'uncovered':
+            self.log("镜头遮挡已解除")
+            self.status_var.set("监控中")
+        elif event == 'view_shift':
+            self.log("⚠️ 摄像头视角发生突变（可能被移动），已以新画面为参考")
+            self.status_var.set("⚠️ 警告: 摄像头视角变化!")
+        return False
 
     def video_loop(self):
-        prev_frame = None
-        consecutive_failures = 0
-        reconnect_attempts = 0
-        max_reconnect_attempts = 3
+        self.detector.reset()
+        self.watchdog.reset()
+        supervisor = self.capture_supervisor
+        zone_grid_params = None  # 分区网格按哪一个参数快照配置的（快照替换后才重新配置）
 
         while self.is_running:
+            # 后台重连成功：换上新连接和它的解码方式（采集配置已在open_camera中重新应用），重建ROI掩码和参考帧
+            opened = supervisor.take_capture()
+            if opened is not None:
+                self.cap, setup = opened
+                self._apply_capture(setup, self._log_async)
+                self.roi_reset_flag = True
+                self.watchdog.reset()
+                self.reconnect_count += 1
+                self.status_var.set("监控中")
+            if supervisor.state == CaptureSupervisor.RECONNECTING:
+                self.root.after(0, self.update_stats)
+                supervisor.wait(0.5)
+                continue
+
+            iter_start = time.perf_counter()
+            params = self.params  # 本帧使用的参数快照，设置变化时整体替换
+            prof = self.stage_profiler
+            prof.begin()
             ret, frame = self.cap.read()
+            capture_ns = time.perf_counter_ns()  # 帧采集时刻（单调时钟）
+            decoder = self.decoder
+            luma = None
+            if ret and decoder.luma_native:
+                luma = decoder.luma(frame)  # 检测只需要亮度，彩色图等到显示时再转换
+                ret = luma is not None
+            prof.lap('read')
             if not ret:
-                consecutive_failures += 1
-                if consecutive_failures > self.config['max_failures']:
-                    self.log(f"错误: 摄像头连接失败 ({consecutive_failures}次)")
-
-                    # 尝试重新连接
-                    if reconnect_attempts < max_reconnect_attempts:
-                        reconnect_attempts += 1
-                        self.log(f"尝试重新连接摄像头... (第{reconnect_attempts}次)")
-                        time.sleep(2)
-
-                        try:
-                            if self.cap:
-                                self.cap.release()
-                            self.cap = cv2.VideoCapture(self.config['camera_id'])
-                            if self.cap.isOpened():
-                                self.log("摄像头重新连接成功")
-                                consecutive_failures = 0
-                                reconnect_attempts = 0
-                                continue
-                        except Exception as e:
-                            self.log(f"重连失败: {e}")
-
-                    self.log("摄像头断开，停止监控")
-                    self.stop_monitoring()
-                    break
+                self.capture_failures += 1
+                if supervisor.frame_failed(params.max_failures):
+                    self.log(f"错误: 摄像头连续{supervisor.consecutive_failures}次读帧失败，后台重连中（监控不中断）")
+                    self.status_var.set("⚠️ 摄像头重连中...")
+                    cap, self.cap = self.cap, None
+                    if cap:
+                        cap.release()
+                    continue
                 time.sleep(0.1)
                 continue
-            consecutive_failures = 0
-            reconnect_attempts = 0
+            supervisor.frame_ok()
+
+            # 采集看门狗：冻结的画面等同于断线，触发重连
+            if params.watchdog_enabled:
+                event = self.watchdog.update(luma if luma is not None else frame, params)
+                if event:
+                    if self._on_watchdog_event(event, supervisor, params):
+                        cap, self.cap = self.cap, None
+                        if cap:
+                            cap.release()
+                        continue
+            self.frame_seq += 1
+            frame_id = self.frame_seq
             self.update_fps()  # 更新FPS计算
 
-            # 1. 区域处理
-            x, y, w, h = 0, 0, frame.shape[1], frame.shape[0]
-            if self.config['roi']:
-                rx, ry, rw, rh = self.config['roi']
-                if validate_roi((rx, ry, rw, rh), frame.shape):
-                    x, y, w, h = rx, ry, rw, rh
-
             motion_detected = False
             
-            # 检查是否需要重置（ROI变更）
+            # 检查是否需要重置（ROI/区域/模糊核变更，由界面线程置位）
             if self.roi_reset_flag:
-                prev_frame = None
+                self.detector.reset()
+                self.region_mask.invalidate()
+                self.blob_tracker.reset()
                 self.roi_reset_flag = False
                 self.log("ROI已重置，重新初始化检测")
 
-            # 2. 核心算法 (严格遵循你的 security_monitor.py)
-            if not self.is_paused:
-                roi_frame = frame[y:y+h, x:x+w]
-                gray = cv2.cvtColor(roi_frame, cv2.COLOR_BGR2GRAY)
-                gray = cv2.GaussianBlur(gray, (self.config['gaussian_blur'], self.config['gaussian_blur']), 0)
+            # 1. 区域处理（掩码只在区域或帧尺寸变化时重建）
+            source = luma if luma is not None else frame  # 检测输入：灰度整帧或BGR整帧
+            blackbox = self.blackbox
+            if blackbox is not None:
+                blackbox.offer(source, time.time())  # 只传引用，缩放编码在后台线程
+            if self.region_mask.update(self.config, source.shape):
+                self.detector.reset()
+            x, y, w, h = self.region_mask.rect
 
-                if prev_frame is None:
-                    prev_frame = gray
-                else:
-                    frame_delta = cv2.absdiff(prev_frame, gray)
-                    thresh = cv2.threshold(frame_delta, self.config['threshold'], 255, cv2.THRESH_BINARY)[1]
-                    thresh = cv2.dilate(thresh, None, iterations=self.config['dilate_iterations'])
-                    
-                    cnts, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                    
-                    for c in cnts:
-                        if cv2.contourArea(c) > self.config['min_area']:
-                            motion_detected = True
-                            break
-                    
-                    prev_frame = gray
+            # 2. 核心算法 (严格遵循你的 security_monitor.py)
+            use_zones = params.zone_grid_enabled
+            tracking = params.tracking_enabled
+            if use_zones and zone_grid_params is not params:
+                for problem in self.zone_grid.configure(self.config, params):
+                    self.log(f"⚠️ 分区设置: {problem}")
+                zone_grid_params = params
+            calibrating = self.calibrator is not None and not self.is_paused
+            if calibrating:
+                # 校准期间只收集噪声统计，不做检测
+                calibrator = self.calibrator
+                if calibrator.feed(source[y:y+h, x:x+w], params, self.region_mask.mask):
+                    self.calibrator = None
+                    self.detector.reset()
+                    self.root.after(0, lambda c=calibrator: self._finish_calibration(c))
+            elif not self.is_paused:
+                prof.begin()
+                gate_area = self.zone_grid.gate_area if use_zones else None
+                motion_detected = self.detector.process(source[y:y+h, x:x+w], params, prof, gate_area,
+                                                        self.region_mask.mask)
+                if tracking:
+                    self._update_tracking(params, motion_detected)
+                if params.motion_series_enabled and self.motion_series.record(self.detector.changed_ratio, time.time()):
+                    Thread(target=self.save_motion_series, daemon=True).start()
+                if params.heatmap_enabled and self.detector.changed_mask is not None and self.detector.changed_pixels:
+                    # 始终累加膨胀前的掩码，是否被早退门限跳过不影响计数
+                    finished = self.heatmap.add(self.detector.changed_mask, x, y, source.shape)
+                    if finished is not None:
+                        self.log("画面分辨率变化，热力图开始新的时段")
+                        self._write_heatmap_snapshot(*finished)
+                if self.detector.illumination_events != self.illumination_logged:
+                    self.illumination_logged = self.detector.illumination_events
+                    self.log(f"💡 全局光照变化已忽略 (亮度变化{self.detector.last_brightness_shift:+.0f}, "
+                             f"第{self.illumination_logged}次)，已更新参考帧")
 
             # 3. 连续帧防抖逻辑
-            if motion_detected:
-                self.motion_frame_count += 1
+            if use_zones:
+                # 分区模式：每格各自累计连续帧，任一分区达到要求即确认
+                fired_zones = self.zone_grid.update(None if self.is_paused or calibrating else self.detector.thresh)
+                self.motion_frame_count = self.zone_grid.max_streak
+                is_confirmed_motion = bool(fired_zones)
             else:
-                self.motion_frame_count = 0
-
-            is_confirmed_motion = self.motion_frame_count >= self.config['continuous_frames']
-
-            # 4. 报警触发
-            if is_confirmed_motion:
-                current_time = time.time()
-                if current_time - self.last_alert_time > self.config['alert_cooldown']:
-                    self.last_alert_time = current_time
-                    self.alert_count += 1
-
-                    self.log(f"⚠️ 动静检测! (连续{self.motion_frame_count}帧)")
-                    self.status_var.set(f"⚠️ 警告: 检测到运动! (#{self.alert_count})")
-
-                    # 显示弹窗提示
-                    self.root.after(0, lambda: self.show_alert_popup(self.motion_frame_count))
-
-                    # 播放报警音效
-                    Thread(target=self.play_alert_sound, daemon=True).start()
+                fired_zones = []
+                if motion_detected:
+                    self.motion_frame_count += 1
+                else:
+                    self.motion_frame_count = 0
+
+                is_confirmed_motion = self.motion_frame_count >= params.continuous_frames
+
+            # 4. 事件状态机：每个事件只报警一次，运动消失超过alert_cooldown秒才结束
+            tracker = self.event_tracker
+            transition = tracker.update(motion_detected, is_confirmed_motion,
+                                        self.detector.changed_pixels if motion_detected else 0,
+                                        fired_zones, time.time(), params.alert_cooldown,
+                                        params.event_update_interval)
+            if transition == 'start' and tracking and self.blob_tracker.all_alerted():
+                # 画面中只有已报过警的目标（停下后又动了），记录事件但不重复报警
+                tracker.event.suppressed = True
+                self.log(f"事件#{tracker.event.event_id}: 均为已报警的跟踪目标，不重复报警")
+            elif transition == 'start':
+                event = tracker.event
+                if tracking:
+                    self.blob_tracker.mark_alerted()
+                trace = self.alert_tracer.start(event.event_id, frame_id, capture_ns)
+                self.alert_tracer.mark(trace, 'detect')
+                if params.person_verify_enabled:
+                    # 报警输出推迟到人形确认得出结论之后
+                    self._get_verifier().begin(event.event_id, params.person_verify_timeout)
+                    self._verify_pending = (event, trace, list(fired_zones))
+                else:
+                    self._fire_alert(params, event, trace, fired_zones)
+            elif transition == 'update' and not tracker.event.suppressed and self._verify_pending is None:
+                event = tracker.event
+                self.log(f"事件#{event.event_id} 持续中 (已{event.duration:.0f}秒, 峰值面积{event.peak_area})")
+                if params.auto_screenshot:
+                    Thread(target=self._capture_event_burst, args=(event,), daemon=True).start()
+            elif transition == 'end':
+                if self._verify_pending is not None:
+                    self._service_verifier(params, frame, x, y, w, h, ended=True)
+                self._finish_event(tracker.last_event)
+            if self._verify_pending is not None:
+                self._service_verifier(params, frame, x, y, w, h)
+            if self.heatmap_snapshot_requested or self.heatmap.due(params.heatmap_interval):
+                self.heatmap_snapshot_requested = False
+                self._take_heatmap_snapshot()
 
-                    # 自动连拍
-                    if self.config['auto_screenshot']:
-                        def capture_and_record():
-                            screenshots = self.capture_burst()
-                            self.add_alert_history(self.motion_frame_count, screenshots)
-                        Thread(target=capture_and_record, daemon=True).start()
-            
             # 5. 界面绘制（使用overlay方法）
             # 性能优化：窗口隐藏时跳过GUI渲染
             if not self.window_visible:
                 # 窗口不可见时，跳过所有GUI相关操作以降低CPU使用
-                time.sleep(self.config['loop_delay'])
+                self._sleep_frame(prof, iter_start, params)
                 continue
 
-            display_frame = frame.copy()
-            self.draw_overlay(display_frame, x, y, w, h, is_confirmed_motion)
+            prof.begin()
+            display_frame = decoder.color(frame, copy=True)
+            if display_frame is None:
+                self._sleep_frame(prof, iter_start, params)
+                continue
+            self.draw_overlay(display_frame, x, y, w, h, is_confirmed_motion, params)
+            self.draw_regions(display_frame)
+            if use_zones:
+                self.draw_zone_grid(display_frame, x, y, w, h)
+            if tracking:
+                self.draw_tracks(display_frame, x, y)
+            if params.heatmap_overlay:
+                self.heatmap.blend(display_frame)
+            prof.lap('overlay')
 
             # 转换显示（ROI选择时跳过）
             if self.roi_selecting:
-                time.sleep(self.config['loop_delay'])
+                self._sleep_frame(prof, iter_start, params)
                 continue
 
             try:
@@ -1761,6 +4434,7 @@ class SecurityApp:
                 win_h = self.lbl_video.winfo_height()
 
                 if win_w > 10 and win_h > 10:
+                    prof.begin()
                     cv2image = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
                     img = Image.fromarray(cv2image)
                     
@@ -1775,7 +4449,9 @@ class SecurityApp:
                         new_w = int(win_h * img_ratio)
                     
                     img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+                    prof.lap('convert')
                     imgtk = ImageTk.PhotoImage(image=img)
+                    prof.lap('photo')
                     self.root.after(0, lambda: self.update_video(imgtk))
 
                 # 更新统计面板
@@ -1786,7 +4462,7 @@ class SecurityApp:
             current_time = time.time()
 
             # 内存清理（每小时一次）
-            if current_time - self.last_memory_cleanup > self.config.get('memory_cleanup_interval', 3600):
+            if current_time - self.last_memory_cleanup > params.memory_cleanup_interval:
                 self.perform_memory_cleanup()
                 self.last_memory_cleanup = current_time
 
@@ -1796,11 +4472,38 @@ class SecurityApp:
                     Thread(target=self.cleanup_old_screenshots, daemon=True).start()
                 self.last_screenshot_cleanup = current_time
 
-            time.sleep(self.config['loop_delay'])
+            self._sleep_frame(prof, iter_start, params)
+
+        # 监控停止：放弃未完成的人形确认，结束进行中的事件，保存热力图最后一个时段和运动强度历史
+        self._verify_pending = None
+        self.heatmap_snapshot_requested = False
+        if self.heatmap.frames:
+            self._take_heatmap_snapshot()
+        self.save_motion_series()
+        self.root.after(0, self._on_video_loop_exit, self.event_tracker.close())
 
     def update_video(self, imgtk):
         self.lbl_video.configure(image=imgtk)
         self.lbl_video.imgtk = imgtk
+        if self.first_frame_pending:
+            self.first_frame_pending = False
+            since_click = (time.perf_counter() - self.monitor_start_perf) * 1000
+            since_launch = STARTUP.since_start_ms()
+            self.log(f"首帧耗时: 启动监控后 {since_click:.0f}ms (距程序启动 {since_launch:.0f}ms)")
+            if self.startup_benchmark:
+                self._finish_startup_benchmark(since_click, since_launch)
+
+    def _finish_startup_benchmark(self, since_click, since_launch):
+        """--startup-benchmark 模式：输出启动计时JSON后退出"""
+        result = {
+            "phases": [{"name": n, "ms": round(d, 2), "at_ms": round(at, 2)} for n, d, at in STARTUP.phases],
+            "imports_ms": {k: round(v, 2) for k, v in IMPORT_TIMES.items()},
+            "first_frame_after_start_ms": round(since_click, 2),
+            "time_to_first_frame_ms": round(since_launch, 2),
+            "lazy_startup": self.lazy_startup,
+        }
+        print("STARTUP_BENCHMARK " + json.dumps(result, ensure_ascii=False), flush=True)
+        self.root.after(0, self._quit_app)
 
     def update_stats(self):
         """更新统计面板信息"""
@@ -1816,6 +4519,14 @@ class SecurityApp:
 
             # FPS
             self.lbl_fps_stat.configure(text=f"{self.fps:.1f}")
+            self.lbl_late_stat.configure(text=f"{self.scheduler.late_frames} / {self.scheduler.dropped_frames}")
+
+            # 分阶段耗时（每秒刷新一次，避免每帧重复计算分位数）
+            if self.stage_profiler.enabled:
+                now = time.perf_counter()
+                if now - self.last_stage_stats_update > 1.0:
+                    self.last_stage_stats_update = now
+                    self.lbl_stage_stats.configure(text=self.stage_profiler.format_summary())
 
             # 报警次数
             self.lbl_alerts_stat.configure(text=str(self.alert_count))
@@ -1823,13 +4534,170 @@ class SecurityApp:
             # 截图总数
             self.lbl_screenshots_stat.configure(text=str(self.screenshot_count))
 
+            # 早退门限命中率
+            self.lbl_gate_stat.configure(text=f"{self.detector.gate_hit_rate * 100:.0f}%")
+
+            # 光照抑制次数
+            self.lbl_illumination_stat.configure(text=str(self.detector.illumination_events))
+
+            # 目标跟踪
+            if self.tracking_enabled.get():
+                self.lbl_tracking_stat.configure(text=self.blob_tracker.summary())
+                self.tracking_tooltip.text = f"当前跟踪的目标数和累计进出次数\n{self.blob_tracker.edge_summary()}"
+            else:
+                self.lbl_tracking_stat.configure(text="未开启")
+
+            # 运动强度走势（每5秒重画一次）
+            now = time.time()
+            if now - self._sparkline_time >= 5:
+                self._sparkline_time = now
+                self.draw_sparkline()
+
+            # 人形确认
+            if self.verifier is not None:
+                self.lbl_verify_stat.configure(text=self.verifier.summary())
+            else:
+                self.lbl_verify_stat.configure(text="未开启")
+
+            # 帧率模式
+            self.lbl_rate_stat.configure(text=self.frame_rate.summary(),
+                                         text_color=COLOR_WARNING if self.frame_rate.idle else COLOR_SUCCESS)
+
+            # 摄像头连接状态
+            supervisor = self.capture_supervisor
+            capture_colors = {CaptureSupervisor.STREAMING: COLOR_SUCCESS,
+                              CaptureSupervisor.DEGRADED: COLOR_WARNING,
+                              CaptureSupervisor.RECONNECTING: COLOR_DANGER}
+            self.lbl_capture_stat.configure(text=supervisor.summary(),
+                                            text_color=capture_colors[supervisor.state])
+
             # 连续检测
-            motion_str = f"{self.motion_frame_count}/{self.config['continuous_frames']}"
+            motion_str = f"{self.motion_frame_count}/{self.params.continuous_frames}"
             self.lbl_motion_stat.configure(text=motion_str)
 
         except Exception as e:
             logging.error(f"更新统计失败: {e}")
 
+    # ========== 本地指标服务 ==========
+    def start_metrics_server(self):
+        """启动本地 /metrics 服务"""
+        host = self.config.get('metrics_host', '127.0.0.1')
+        port = self.config.get('metrics_port', 9108)
+        try:
+            self.metrics_server = MetricsServer(self.collect_metrics, host, port)
+            self.metrics_server.start()
+            self.log(f"指标服务已启动: http://{host}:{port}/metrics")
+        except Exception as e:
+            self.metrics_server = None
+            self.log(f"指标服务启动失败: {e}")
+
+    def _screenshot_dir_usage(self):
+        """截图目录占用（缓存30秒，扫描只在指标线程中进行）"""
+        scanned_at, total_bytes, file_count = self._dir_usage_cache
+        now = time.monotonic()
+        if now - scanned_at > 30 or scanned_at == 0:
+            total_bytes, file_count = scan_dir_usage(SCREENSHOT_DIR)
+            self._dir_usage_cache = (now, total_bytes, file_count)
+        return total_bytes, file_count
+
+    def collect_metrics(self, w: MetricsWriter):
+        """收集指标（在指标服务线程中执行，只读取计数器，不访问Tk控件）"""
+        w.gauge("monitor_running", "Whether monitoring is running (1) or stopped (0)", int(self.is_running))
+        w.gauge("monitor_paused", "Whether detection is paused", int(self.is_paused))
+        uptime = time.time() - self.start_time if (self.is_running and self.start_time) else 0
+        w.gauge("monitor_uptime_seconds", "Seconds since monitoring was started", uptime)
+        w.gauge("monitor_fps", "Processed frames per second", self.fps)
+        w.counter("monitor_alerts_total", "Alerts triggered", self.alert_count)
+        verifier = self.verifier
+        if verifier is not None:
+            for outcome, count in verifier.outcomes.items():
+                w.counter("monitor_person_verify_total", "Person verification outcomes", count, {"outcome": outcome})
+            w.histogram("monitor_person_verify_inference_seconds", "Person detector time per frame",
+                        verifier.inference)
+            w.histogram("monitor_person_verify_decision_seconds",
+                        "Time from confirmed motion to the verification decision", verifier.decision)
+        blobs = self.blob_tracker
+        blackbox = self.blackbox
+        if blackbox is not None:
+            w.counter("monitor_blackbox_frames_total", "Frames written to the black-box ring file", blackbox.written)
+            w.counter("monitor_blackbox_dropped_total", "Frames the black-box recorder skipped", blackbox.dropped)
+        w.gauge("monitor_motion_changed_ratio", "Changed pixels / active pixels in the last frame",
+                self.detector.changed_ratio)
+        w.gauge("monitor_tracked_objects", "Objects currently tracked", blobs.count)
+        for edge, entries, exits in zip(BlobTracker.EDGES, blobs.entries, blobs.exits):
+            w.counter("monitor_track_entries_total", "Tracked objects entering through each ROI edge",
+                      int(entries), {"edge": edge})
+            w.counter("monitor_track_exits_total", "Tracked objects leaving through each ROI edge",
+                      int(exits), {"edge": edge})
+        tracker = self.event_tracker
+        for state in EventTracker.STATE_LABELS:
+            w.gauge("monitor_event_state", "Motion event state machine", int(tracker.state == state), {"state": state})
+        w.counter("monitor_event_seconds_total", "Total duration of finished motion events", tracker.total_duration)
+        w.counter("monitor_screenshots_total", "Screenshots written to disk", self.screenshot_count)
+        w.gauge("monitor_motion_frames", "Current consecutive motion frame count", self.motion_frame_count)
+        w.counter("monitor_capture_failures_total", "Failed camera reads", self.capture_failures)
+        w.counter("monitor_camera_reconnects_total", "Successful camera reconnects", self.reconnect_count)
+        supervisor = self.capture_supervisor
+        for state in (CaptureSupervisor.STREAMING, CaptureSupervisor.DEGRADED, CaptureSupervisor.RECONNECTING):
+            w.gauge("monitor_capture_state", "Camera health state (1 for the current state)",
+                    int(supervisor.state == state), {"state": state})
+        w.counter("monitor_capture_incidents_total", "Camera outages that needed a reconnect", supervisor.incidents)
+        w.counter("monitor_capture_reconnect_attempts_total", "Camera reconnect attempts", supervisor.attempts)
+        w.counter("monitor_capture_downtime_seconds_total", "Seconds without frames from the camera",
+                  supervisor.downtime)
+        watchdog = self.watchdog
+        w.gauge("monitor_capture_frozen", "Whether the camera keeps returning the same frame", int(watchdog.frozen))
+        w.gauge("monitor_camera_covered", "Whether the lens looks covered", int(watchdog.covered))
+        w.gauge("monitor_frame_signature_stddev", "Standard deviation of the downsampled frame signature",
+                watchdog.signature_std)
+        for kind, count in (("frozen", watchdog.frozen_events), ("covered", watchdog.cover_events),
+                            ("view_shift", watchdog.view_shift_events)):
+            w.counter("monitor_tamper_events_total", "Frozen stream, covered lens and view shift events",
+                      count, {"kind": kind})
+        info = self.capture_info
+        if info:
+            w.gauge("monitor_capture_info", "Negotiated camera format (value is always 1)", 1,
+                    {"profile": info['profile'], "fourcc": info['fourcc'],
+                     "resolution": f"{info['width']}x{info['height']}"})
+            w.gauge("monitor_capture_fps", "Frame rate reported by the camera driver", info['fps'])
+        w.gauge("monitor_target_fps", "Target frame rate from the FPS slider",
+                1.0 / self.params.loop_delay)
+        w.counter("monitor_late_frames_total", "Frames whose work overran the frame period", self.scheduler.late_frames)
+        w.counter("monitor_dropped_frames_total", "Frames skipped with grab() to catch up", self.scheduler.dropped_frames)
+        w.counter("monitor_detection_frames_total", "Frames that went through frame differencing",
+                  self.detector.frames_evaluated)
+        w.counter("monitor_contour_gate_hits_total", "Frames short-circuited by the countNonZero gate",
+                  self.detector.gate_hits)
+        w.counter("monitor_illumination_suppressions_total", "Global lighting changes suppressed instead of alerting",
+                  self.detector.illumination_events)
+        w.counter("monitor_illumination_frames_total", "Frames skipped for lighting changes, including settle frames",
+                  self.detector.illumination_frames)
+        w.gauge("monitor_idle_mode", "Whether the adaptive scheduler is in idle frame rate", int(self.frame_rate.idle))
+        w.counter("monitor_idle_seconds_total", "Seconds spent at the idle frame rate", self.frame_rate.idle_seconds)
+        w.counter("monitor_cpu_saved_seconds_total", "Estimated CPU seconds saved by idle throttling",
+                  self.frame_rate.saved_cpu_seconds)
+        w.gauge("monitor_writer_queue_depth", "Screenshots waiting in the writer queue", self.screenshot_writer.depth)
+
+        total_bytes, file_count = self._screenshot_dir_usage()
+        w.gauge("monitor_screenshot_dir_bytes", "Total size of the screenshot directory", total_bytes)
+        w.gauge("monitor_screenshot_dir_files", "Number of files in the screenshot directory", file_count)
+        try:
+            usage = shutil.disk_usage(SCREENSHOT_DIR)
+            w.gauge("monitor_disk_free_bytes", "Free bytes on the screenshot volume", usage.free)
+            w.gauge("monitor_disk_total_bytes", "Total bytes on the screenshot volume", usage.total)
+        except OSError:
+            pass
+
+        for name, _ in AlertTracer.SINKS:
+            w.histogram("monitor_alert_latency_seconds", "Latency from trigger frame capture to each alert sink",
+                        self.alert_tracer.histograms[name], {"sink": name})
+
+        prof = self.stage_profiler
+        if prof.enabled:
+            for name, _ in StageProfiler.STAGES:
+                w.histogram("monitor_stage_latency_seconds", "Per-stage latency of the video loop",
+                            prof.histograms[name], {"stage": name})
+
     def hotkey_toggle_monitoring(self, event=None):
         """快捷键：启动/暂停监控"""
         if not self.is_running:
@@ -1848,14 +4716,53 @@ class SecurityApp:
         self.reset_roi()
         return "break"
 
-    def add_alert_history(self, frames, screenshots):
-        """添加报警记录到历史"""
+    def hotkey_profile(self, event=None):
+        """快捷键：采集性能分析"""
+        self.start_profiling()
+        return "break"
+
+    # ========== 在线性能分析 ==========
+    def start_profiling(self, duration=None):
+        """在后台线程中采样视频、写入和Tk线程的调用栈，监控不中断"""
+        if self.profiling:
+            self.log("性能分析正在进行中，请稍候...")
+            return
+        duration = duration or self.config.get('profile_duration', 10)
+        interval = self.config.get('profile_interval_ms', 5) / 1000.0
+        self.profiling = True
+        self.log(f"开始性能分析，持续{duration}秒...")
+        Thread(target=self._profile_worker, args=(duration, interval), daemon=True, name="Profiler").start()
+
+    def _profile_worker(self, duration, interval):
+        try:
+            profiler = SamplingProfiler(duration, interval)
+            profiler.run()
+
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            folded_path = os.path.join(PROFILE_DIR, f"profile_{timestamp}.folded")
+            summary_path = os.path.join(PROFILE_DIR, f"profile_{timestamp}.txt")
+            profiler.write_folded(folded_path)
+            with open(summary_path, "w", encoding="utf-8") as f:
+                f.write(profiler.summary())
+            self.log(f"性能分析完成: {folded_path}")
+        except Exception as e:
+            self.log(f"性能分析失败: {e}")
+        finally:
+            self.profiling = False
+
+    def profile_from_tray(self, icon=None, item=None):
+        """从托盘启动性能分析"""
+        self.root.after(0, self.start_profiling)
+
+    def add_alert_history(self, event: MotionEvent):
+        """添加报警事件到历史（截图在连拍完成后补充，时长等在事件结束时显示）"""
         try:
-            timestamp = datetime.datetime.now().strftime('%H:%M:%S')
             record = {
-                'time': timestamp,
-                'frames': frames,
-                'screenshots': screenshots
+                'time': datetime.datetime.fromtimestamp(event.start_time).strftime('%H:%M:%S'),
+                'event': event,
+                'screenshots': [],
+                'alert_id': event.event_id
             }
             self.alert_history.append(record)
 
@@ -1869,8 +4776,24 @@ class SecurityApp:
         except Exception as e:
             logging.error(f"添加报警历史失败: {e}")
 
+    def _capture_event_burst(self, event: MotionEvent, trace=None):
+        """为事件连拍（事件开始和进行中更新时），写入成功的截图追加到对应的历史记录"""
+        record = next((r for r in self.alert_history if r['alert_id'] == event.event_id), None)
+        self.capture_burst(trace, record)
+
+    def _finish_event(self, event: MotionEvent):
+        """事件结束：记录时长、峰值面积和运动帧数"""
+        zone_text = f" 分区 [{'、'.join(event.zones)}]" if event.zones else ""
+        self.log(f"事件#{event.event_id} 结束{zone_text}: 持续{event.duration:.1f}秒, "
+                 f"峰值面积{event.peak_area}, 运动{event.frames}帧")
+        if self.is_running and not self.is_paused:
+            self.status_var.set("监控中")
+        self.root.after(0, self._update_alert_tree)
+
     def _update_alert_tree(self):
         """更新报警历史Treeview"""
+        if self.alert_tree is None:
+            return  # 面板尚未构建，构建时会一次性显示
         try:
             # 清空现有项
             for item in self.alert_tree.get_children():
@@ -1878,9 +4801,14 @@ class SecurityApp:
 
             # 插入记录（倒序显示，最新的在上面）
             for record in reversed(self.alert_history):
+                event = record['event']
+                if event.end_time is None:
+                    summary = "进行中"
+                else:
+                    summary = f"{event.duration:.0f}秒/{event.frames}帧"
                 self.alert_tree.insert("", "end", values=(
                     record['time'],
-                    f"{record['frames']}帧",
+                    f"{summary} {'、'.join(event.zones)}".rstrip(),
                     f"{len(record['screenshots'])}张"
                 ))
         except Exception as e:
@@ -2159,6 +5087,7 @@ class SecurityApp:
         """初始化系统托盘"""
         try:
             icon_image = self.create_tray_icon()
+            item = pystray.MenuItem
 
             # 创建托盘菜单
             menu = (
@@ -2166,6 +5095,8 @@ class SecurityApp:
                 item('隐藏窗口', self.hide_window),
                 item('启动监控', self.start_monitoring_from_tray, visible=lambda item: not self.is_running),
                 item('停止监控', self.stop_monitoring_from_tray, visible=lambda item: self.is_running),
+                item(f"性能分析 ({self.config.get('profile_duration', 10)}秒)", self.profile_from_tray,
+                     enabled=lambda item: not self.profiling),
                 item('退出程序', self.quit_app)
             )
 
@@ -2221,16 +5152,29 @@ class SecurityApp:
         if self.tray_icon:
             self.tray_icon.stop()
         # 保存参数和窗口布局
-        self.save_config()
+        self.save_config(immediate=True)
         self.save_window_layout()
-        # 停止监控
+        # 停止监控，等待视频线程收尾（期间处理它投递到Tk线程的回调，最多2秒）
         if self.is_running:
             self.stop_monitoring()
+        deadline = time.monotonic() + 2.0
+        while self.video_thread is not None and self.video_thread.is_alive() and time.monotonic() < deadline:
+            self.root.update()
+            time.sleep(0.02)
+        if self.video_thread is None or not self.video_thread.is_alive():
+            self.save_motion_series()  # 视频线程已退出（或从未启动），不会再有新记录
+        # 停止指标服务
+        if self.metrics_server:
+            self.metrics_server.stop()
+        # 等待排队中的截图写完（最多2秒）
+        deadline = time.monotonic() + 2.0
+        while self.screenshot_writer.depth > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
         # 关闭窗口
         self.root.destroy()
 
     # ========== 报警弹窗提示 ==========
-    def show_alert_popup(self, frames):
+    def show_alert_popup(self, frames, trace=None, zones=None):
         """在屏幕右下角显示报警弹窗（参考security_monitor.py样式）"""
         try:
             # 创建弹窗
@@ -2266,7 +5210,10 @@ class SecurityApp:
             lbl_title.pack(fill="x", pady=(15, 2))
 
             timestamp = datetime.datetime.now().strftime('%H:%M:%S')
-            lbl_msg = tk.Label(content_frame, text=f"Motion detected at {timestamp}",
+            message = f"Motion detected at {timestamp}"
+            if zones:
+                message += f"\nZone: {', '.join(zones)}"
+            lbl_msg = tk.Label(content_frame, text=message, justify="left",
                                font=font_body, bg=bg_color, fg=text_color, anchor="w")
             lbl_msg.pack(fill="x")
 
@@ -2275,7 +5222,7 @@ class SecurityApp:
 
             # 窗口尺寸与位置计算
             window_width = 320
-            window_height = 100  # 因为字体变大，稍微增加高度
+            window_height = 120 if zones else 100  # 因为字体变大，稍微增加高度；分区名多占一行
             padding_right = 10
             padding_bottom = 80  # 避开底部任务栏
 
@@ -2333,6 +5280,7 @@ class SecurityApp:
             # 更新并显示窗口
             popup.update_idletasks()
             popup.deiconify()  # 显示窗口
+            self.alert_tracer.mark(trace, 'popup')
 
             # 点击任意位置关闭
             def dismiss(event=None):
@@ -2354,7 +5302,7 @@ class SecurityApp:
     def on_close(self):
         """窗口关闭时隐藏到托盘而不是退出"""
         # 保存参数和窗口布局
-        self.save_config()
+        self.save_config(immediate=True)
         self.save_window_layout()
         # 隐藏到托盘
         self._hide_window()
@@ -2381,6 +5329,28 @@ class SecurityApp:
         if self.preset_combo.get() not in presets:
             self.preset_combo.set(presets[0])
 
+    def _sync_param_widgets(self):
+        """把配置中的检测参数同步到滑块和数值框（只更新显示，不触发回调、不保存）"""
+        # 更新UI滑块（校准得到的面积可能超出当前滑块范围）
+        min_area = self.config['min_area']
+        if not self.scale_sensitivity.cget("from_") <= min_area <= self.scale_sensitivity.cget("to"):
+            self.scale_sensitivity.configure(from_=max(10, min_area // 4), to=max(min_area * 4, 100))
+        loop_delay = self.config['loop_delay']
+        target_fps = round(1.0 / loop_delay) if loop_delay > 0 else 5
+        for scale, entry, val in (
+            (self.scale_sensitivity, self.lbl_sensitivity, min_area),
+            (self.scale_frames, self.lbl_frames, self.config['continuous_frames']),
+            (self.scale_threshold, self.lbl_threshold, self.config['threshold']),
+            (self.scale_cooldown, self.lbl_cooldown, self.config['alert_cooldown']),
+            (self.scale_target_fps, self.lbl_target_fps, target_fps),
+        ):
+            scale.set(val)
+            if not entry.editing:
+                text = f"{val:g}"
+                entry.delete(0, tk.END)
+                entry.insert(0, text)
+                entry.original_value = text
+
     def _load_preset(self):
         """加载选定的预设"""
         preset_name = self.preset_combo.get()
@@ -2391,29 +5361,19 @@ class SecurityApp:
             # 定义可设置的参数键
             preset_keys = [
                 "min_area", "continuous_frames", "threshold", 
-                "alert_cooldown", "loop_delay"
+                "alert_cooldown", "loop_delay", "gaussian_blur"
             ]
             
+            old_blur = self.config['gaussian_blur']
             for key in preset_keys:
                 if key in preset_data:
                     self.config[key] = preset_data[key]
+            self.refresh_params()
+            if self.config['gaussian_blur'] != old_blur:
+                self.roi_reset_flag = True  # 模糊核变化后旧参考帧不可比，交给视频线程重置检测器
 
-            # 更新UI滑块
-            self.scale_sensitivity.set(self.config['min_area'])
-            self.on_sensitivity_change(self.config['min_area']) # 触发更新
-            
-            self.scale_frames.set(self.config['continuous_frames'])
-            self.on_frames_change(self.config['continuous_frames'])
-
-            self.scale_threshold.set(self.config['threshold'])
-            self.on_threshold_change(self.config['threshold'])
-            
-            self.scale_cooldown.set(self.config['alert_cooldown'])
-            self.on_cooldown_change(self.config['alert_cooldown'])
-            
-            target_fps = int(1.0 / self.config['loop_delay']) if self.config['loop_delay'] > 0 else 5
-            self.scale_target_fps.set(target_fps)
-            self.on_target_fps_change(target_fps)
+            self._sync_param_widgets()
+            self.save_config()
 
             self.log(f"已加载预设: {preset_name}")
         else:
@@ -2438,7 +5398,8 @@ class SecurityApp:
                 "continuous_frames": self.config['continuous_frames'],
                 "threshold": self.config['threshold'],
                 "alert_cooldown": self.config['alert_cooldown'],
-                "loop_delay": self.config['loop_delay']
+                "loop_delay": self.config['loop_delay'],
+                "gaussian_blur": self.config['gaussian_blur']
             }
             
             if "custom_presets" not in self.config:
@@ -2454,6 +5415,52 @@ class SecurityApp:
         else:
             self.log("预设名称不能为空，保存失败。")
 
+    def start_calibration(self):
+        """开始噪声校准（需在监控运行且画面中无人时进行）"""
+        if not self.is_running:
+            messagebox.showinfo("提示", "请先启动监控")
+            return
+        if self.calibrator is not None:
+            self.log("噪声校准正在进行中...")
+            return
+        duration = self.config.get('calibration_duration', 20)
+        if not messagebox.askokcancel("噪声校准",
+                                      f"校准将观察画面{duration}秒，期间暂停报警。\n"
+                                      "请确保监控区域内无人走动，然后点击确定。"):
+            return
+        self.calibrator = NoiseCalibrator(duration)
+        self.btn_calibrate.configure(state="disabled", text="🎯 校准中...")
+        self.status_var.set("噪声校准中...")
+        self.log(f"开始噪声校准 ({duration}秒)，请保持画面静止")
+
+    def _finish_calibration(self, calibrator):
+        """校准结束：显示建议参数并保存为预设"""
+        self.btn_calibrate.configure(state="normal", text="🎯 噪声校准")
+        self.status_var.set("监控中" if self.is_running else "已停止")
+        proposal = calibrator.propose()
+        if proposal is None:
+            self.log("噪声校准失败：有效帧数不足（是否暂停了监控？）")
+            return
+        self.log(f"噪声校准完成: {calibrator.summary()}")
+        text = (f"阈值 {proposal['threshold']}  最小面积 {proposal['min_area']}\n"
+                f"连续帧数 {proposal['continuous_frames']}  模糊核 {proposal['gaussian_blur']}\n\n"
+                "请输入预设名称（留空使用默认名称）:")
+        dialog = ctk.CTkInputDialog(text=text, title="噪声校准结果")
+        preset_name = dialog.get_input()
+        if preset_name is None:
+            self.log("校准结果未保存")
+            return
+        preset_name = preset_name.strip() or f"自动校准_{datetime.datetime.now():%m%d_%H%M}"
+
+        preset = dict(proposal, alert_cooldown=self.config['alert_cooldown'], loop_delay=self.config['loop_delay'])
+        self.config.setdefault("custom_presets", {})[preset_name] = preset
+        self.save_config()
+        self._populate_presets_combo()
+        self.preset_combo.set(preset_name)
+        self.log(f"校准参数已保存为预设 '{preset_name}': {proposal}")
+        if messagebox.askyesno("噪声校准", f"是否立即应用预设 '{preset_name}'？"):
+            self._load_preset()
+
     def _delete_preset(self):
         """删除选定的预设"""
         preset_name = self.preset_combo.get()
@@ -2470,7 +5477,14 @@ class SecurityApp:
 
 
 
+STARTUP.mark("模块导入")
+
+
 if __name__ == "__main__":
+    startup_benchmark = "--startup-benchmark" in sys.argv
     root = ctk.CTk()
-    app = SecurityApp(root)
+    STARTUP.mark("创建窗口")
+    app = SecurityApp(root, startup_benchmark=startup_benchmark)
+    if startup_benchmark:
+        root.after(0, app.start_monitoring)
     root.mainloop()
\ No newline at end of file